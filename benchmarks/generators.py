@@ -0,0 +1,171 @@
+"""Geradores de dados sintéticos para os benchmarks.
+
+Os dados são determinísticos (mesma semente, mesmos arquivos), para que os
+resultados de execuções diferentes sejam comparáveis:
+
+    generate_sped      - arquivo SPED com Bloco 0, notas C100 com itens C170 e
+                         totais C190, encerramentos e Bloco 9 consistente
+    generate_nfe_folder - pasta com arquivos XML de NF-e (nfeProc)
+    generate_workbooks  - par de planilhas para o cruzamento, com parte das
+                          chaves em comum
+"""
+import os
+import random
+from collections import Counter
+
+from sped_writers import create_record_writer
+
+CFOPS = ("5102", "5405", "6102", "6108", "1102", "2102")
+CSTS = ("000", "020", "060", "090")
+UNITS = ("UN", "KG", "CX", "PC")
+
+
+def _money(value):
+    """Valor no formato do SPED: vírgula decimal, duas casas."""
+    return f"{value:.2f}".replace(".", ",")
+
+
+def generate_sped(
+    file_path, target_bytes, items_per_note=(1, 8), participants=200, products=2000, seed=1
+):
+    """
+    Gera um arquivo SPED (EFD ICMS/IPI) de cerca de `target_bytes` bytes.
+
+    Cada nota C100 tem de `items_per_note[0]` a `items_per_note[1]` itens C170,
+    seguidos de um C190 por combinação de CST/CFOP, como na escrituração real. O
+    Bloco 9 traz a quantidade exata de linhas de cada registro. Retorna
+    {registro: quantidade de linhas}.
+    """
+    rng = random.Random(seed)
+    counts = Counter()
+    written = 0
+
+    with open(file_path, "w", encoding="latin1", newline="\r\n", buffering=1024 * 1024) as f:
+        def write(*fields):
+            nonlocal written
+            line = "|" + "|".join(fields) + "|\n"
+            f.write(line)
+            counts[fields[0]] += 1
+            written += len(line) + 1
+
+        write("0000", "017", "0", "01012024", "31012024", "EMPRESA SINTÉTICA LTDA", "12345678000195", "", "SP",
+              "123456789012", "3550308", "", "", "A", "1")
+        write("0001", "0")
+        for number in range(participants):
+            write("0150", f"P{number:05d}", f"PARTICIPANTE {number}", "01058", f"{10000000000100 + number:014d}", "",
+                  "", "3550308", "", f"RUA {number}", str(number), "", "CENTRO")
+        for number in range(products):
+            write("0200", f"ITEM{number:06d}", f"PRODUTO SINTÉTICO Nº {number}", "", "", rng.choice(UNITS), "00",
+                  f"{84710000 + number % 9999:08d}", "", "", "", "18,00")
+        write("0990", str(sum(counts.values()) + 1))
+
+        block_c_start = sum(counts.values())
+        write("C001", "0")
+        note = 0
+        while written < target_bytes:
+            note += 1
+            items = []
+            for item_number in range(1, rng.randint(*items_per_note) + 1):
+                value = rng.uniform(1, 5000)
+                items.append((item_number, f"ITEM{rng.randrange(products):06d}", rng.uniform(1, 100), value,
+                              rng.choice(CSTS), rng.choice(CFOPS)))
+            total = sum(item[3] for item in items)
+            write("C100", "0", "1", f"P{rng.randrange(participants):05d}", "55", "00", "1", str(note),
+                  f"35240112345678000195550010{note:09d}1{note % 100000000:08d}", "15012024", "15012024",
+                  _money(total), "0", "0,00", "0,00", _money(total), "9", "0,00", "0,00", "0,00", _money(total),
+                  _money(total * 0.18), "0,00", "0,00", "0,00", "0,00", "0,00", "0,00", "0,00")
+            summary = {}
+            for item_number, code, quantity, value, cst, cfop in items:
+                write("C170", str(item_number), code, "", f"{quantity:.5f}".replace(".", ","), "UN", _money(value),
+                      "0,00", "0", cst, cfop, "", _money(value), "18,00", _money(value * 0.18), "0,00", "0,00",
+                      "0,00", "0", "", "", "0,00", "0,00", "0,00")
+                entry = summary.setdefault((cst, cfop), [0.0, 0.0])
+                entry[0] += value
+                entry[1] += value * 0.18
+            for (cst, cfop), (value, icms) in sorted(summary.items()):
+                write("C190", cst, cfop, "18,00", _money(value), _money(value), _money(icms), "0,00", "0,00", "0,00",
+                      "0,00", "")
+        write("C990", str(sum(counts.values()) - block_c_start + 1))
+
+        # Bloco 9: um 9900 por registro (inclusive os do próprio Bloco 9)
+        record_types = list(counts) + ["9001", "9900", "9990", "9999"]
+        block_9_lines = 1 + len(record_types) + 2
+        write("9001", "0")
+        for record_type in record_types:
+            if record_type == "9900":
+                count = len(record_types)
+            elif record_type in ("9001", "9990", "9999"):
+                count = 1
+            else:
+                count = counts[record_type]
+            write("9900", record_type, str(count))
+        write("9990", str(block_9_lines))
+        write("9999", str(sum(counts.values()) + 1))
+
+    return dict(counts)
+
+
+def generate_nfe_folder(directory, count, items_per_note=(1, 6), seed=1):
+    """Gera `count` arquivos XML de NF-e autorizadas em `directory`."""
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    for number in range(count):
+        items = []
+        for item_number in range(1, rng.randint(*items_per_note) + 1):
+            value = rng.uniform(1, 5000)
+            items.append(
+                f'<det nItem="{item_number}"><prod><cProd>ITEM{rng.randrange(2000):06d}</cProd>'
+                f"<xProd>Produto {item_number}</xProd><NCM>{84710000 + item_number:08d}</NCM>"
+                f"<CFOP>{rng.choice(CFOPS)}</CFOP><uCom>UN</uCom><qCom>{rng.uniform(1, 100):.4f}</qCom>"
+                f"<vProd>{value:.2f}</vProd></prod><imposto><ICMS><ICMS00><orig>0</orig><CST>00</CST>"
+                f"<vBC>{value:.2f}</vBC><pICMS>18.00</pICMS><vICMS>{value * 0.18:.2f}</vICMS></ICMS00></ICMS>"
+                f"</imposto></det>"
+            )
+        installments = "".join(
+            f"<dup><nDup>{part:03d}</nDup><dVenc>2024-0{part}-10</dVenc><vDup>100.00</vDup></dup>"
+            for part in range(1, rng.randint(1, 4))
+        )
+        key = f"35240112345678000195550010{number:09d}1{number % 100000000:08d}"
+        xml = (
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<nfeProc xmlns="http://www.portalfiscal.inf.br/nfe" versao="4.00"><NFe>'
+            f'<infNFe Id="NFe{key}" versao="4.00"><ide><cUF>35</cUF><nNF>{number}</nNF><serie>1</serie>'
+            "<dhEmi>2024-01-15T10:00:00-03:00</dhEmi></ide>"
+            f"<emit><CNPJ>{12345678000100 + number % 50:014d}</CNPJ><xNome>Emitente {number % 50}</xNome>"
+            "<enderEmit><UF>SP</UF></enderEmit></emit>"
+            "<dest><CNPJ>98765432000100</CNPJ><xNome>Destinatario</xNome><enderDest><UF>RJ</UF></enderDest></dest>"
+            f"{''.join(items)}<total><ICMSTot><vBC>100.00</vBC><vICMS>18.00</vICMS><vNF>{100 + number}.00</vNF>"
+            f"</ICMSTot></total><cobr><fat><nFat>{number}</nFat><vOrig>300.00</vOrig></fat>{installments}</cobr>"
+            "</infNFe>"
+            '<Signature xmlns="http://www.w3.org/2000/09/xmldsig#"><SignedInfo/></Signature></NFe>'
+            f'<protNFe versao="4.00"><infProt><chNFe>{key}</chNFe><cStat>100</cStat></infProt></protNFe></nfeProc>'
+        )
+        with open(os.path.join(directory, f"nfe_{number:07d}.xml"), "w", encoding="utf-8") as f:
+            f.write(xml)
+
+
+def generate_workbooks(path_a, path_b, rows, match_ratio=0.8, seed=1):
+    """
+    Gera as planilhas do cruzamento: A (aba "Notas": chave, cnpj, valor, data) com
+    `rows` linhas e B (aba "Escrituracao": chave, cnpj, valor, situacao), em que
+    `match_ratio` das chaves de A aparecem, em outra ordem, junto com chaves só de B.
+    """
+    rng = random.Random(seed)
+    keys = [f"3524{rng.randrange(10 ** 40):040d}" for _ in range(rows)]
+    with create_record_writer("xlsx", path_a) as writer:
+        writer.set_columns("Notas", ["chave", "cnpj", "valor", "data"])
+        writer.write_rows(
+            "Notas",
+            ([key, f"{rng.randrange(10 ** 14):014d}", round(rng.uniform(1, 10000), 2), "15/01/2024"] for key in keys),
+        )
+
+    matched = rng.sample(keys, int(rows * match_ratio))
+    only_b = [f"3524{rng.randrange(10 ** 40):040d}" for _ in range(rows - len(matched))]
+    keys_b = matched + only_b
+    rng.shuffle(keys_b)
+    with create_record_writer("xlsx", path_b) as writer:
+        writer.set_columns("Escrituracao", ["chave", "cnpj", "valor", "situacao"])
+        writer.write_rows(
+            "Escrituracao",
+            ([key, f"{rng.randrange(10 ** 14):014d}", round(rng.uniform(1, 10000), 2), "00"] for key in keys_b),
+        )
@@ -0,0 +1,342 @@
+"""Benchmarks dos processamentos do IVFTax, sem abrir a janela do Pyloid.
+
+Gera dados sintéticos (ver generators.py), executa cada processamento em um
+processo separado (para medir o pico de memória de cada um isoladamente) e grava
+os resultados em JSON: tempo total e por etapa, vazão e pico de RSS. Com
+--baseline os resultados são comparados com uma execução anterior, e o código de
+saída é 1 se alguma medida ficar mais lenta que a tolerância.
+
+    python benchmarks/run_benchmarks.py --scale small
+    python benchmarks/run_benchmarks.py --scale small --save-baseline
+    python benchmarks/run_benchmarks.py --scale small --baseline benchmarks/baseline-small.json
+
+Os dados gerados ficam em benchmarks/data/<escala> e são reaproveitados entre as
+execuções. Índices, manifestos e cópias de planilhas usam diretórios temporários,
+então o cache do aplicativo não é alterado.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [os.path.join(os.path.dirname(BENCHMARKS_DIR), "src-pyloid"), BENCHMARKS_DIR]
+
+import generators  # noqa: E402
+
+DATA_VERSION = 1  # mude ao alterar os geradores, para que os dados sejam gerados de novo
+DEFAULT_TOLERANCE = 0.15
+MIN_REGRESSION_SECONDS = 0.05  # diferenças menores que isto são ruído de medição
+
+SCALES = {
+    "small": {"sped_bytes": 5 * 1024 * 1024, "nfe_files": 500, "workbook_rows": 20000},
+    "medium": {"sped_bytes": 50 * 1024 * 1024, "nfe_files": 5000, "workbook_rows": 200000},
+    "large": {"sped_bytes": 500 * 1024 * 1024, "nfe_files": 50000, "workbook_rows": 1000000},
+}
+
+
+def prepare_data(data_dir, scale):
+    """Gera os dados da escala em `data_dir`, se ainda não existirem. Retorna os caminhos."""
+    config = SCALES[scale]
+    paths = {
+        "sped": os.path.join(data_dir, "efd.txt"),
+        "nfe": os.path.join(data_dir, "nfe"),
+        "workbook_a": os.path.join(data_dir, "notas.xlsx"),
+        "workbook_b": os.path.join(data_dir, "escrituracao.xlsx"),
+    }
+    marker_path = os.path.join(data_dir, "dados.json")
+    marker = {"version": DATA_VERSION, "scale": scale, **config}
+    try:
+        with open(marker_path, "r", encoding="utf-8") as f:
+            if json.load(f) == marker:
+                return paths
+    except (OSError, ValueError):
+        pass
+
+    shutil.rmtree(data_dir, ignore_errors=True)
+    os.makedirs(data_dir)
+    print(f"Gerando dados sintéticos ({scale}) em {data_dir}...")
+    generators.generate_sped(paths["sped"], config["sped_bytes"])
+    generators.generate_nfe_folder(paths["nfe"], config["nfe_files"])
+    generators.generate_workbooks(paths["workbook_a"], paths["workbook_b"], config["workbook_rows"])
+    with open(marker_path, "w", encoding="utf-8") as f:
+        json.dump(marker, f)
+    return paths
+
+
+@contextmanager
+def stage(stages, name):
+    """Soma a duração do bloco em `stages[name]` (segundos)."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        stages[name] = stages.get(name, 0.0) + time.perf_counter() - started
+
+
+def bench_sped_process(paths, work_dir, output_format):
+    """Filtro de C100/C170 com o relacionamento pai/filho (CustomAPI.process_files)."""
+    import sped_index
+    from pipelines import process_sped_files
+
+    sped_index.INDEX_DIR = os.path.join(work_dir, "sped_index")
+    snapshots = []
+    stages = {}
+    with stage(stages, "catalog"):
+        sped_index.get_record_counts(paths["sped"])
+    with stage(stages, "index"):
+        sped_index.get_index(paths["sped"])
+    with stage(stages, "process"):
+        rows = process_sped_files(
+            [paths["sped"]], ["C100", "C170"], None, [("C100", "C170")], output_format,
+            os.path.join(work_dir, f"sped.{output_format}" if output_format == "xlsx" else "sped"),
+            progress_callback=snapshots.append,
+        )
+    return {
+        "stages": stages, "engineStages": snapshots[-1]["stages"], "bytes": os.path.getsize(paths["sped"]),
+        "items": rows, "unit": "linhas",
+    }
+
+
+def bench_sped_convert(paths, work_dir, output_format):
+    """Conversão TXT → Excel/Parquet/CSV com um registro por aba (convert_txt_to_excel_bulk)."""
+    from sped_tasks import convert_txt_file
+
+    stages = {}
+    with stage(stages, "convert"):
+        convert_txt_file(paths["sped"], work_dir, output_format)
+    return {"stages": stages, "bytes": os.path.getsize(paths["sped"]), "items": None, "unit": None}
+
+
+def bench_xml_process(paths, work_dir, output_format):
+    """Extração das NF-e, completa e depois incremental (XMLProcessingAPI.process_files)."""
+    import xml_manifest
+    from file_scanner import scan_files
+    from nfe_schema import NFeExtractor
+    from pipelines import process_xml_files
+    from sped_writers import output_path
+
+    xml_manifest.MANIFEST_DIR = os.path.join(work_dir, "xml_manifest")
+    extractor = NFeExtractor()
+    sheets = {"Notas": extractor.header_columns, **extractor.table_columns}
+    total_bytes = sum(entry.stat().st_size for entry in os.scandir(paths["nfe"]))
+
+    stages = {}
+    for name in ("full", "incremental"):
+        manifest = xml_manifest.XmlManifest(paths["nfe"])
+        try:
+            with stage(stages, name):
+                parsed, _, reused = process_xml_files(
+                    scan_files(paths["nfe"]), sheets, output_format, output_path(work_dir, f"nfe_{name}", output_format), manifest=manifest
+                )
+                manifest.save()
+        finally:
+            manifest.close()
+        if name == "full":
+            items = parsed
+    return {"stages": stages, "bytes": total_bytes, "items": items, "unit": "arquivos"}
+
+
+def bench_cross_reference(paths, work_dir, output_format):
+    """Cruzamento com conciliação, sem cache, com cache de planilhas e com índice salvo."""
+    import cross_reference as cross
+    from job_control import ProgressTracker
+    from sped_writers import create_record_writer
+    from workbook_cache import WorkbookCache
+
+    cross.INDEX_DIR = os.path.join(work_dir, "cross_index")
+    workbooks = WorkbookCache(copy_dir=os.path.join(work_dir, "workbook_cache"))
+    source_a = (paths["workbook_a"], "Notas", ["chave"])
+    source_b = (paths["workbook_b"], "Escrituracao", ["chave"])
+
+    stages = {}
+    tracker = ProgressTracker(0)
+    try:
+        for name, persist in (("cold", False), ("cached", False), ("index_saved", True), ("index_reused", True)):
+            with stage(stages, name):
+                with create_record_writer("xlsx", os.path.join(work_dir, f"cruzamento_{name}.xlsx")) as writer:
+                    counts = cross.cross_reference(
+                        source_a, source_b, writer, "inner", reconcile=True, workbooks=workbooks,
+                        persist_index=persist, tracker=tracker if name == "cold" else None,
+                    )
+    finally:
+        workbooks.close()
+    total_bytes = os.path.getsize(paths["workbook_a"]) + os.path.getsize(paths["workbook_b"])
+    return {
+        "stages": stages, "engineStages": tracker.snapshot()["stages"], "bytes": total_bytes,
+        "items": sum(counts.values()), "unit": "linhas",
+    }
+
+
+BENCHMARKS = {
+    "sped_process": bench_sped_process,
+    "sped_convert": bench_sped_convert,
+    "xml_process": bench_xml_process,
+    "cross_reference": bench_cross_reference,
+}
+
+
+def worker_peak_rss_mb():
+    """Pico de memória (RSS) dos processos de trabalho já encerrados, em MB (None no Windows)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    scale = 1 if sys.platform == "darwin" else 1024  # ru_maxrss: bytes no macOS, KB no Linux
+    return round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale / 1024 ** 2, 1)
+
+
+def run_single(name, data_dir, scale, output_format):
+    """Executa um benchmark neste processo e retorna o resultado."""
+    import sped_tasks
+    from job_control import peak_memory_mb
+
+    paths = prepare_data(data_dir, scale)
+    work_dir = tempfile.mkdtemp(prefix=f"ivftax_bench_{name}_")
+    try:
+        started = time.perf_counter()
+        result = BENCHMARKS[name](paths, work_dir, output_format)
+        seconds = time.perf_counter() - started
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    # Encerra o pool para que o pico dos processos de trabalho entre na medida
+    if sped_tasks._pool is not None:
+        sped_tasks._pool.shutdown()
+
+    result["seconds"] = round(seconds, 3)
+    result["stages"] = {key: round(value, 3) for key, value in result["stages"].items()}
+    # engineStages: etapas medidas pelo próprio processamento (ver job_control.ProgressTracker)
+    result["mbPerSecond"] = round(result.pop("bytes") / 1024 ** 2 / seconds, 2)
+    if result["items"] is not None:
+        result["itemsPerSecond"] = round(result["items"] / seconds, 1)
+    result["peakRssMB"] = peak_memory_mb()
+    result["peakRssWorkersMB"] = worker_peak_rss_mb()
+    return result
+
+
+def run_in_subprocess(name, data_dir, scale, output_format):
+    command = [
+        sys.executable, os.path.abspath(__file__), "--child", name,
+        "--scale", scale, "--data-dir", data_dir, "--format", output_format,
+    ]
+    completed = subprocess.run(command, capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(f"Benchmark {name} falhou:\n{completed.stderr}")
+    # Os processamentos escrevem mensagens na saída; o resultado é a última linha
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, cwd=BENCHMARKS_DIR, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, tolerance):
+    """
+    Compara o tempo total e o de cada etapa com o baseline. Imprime a tabela e
+    retorna as medidas que ficaram mais lentas que `tolerance` (0.15 = 15%) e
+    pelo menos MIN_REGRESSION_SECONDS.
+    """
+    if baseline.get("scale") != results["scale"] or baseline.get("format") != results["format"]:
+        print(
+            f"Aviso: baseline com escala/formato {baseline.get('scale')}/{baseline.get('format')}, "
+            f"execução atual com {results['scale']}/{results['format']}."
+        )
+    regressions = []
+    print(f"\n{'medida':<36}{'baseline':>10}{'atual':>10}{'variação':>10}")
+    for name, result in results["benchmarks"].items():
+        previous = baseline.get("benchmarks", {}).get(name)
+        if previous is None:
+            continue
+        measures = [(name, previous.get("seconds"), result["seconds"])]
+        measures += [
+            (f"{name}.{key}", previous.get("stages", {}).get(key), value) for key, value in result["stages"].items()
+        ]
+        measures += [
+            (f"{name}.etapa.{key}", previous.get("engineStages", {}).get(key), value)
+            for key, value in result.get("engineStages", {}).items()
+        ]
+        for label, before, after in measures:
+            if not before:
+                continue
+            change = after / before - 1
+            flag = ""
+            if change > tolerance and after - before >= MIN_REGRESSION_SECONDS:
+                flag = "  mais lento"
+                regressions.append(label)
+            print(f"{label:<36}{before:>9.3f}s{after:>9.3f}s{change:>+10.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks dos processamentos do IVFTax.")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small")
+    parser.add_argument("--only", nargs="+", choices=sorted(BENCHMARKS), help="benchmarks a executar")
+    parser.add_argument("--format", default="xlsx", choices=("xlsx", "parquet", "feather", "csv"),
+                        help="formato de saída dos processamentos SPED e XML")
+    parser.add_argument("--repeat", type=int, default=1, help="execuções de cada benchmark (vale a mais rápida)")
+    parser.add_argument("--data-dir", help="onde gerar os dados (padrão: benchmarks/data/<escala>)")
+    parser.add_argument("--output", help="arquivo JSON de resultados (padrão: benchmarks/results/...)")
+    parser.add_argument("--baseline", help="resultados anteriores para comparação")
+    parser.add_argument("--save-baseline", action="store_true", help="grava os resultados como baseline da escala")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    data_dir = os.path.abspath(args.data_dir or os.path.join(BENCHMARKS_DIR, "data", args.scale))
+    if args.child:
+        print(json.dumps(run_single(args.child, data_dir, args.scale, args.format)))
+        return 0
+
+    prepare_data(data_dir, args.scale)
+    results = {
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "scale": args.scale,
+        "format": args.format,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpuCount": os.cpu_count(),
+        "benchmarks": {},
+    }
+    for name in args.only or BENCHMARKS:
+        runs = [run_in_subprocess(name, data_dir, args.scale, args.format) for _ in range(max(1, args.repeat))]
+        best = min(runs, key=lambda run: run["seconds"])
+        best["runs"] = [run["seconds"] for run in runs]
+        results["benchmarks"][name] = best
+        print(f"{name}: {best['seconds']:.3f}s, {best['mbPerSecond']} MB/s, pico {best['peakRssMB']} MB")
+
+    output = args.output or os.path.join(
+        BENCHMARKS_DIR, "results", f"{datetime.datetime.now():%Y%m%d-%H%M%S}-{args.scale}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Resultados salvos em: {output}")
+    if args.save_baseline:
+        baseline_path = os.path.join(BENCHMARKS_DIR, f"baseline-{args.scale}.json")
+        shutil.copyfile(output, baseline_path)
+        print(f"Baseline salvo em: {baseline_path}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} medida(s) mais lenta(s) que a tolerância de {args.tolerance:.0%}.")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,282 @@
+"""Cruzamento de planilhas por hash join.
+
+A planilha B (lado de construção) é lida uma vez e indexada pela chave,
+guardando só as colunas de B que vão para a aba do cruzamento (as linhas
+completas quando há conciliação, que grava a aba "Somente em B"). A planilha A (lado de sondagem) é
+percorrida em blocos de linhas, sem carregar a aba inteira, e cada bloco é
+gravado assim que é cruzado. As linhas vêm do cache de planilhas (workbook_cache).
+
+Tipos de cruzamento:
+    inner  - linhas de A com correspondência em B (como o pd.merge anterior)
+    left   - todas as linhas de A; as colunas de B ficam vazias quando não há par
+    anti   - linhas de A sem correspondência em B
+Com `reconcile`, a saída ganha também as abas "Somente em A" e "Somente em B".
+
+A chave pode ter várias colunas. Com a mesma quantidade de colunas nos dois
+lados, elas são comparadas par a par; com quantidades diferentes (por exemplo,
+a chave de acesso de 44 dígitos numa planilha e suas partes em várias colunas da
+outra), os valores de cada lado são concatenados. Modos de comparação:
+    exact   - o valor da célula, sem alteração
+    text    - texto sem espaços extras, em maiúsculas
+    digits  - só os dígitos, sem zeros à esquerda (CNPJ com pontuação, códigos)
+O índice de B pode ser salvo em disco e reaproveitado enquanto a planilha, a
+aba, as colunas e o modo forem os mesmos; os índices salvos têm o mesmo limite
+de tamanho e idade das cópias de planilhas (ver workbook_cache.prune_cache_dir).
+"""
+import hashlib
+import itertools
+import json
+import os
+import pickle
+import platform
+import time
+
+from job_control import ProgressTracker
+from workbook_cache import WorkbookCache, file_stat, prune_cache_dir, touch_cache_file
+
+JOIN_TYPES = ("inner", "left", "anti")
+KEY_MODES = ("exact", "text", "digits")
+PROBE_CHUNK_SIZE = 10000  # linhas de A cruzadas e gravadas por vez
+INDEX_VERSION = 2
+INDEX_MAX_BYTES = 512 * 1024 * 1024  # tamanho máximo do diretório de índices
+
+RESULT_SHEET = "Cruzamento"
+ONLY_A_SHEET = "Somente em A"
+ONLY_B_SHEET = "Somente em B"
+
+if platform.system() == "Windows":
+    INDEX_DIR = os.path.join(os.getenv("LOCALAPPDATA", os.path.expanduser("~")), "IVFTax", "cross_index")
+else:
+    INDEX_DIR = os.path.expanduser("~/.IVFTax/cross_index")
+
+
+def _column_index(columns, column, file_label):
+    try:
+        return columns.index(str(column))
+    except ValueError:
+        raise ValueError(f"Erro: Coluna '{column}' não encontrada no {file_label}.") from None
+
+
+def _cell_text(value):
+    """Texto da célula; números inteiros gravados como 123.0 viram "123"."""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value).strip()
+
+
+def _normalize(text, mode):
+    if mode == "digits":
+        digits = "".join(char for char in text if char.isdigit())
+        return (digits.lstrip("0") or "0") if digits else None
+    return " ".join(text.upper().split()) or None
+
+
+def key_function(positions, mode="exact", concat=False):
+    """Função que monta a chave de uma linha (None quando a chave está vazia)."""
+    if mode not in KEY_MODES:
+        raise ValueError(f"Modo de comparação inválido: {mode}")
+
+    def key(row):
+        values = [row[position] for position in positions]
+        if any(value is None for value in values):
+            return None
+        if concat:
+            text = "".join(_cell_text(value) for value in values)
+            return text if mode == "exact" else _normalize(text, mode)
+        if mode != "exact":
+            values = [_normalize(_cell_text(value), mode) for value in values]
+            if None in values:
+                return None
+        return values[0] if len(values) == 1 else tuple(values)
+
+    return key
+
+
+def _output_columns(columns_a, columns_b, skip_b):
+    """Colunas de A seguidas das de B (exceto `skip_b`); nomes repetidos ganham _x/_y."""
+    kept_b = [i for i in range(len(columns_b)) if i not in skip_b]
+    names_b = {columns_b[i] for i in kept_b}
+    names_a = set(columns_a)
+    result = [f"{name}_x" if name in names_b else name for name in columns_a]
+    result += [f"{columns_b[i]}_y" if columns_b[i] in names_a else columns_b[i] for i in kept_b]
+    return result, kept_b
+
+
+def _index_path(file_path, sheet_name, key_columns, mode, concat, kept):
+    key = json.dumps([os.path.abspath(file_path), sheet_name, key_columns, mode, concat, kept])
+    return os.path.join(INDEX_DIR, f"{hashlib.sha1(key.encode('utf-8')).hexdigest()}.pkl")
+
+
+def _load_index(index_path, stat):
+    """Índice salvo, ou None se não existir ou estiver desatualizado (e então é apagado)."""
+    try:
+        with open(index_path, "rb") as f:
+            if pickle.load(f)[:3] == [INDEX_VERSION, *stat]:
+                index = pickle.load(f)
+                touch_cache_file(index_path)
+                return index
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, pickle.UnpicklingError, EOFError):
+        pass
+    try:
+        os.remove(index_path)
+    except OSError:
+        pass
+    return None
+
+
+def build_index(workbooks, source, mode="exact", concat=False, kept=None, persist=False):
+    """
+    Lê a aba `source` = (arquivo, aba, colunas-chave) e retorna (colunas, índice),
+    com o índice no formato {chave: [linhas]}. `kept` são as posições das colunas
+    guardadas em cada linha (None guarda a linha inteira); com `kept` vazio só as
+    chaves interessam e o índice fica {chave: None}. Com `persist`, o índice é salvo
+    e reaproveitado enquanto o arquivo não mudar.
+    """
+    file_path, sheet_name, key_columns = source
+    kept = None if kept is None else list(kept)
+    index_path = _index_path(file_path, sheet_name, key_columns, mode, concat, kept) if persist else None
+    stat = file_stat(file_path)
+    if index_path is not None:
+        saved = _load_index(index_path, stat)
+        if saved is not None:
+            print(f"Índice reaproveitado: {index_path}")
+            return saved
+
+    rows = workbooks.iter_rows(file_path, sheet_name)
+    columns = next(rows, None)
+    if columns is None:
+        raise ValueError("Erro: uma das abas selecionadas está vazia.")
+    key = key_function([_column_index(columns, column, "Arquivo 2") for column in key_columns], mode, concat)
+
+    index = {}
+    project = None if not kept else (lambda row: tuple(row[i] for i in kept))
+    for row in rows:
+        row_key = key(row)
+        if row_key is None:
+            continue
+        if kept == []:
+            index[row_key] = None
+        else:
+            index.setdefault(row_key, []).append(row if project is None else project(row))
+
+    if index_path is not None:
+        # Cabeçalho [versão, tamanho, modificação, origem] e depois colunas e índice
+        os.makedirs(INDEX_DIR, exist_ok=True)
+        tmp_path = f"{index_path}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump([INDEX_VERSION, *stat, os.path.abspath(file_path)], f)
+            pickle.dump((columns, index), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, index_path)
+        prune_cache_dir(INDEX_DIR, INDEX_MAX_BYTES)
+    return columns, index
+
+
+def cross_reference(
+    source_a, source_b, writer, join_type="inner", reconcile=False, workbooks=None, key_mode="exact",
+    persist_index=False, tracker=None,
+):
+    """
+    Cruza `source_a` com `source_b`, cada um um (arquivo, aba, colunas-chave), e
+    grava o resultado em `writer` (ver sped_writers). As colunas-chave podem ser
+    um nome ou uma lista de nomes. Retorna a quantidade de linhas gravada em cada aba.
+    Com `tracker` (job_control.ProgressTracker) são medidas as etapas "index"
+    (leitura de B), "read" (leitura de A), "join" e "write".
+    """
+    if join_type not in JOIN_TYPES:
+        raise ValueError(f"Tipo de cruzamento inválido: {join_type}")
+    if workbooks is None:
+        workbooks = WorkbookCache(copy_dir=None)
+    if tracker is None:
+        tracker = ProgressTracker(0)
+
+    file_a, sheet_a, keys_a = source_a
+    file_b, sheet_b, keys_b = source_b
+    keys_a = [keys_a] if isinstance(keys_a, str) else [str(column) for column in keys_a]
+    keys_b = [keys_b] if isinstance(keys_b, str) else [str(column) for column in keys_b]
+    if not keys_a or not keys_b:
+        raise ValueError("Erro: selecione ao menos uma coluna-chave em cada arquivo.")
+    concat = len(keys_a) != len(keys_b)
+
+    # Os cabeçalhos (só a primeira linha) definem as colunas de B que vão para a saída
+    columns_a = workbooks.columns(file_a, sheet_a)
+    columns_b = workbooks.columns(file_b, sheet_b)
+    if not columns_a or not columns_b:
+        raise ValueError("Erro: uma das abas selecionadas está vazia.")
+    positions_a = [_column_index(columns_a, column, "Arquivo 1") for column in keys_a]
+    key_a = key_function(positions_a, key_mode, concat)
+
+    # Colunas-chave de mesmo nome nos dois lados se repetem e as de B ficam de fora
+    skip_b = set()
+    if not concat and key_mode == "exact":
+        for position, column in zip(positions_a, keys_b):
+            if columns_a[position] == column:
+                skip_b.add(columns_b.index(column))
+    result_columns, kept_b = _output_columns(columns_a, columns_b, skip_b)
+
+    # Lado de construção: o anti join sem conciliação só precisa das chaves de B; a
+    # conciliação precisa das linhas completas para a aba "Somente em B"
+    if reconcile:
+        kept = None
+    elif join_type == "anti":
+        kept = []
+    else:
+        kept = kept_b or None
+    with tracker.stage("index"):
+        _, index = build_index(workbooks, (file_b, sheet_b, keys_b), key_mode, concat, kept, persist_index)
+    print(f"Índice do Arquivo 2: {len(index)} chave(s)")
+
+    rows_a = workbooks.iter_rows(file_a, sheet_a)
+    next(rows_a, None)
+
+    empty_b = (None,) * len(kept_b)
+    writer.set_columns(RESULT_SHEET, columns_a if join_type == "anti" else result_columns)
+    if reconcile:
+        writer.set_columns(ONLY_A_SHEET, columns_a)
+        writer.set_columns(ONLY_B_SHEET, columns_b)
+
+    matched = set()
+    counts = {RESULT_SHEET: 0, ONLY_A_SHEET: 0, ONLY_B_SHEET: 0}
+    while True:
+        with tracker.stage("read"):
+            chunk = list(itertools.islice(rows_a, PROBE_CHUNK_SIZE))
+        if not chunk:
+            break
+        join_started = time.perf_counter()
+        result = []
+        only_a = []
+        for row in chunk:
+            key = key_a(row)
+            if key is None or key not in index:
+                if join_type == "left":
+                    result.append(row + empty_b)
+                elif join_type == "anti":
+                    result.append(row)
+                if reconcile:
+                    only_a.append(row)
+                continue
+            if reconcile:
+                matched.add(key)
+            if join_type != "anti":
+                for row_b in index[key]:
+                    result.append(row + (row_b if kept is not None else tuple(row_b[i] for i in kept_b)))
+        tracker.stages["join"] = tracker.stages.get("join", 0.0) + time.perf_counter() - join_started
+        with tracker.stage("write"):
+            writer.write_rows(RESULT_SHEET, result)
+            counts[RESULT_SHEET] += len(result)
+            if reconcile:
+                writer.write_rows(ONLY_A_SHEET, only_a)
+                counts[ONLY_A_SHEET] += len(only_a)
+        tracker.update(lines=len(chunk))
+
+    if reconcile:
+        with tracker.stage("write"):
+            for key, pairs in index.items():
+                if key not in matched:
+                    writer.write_rows(ONLY_B_SHEET, pairs)
+                    counts[ONLY_B_SHEET] += len(pairs)
+    else:
+        del counts[ONLY_A_SHEET], counts[ONLY_B_SHEET]
+    tracker.update(rows_by_record=counts)
+    return counts
@@ -0,0 +1,103 @@
+"""Varredura de diretórios de entrada com os.scandir.
+
+`scan_files` é um gerador: os caminhos saem à medida que as pastas são lidas, e o
+processamento pode começar antes de a árvore inteira ser listada. Arquivos .zip
+podem ser percorridos sem extração; cada membro aparece como o caminho do .zip
+e o nome do membro separados por ZIP_MEMBER_SEPARATOR e é lido com `read_input`
+(`input_label` dá o nome legível, "arquivo.zip|pasta/nota.xml"). O último .zip
+lido fica aberto até `close_archive`.
+"""
+import fnmatch
+import os
+import zipfile
+
+ZIP_MEMBER_SEPARATOR = "\0"  # o único caractere proibido em caminhos em todos os sistemas
+
+_archive = None  # (caminho, ZipFile) do último .zip aberto neste processo
+
+
+def _matches(patterns, name, relative_path):
+    """Padrões com "/" valem para o caminho relativo; os demais, para o nome."""
+    name = name.lower()
+    relative_path = relative_path.lower()
+    return any(
+        fnmatch.fnmatchcase(relative_path if "/" in pattern else name, pattern.lower())
+        for pattern in patterns
+    )
+
+
+def scan_files(directory, patterns=("*.xml",), recursive=True, include_zip=True):
+    """Gera os caminhos dos arquivos (e membros de .zip) que casam com `patterns`."""
+    pending = [(directory, "")]
+    while pending:
+        current, prefix = pending.pop()
+        subdirectories = []
+        # Os arquivos saem na ordem do os.scandir, sem esperar a listagem da pasta
+        with os.scandir(current) as entries:
+            for entry in entries:
+                relative_path = prefix + entry.name
+                if entry.is_dir(follow_symlinks=False):
+                    if recursive:
+                        subdirectories.append((entry.path, relative_path + "/"))
+                elif _matches(patterns, entry.name, relative_path):
+                    yield entry.path
+                elif include_zip and entry.name.lower().endswith(".zip"):
+                    yield from _scan_zip(entry.path, relative_path + "/", patterns)
+        # Percorre as subpastas na ordem alfabética (a pilha é lida do fim)
+        subdirectories.sort(reverse=True)
+        pending.extend(subdirectories)
+
+
+def _scan_zip(archive_path, prefix, patterns):
+    try:
+        with zipfile.ZipFile(archive_path) as archive:
+            names = [info.filename for info in archive.infolist() if not info.is_dir()]
+    except (OSError, zipfile.BadZipFile) as e:
+        print(f"Erro ao ler o arquivo compactado {archive_path}: {e}")
+        return
+    for name in names:
+        if _matches(patterns, name.rsplit("/", 1)[-1], prefix + name):
+            yield f"{archive_path}{ZIP_MEMBER_SEPARATOR}{name}"
+
+
+def _open_archive(archive_path):
+    """Mantém aberto o último .zip lido, já que os membros chegam em sequência."""
+    global _archive
+    if _archive is None or _archive[0] != archive_path:
+        if _archive is not None:
+            _archive[1].close()
+        _archive = (archive_path, zipfile.ZipFile(archive_path))
+    return _archive[1]
+
+
+def close_archive():
+    """Fecha o .zip mantido aberto por read_input/input_stat (no Windows ele fica bloqueado)."""
+    global _archive
+    if _archive is not None:
+        _archive[1].close()
+        _archive = None
+
+
+def input_label(path):
+    """Caminho para as mensagens: membros de .zip aparecem como "arquivo.zip|membro"."""
+    return path.replace(ZIP_MEMBER_SEPARATOR, "|")
+
+
+def read_input(path):
+    """Lê o conteúdo de um arquivo ou de um membro de .zip."""
+    if ZIP_MEMBER_SEPARATOR in path:
+        archive_path, name = path.split(ZIP_MEMBER_SEPARATOR, 1)
+        return _open_archive(archive_path).read(name)
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def input_stat(path):
+    """(tamanho, marca de alteração) do arquivo; para membros de .zip usa o CRC."""
+    if ZIP_MEMBER_SEPARATOR in path:
+        archive_path, name = path.split(ZIP_MEMBER_SEPARATOR, 1)
+        info = _open_archive(archive_path).getinfo(name)
+        return info.file_size, info.CRC
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
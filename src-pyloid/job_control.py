@@ -0,0 +1,178 @@
+"""Progresso, métricas e cancelamento de tarefas longas.
+
+Além do progresso, o ProgressTracker mede o tempo de cada etapa (leitura, parse,
+filtro, junção, gravação) e o pico de memória. Ao terminar, a execução pode ser
+registrada no histórico local (RUN_HISTORY_PATH, um JSON por linha), para ver
+onde o tempo foi gasto num arquivo lento.
+"""
+import datetime
+import json
+import os
+import platform
+import threading
+import time
+from contextlib import contextmanager
+
+RUN_HISTORY_MAX_BYTES = 5 * 1024 * 1024  # acima disto o histórico vira .1 e recomeça
+
+if platform.system() == "Windows":
+    RUN_HISTORY_PATH = os.path.join(os.getenv("LOCALAPPDATA", os.path.expanduser("~")), "IVFTax", "run_history.jsonl")
+else:
+    RUN_HISTORY_PATH = os.path.expanduser("~/.IVFTax/run_history.jsonl")
+
+
+def peak_memory_mb():
+    """Pico de memória (RSS) do processo atual em MB, ou None se não puder ser medido."""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return _windows_peak_memory_mb()
+    scale = 1 if platform.system() == "Darwin" else 1024  # ru_maxrss: bytes no macOS, KB no Linux
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 1024 ** 2, 1)
+
+
+def _windows_peak_memory_mb():
+    try:
+        import ctypes
+        from ctypes import wintypes
+
+        class ProcessMemoryCounters(ctypes.Structure):
+            _fields_ = [
+                ("cb", wintypes.DWORD),
+                ("PageFaultCount", wintypes.DWORD),
+                ("PeakWorkingSetSize", ctypes.c_size_t),
+                ("WorkingSetSize", ctypes.c_size_t),
+                ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                ("PagefileUsage", ctypes.c_size_t),
+                ("PeakPagefileUsage", ctypes.c_size_t),
+            ]
+
+        counters = ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if not ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+            return None
+        return round(counters.PeakWorkingSetSize / 1024 ** 2, 1)
+    except (AttributeError, OSError):
+        return None
+
+
+def append_run_history(entry, path=None):
+    """Acrescenta a execução ao histórico local; falhas de gravação só são registradas no log."""
+    path = path or RUN_HISTORY_PATH
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if os.path.exists(path) and os.path.getsize(path) > RUN_HISTORY_MAX_BYTES:
+            os.replace(path, f"{path}.1")
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    except OSError as e:
+        print(f"Erro ao gravar o histórico de execuções: {e}")
+
+
+class JobCancelled(Exception):
+    """Levantada quando o usuário cancela o processamento."""
+
+
+class CancelToken:
+    """Sinalizador de cancelamento verificado entre os blocos processados."""
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise JobCancelled("Processamento cancelado pelo usuário.")
+
+
+class ProgressTracker:
+    """
+    Acumula o progresso (bytes lidos, linhas, linhas por registro) e o envia para
+    `callback` como um dicionário, no máximo a cada `interval` segundos.
+    `expected_rows` ({registro: quantidade}, por exemplo do Bloco 9) é repassado
+    para que a interface mostre quanto falta de cada registro.
+
+    As etapas medidas nos processos de trabalho chegam por `update(stages=...)` e
+    as do processo principal por `stage(nome)`; os tempos são somados, então com
+    vários processos a soma pode passar do tempo decorrido. Com `history`
+    (dicionário com o tipo do job e os parâmetros) a execução é registrada no
+    histórico ao terminar.
+    """
+
+    def __init__(self, total_bytes, callback=None, interval=0.5, expected_rows=None, history=None):
+        self.total_bytes = total_bytes
+        self.callback = callback
+        self.interval = interval
+        self.expected_rows = expected_rows or {}
+        self.history = history
+        self.bytes_read = 0
+        self.lines = 0
+        self.rows = {}
+        self.stages = {}
+        self.worker_peak_memory = None
+        self.started = time.monotonic()
+        self._last_emit = 0.0
+
+    @contextmanager
+    def stage(self, name):
+        """Soma a duração do bloco ao tempo da etapa `name`."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - started
+
+    def update(self, bytes_read=0, lines=0, rows_by_record=None, stages=None, worker_peak_memory=None):
+        self.bytes_read += bytes_read
+        self.lines += lines
+        for record_type, count in (rows_by_record or {}).items():
+            self.rows[record_type] = self.rows.get(record_type, 0) + count
+        for name, seconds in (stages or {}).items():
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+        if worker_peak_memory is not None:
+            self.worker_peak_memory = max(self.worker_peak_memory or 0, worker_peak_memory)
+        now = time.monotonic()
+        if self.callback and now - self._last_emit >= self.interval:
+            self._last_emit = now
+            self.callback(self.snapshot())
+
+    def snapshot(self, status="running"):
+        elapsed = time.monotonic() - self.started
+        fraction = self.bytes_read / self.total_bytes if self.total_bytes else 1.0
+        eta = elapsed * (1 - fraction) / fraction if 0 < fraction < 1 else 0.0
+        return {
+            "status": status,
+            "percent": min(100, int(fraction * 100)),
+            "bytesRead": self.bytes_read,
+            "totalBytes": self.total_bytes,
+            "lines": self.lines,
+            "linesPerSecond": int(self.lines / elapsed) if elapsed > 0 else 0,
+            "rows": dict(self.rows),
+            "expectedRows": dict(self.expected_rows),
+            "elapsedSeconds": round(elapsed, 1),
+            "etaSeconds": round(eta, 1),
+            "stages": {name: round(seconds, 3) for name, seconds in self.stages.items()},
+            "peakMemoryMB": peak_memory_mb(),
+            "peakWorkerMemoryMB": self.worker_peak_memory,
+        }
+
+    def finish(self, status="finished"):
+        snapshot = self.snapshot(status)
+        if self.callback:
+            self.callback(snapshot)
+        if self.history is not None:
+            append_run_history({
+                **self.history,
+                "finishedAt": datetime.datetime.now().isoformat(timespec="seconds"),
+                **{key: value for key, value in snapshot.items() if key not in ("percent", "etaSeconds")},
+            })
@@ -0,0 +1,230 @@
+"""Fila de tarefas (jobs) com prioridade, status persistente e cancelamento.
+
+Cada job roda em uma thread coordenadora, que cuida da leitura/gravação de
+arquivos; o processamento pesado é enviado pelo próprio job ao pool de processos
+(ver sped_tasks.run_tasks). A fila é salva em disco a cada mudança de status, e
+os jobs que ainda estavam na fila quando o aplicativo foi fechado são retomados
+na próxima execução.
+"""
+import heapq
+import itertools
+import json
+import os
+import platform
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from job_control import CancelToken
+
+FINAL_STATUSES = ("finished", "error", "cancelled", "interrupted")
+MAX_HISTORY = 200  # jobs finalizados mantidos no histórico
+
+if platform.system() == "Windows":
+    QUEUE_PATH = os.path.join(os.getenv("LOCALAPPDATA", os.path.expanduser("~")), "IVFTax", "job_queue.json")
+else:
+    QUEUE_PATH = os.path.expanduser("~/.IVFTax/job_queue.json")
+
+
+def default_max_running():
+    """Jobs simultâneos: cada job já usa o pool de processos, então poucos bastam."""
+    return max(1, min(4, (os.cpu_count() or 1) // 4))
+
+
+class JobScheduler:
+    def __init__(self, state_path=None, max_running=None):
+        self.state_path = state_path
+        self.max_running = max_running or default_max_running()
+        self.jobs = {}
+        self.handlers = {}
+        self._queue = []  # heap de (-prioridade, ordem, id)
+        self._order = itertools.count()
+        self._tokens = {}
+        self._running = 0
+        self._started = False
+        self._lock = threading.RLock()
+        self._threads = ThreadPoolExecutor(max_workers=self.max_running, thread_name_prefix="job")
+        self._load()
+
+    def register(self, kind, handler):
+        """
+        Registra a função que executa jobs do tipo `kind`.
+
+        A função recebe (parâmetros, progress_callback, cancel_token) e retorna um
+        dicionário com "success", "message" e, se cancelado, "cancelled".
+        """
+        with self._lock:
+            self.handlers[kind] = handler
+
+    def start(self):
+        """Começa a despachar os jobs da fila (inclusive os retomados do disco)."""
+        with self._lock:
+            self._started = True
+            self._dispatch()
+
+    def submit(self, kind, params, title="", priority=0):
+        with self._lock:
+            job_id = uuid.uuid4().hex[:12]
+            self.jobs[job_id] = {
+                "id": job_id,
+                "kind": kind,
+                "title": title or kind,
+                "params": params,
+                "priority": priority,
+                "status": "queued",
+                "message": "",
+                "progress": {},
+                "createdAt": time.time(),
+                "startedAt": None,
+                "finishedAt": None,
+            }
+            heapq.heappush(self._queue, (-priority, next(self._order), job_id))
+            self._save()
+            self._dispatch()
+            return self._public(self.jobs[job_id])
+
+    def get_job(self, job_id):
+        with self._lock:
+            job = self.jobs.get(job_id)
+            return self._public(job) if job else None
+
+    def list_jobs(self):
+        """Lista os jobs: primeiro os em execução, depois a fila (por prioridade) e o histórico."""
+        with self._lock:
+            queued_order = {job_id: rank for rank, (_, _, job_id) in enumerate(sorted(self._queue))}
+            jobs = [self._public(job) for job in self.jobs.values()]
+        status_rank = {"running": 0, "queued": 1}
+        return sorted(
+            jobs,
+            key=lambda job: (
+                status_rank.get(job["status"], 2),
+                queued_order.get(job["id"], 0),
+                -(job["finishedAt"] or job["createdAt"]),
+            ),
+        )
+
+    def set_priority(self, job_id, priority):
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is None or job["status"] != "queued":
+                return False
+            job["priority"] = priority
+            self._queue = [entry for entry in self._queue if entry[2] != job_id]
+            self._queue.append((-priority, next(self._order), job_id))
+            heapq.heapify(self._queue)
+            self._save()
+            return True
+
+    def cancel(self, job_id):
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return False
+            if job["status"] == "queued":
+                self._queue = [entry for entry in self._queue if entry[2] != job_id]
+                heapq.heapify(self._queue)
+                self._finish(job, "cancelled", "Cancelado antes de iniciar.")
+                return True
+            if job["status"] == "running":
+                self._tokens[job_id].cancel()
+                return True
+            return False
+
+    def _dispatch(self):
+        if not self._started:
+            return
+        while self._queue and self._running < self.max_running:
+            _, _, job_id = heapq.heappop(self._queue)
+            job = self.jobs.get(job_id)
+            if job is None or job["status"] != "queued":
+                continue
+            if job["kind"] not in self.handlers:
+                self._finish(job, "error", f"Tipo de job desconhecido: {job['kind']}")
+                continue
+            job["status"] = "running"
+            job["startedAt"] = time.time()
+            self._tokens[job_id] = CancelToken()
+            self._running += 1
+            self._save()
+            self._threads.submit(self._run, job_id)
+
+    def _run(self, job_id):
+        with self._lock:
+            job = self.jobs[job_id]
+            handler = self.handlers[job["kind"]]
+            token = self._tokens[job_id]
+
+        def progress_callback(state):
+            with self._lock:
+                job["progress"] = state
+
+        try:
+            result = handler(job["params"], progress_callback, token)
+            if result.get("cancelled"):
+                status = "cancelled"
+            else:
+                status = "finished" if result.get("success") else "error"
+            message = result.get("message", "")
+        except Exception as e:
+            print(f"Erro no job {job_id}: {traceback.format_exc()}")
+            status, message = "error", f"Erro durante o processamento: {e}"
+
+        with self._lock:
+            self._running -= 1
+            self._tokens.pop(job_id, None)
+            self._finish(job, status, message)
+            self._dispatch()
+
+    def _finish(self, job, status, message):
+        job["status"] = status
+        job["message"] = message
+        job["finishedAt"] = time.time()
+        self._trim_history()
+        self._save()
+
+    def _trim_history(self):
+        finished = sorted(
+            (job for job in self.jobs.values() if job["status"] in FINAL_STATUSES),
+            key=lambda job: job["finishedAt"] or 0,
+        )
+        for job in finished[:-MAX_HISTORY]:
+            del self.jobs[job["id"]]
+
+    @staticmethod
+    def _public(job):
+        return {key: value for key, value in job.items() if key != "params"}
+
+    def _save(self):
+        if not self.state_path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
+            persisted = [{**job, "progress": {}} for job in self.jobs.values()]
+            tmp_path = f"{self.state_path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(persisted, f, ensure_ascii=False)
+            os.replace(tmp_path, self.state_path)
+        except (OSError, TypeError) as e:
+            print(f"Erro ao salvar a fila de jobs: {e}")
+
+    def _load(self):
+        if not self.state_path or not os.path.exists(self.state_path):
+            return
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                persisted = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Erro ao carregar a fila de jobs: {e}")
+            return
+        for job in persisted:
+            if job["status"] == "running":
+                # O aplicativo foi fechado durante a execução
+                job["status"] = "interrupted"
+                job["message"] = "Interrompido: o aplicativo foi fechado durante o processamento."
+                job["finishedAt"] = job.get("finishedAt") or time.time()
+            self.jobs[job["id"]] = job
+        for job in sorted(self.jobs.values(), key=lambda job: job["createdAt"]):
+            if job["status"] == "queued":
+                heapq.heappush(self._queue, (-job["priority"], next(self._order), job["id"]))
@@ -1,36 +1,69 @@
 from pyloid import Pyloid, PyloidAPI, Bridge, is_production, get_production_path
+import io
+import itertools
 import os
 import pandas as pd
-import xml.etree.ElementTree as ET
 import json
 import base64
 import platform
+import time
 from PySide6.QtWidgets import QFileDialog
 from cryptography.fernet import Fernet
 from typing import Optional, Dict
 from PySide6.QtCore import QObject, QThread , Signal, Slot
-from concurrent.futures import ThreadPoolExecutor
+import multiprocessing
 
 import traceback
+
+from cross_reference import cross_reference
+from job_control import JobCancelled, ProgressTracker
+from job_scheduler import QUEUE_PATH, JobScheduler
+from pipelines import process_sped_files, process_xml_files
+from sped_hierarchy import parse_relations
+from sped_index import get_record_counts
+from sped_reader import parse_column_selection
+from sped_tasks import (
+    MAX_WORKERS,
+    convert_excel_file,
+    convert_excel_file_task,
+    convert_txt_file,
+    run_tasks,
+)
+from sped_writers import OUTPUT_FORMATS, create_record_writer, output_path
+from file_scanner import close_archive, input_label, input_stat, read_input, scan_files
+from nfe_schema import NFeExtractor
+from workbook_cache import WorkbookCache
+from xml_manifest import XmlManifest
+from xml_tasks import batch_paths, column_fill_rates, extract_xml_batch
+
+# Os processos de trabalho (multiprocessing com spawn) reimportam este módulo como
+# "__mp_main__"; a aplicação só deve ser criada no processo principal.
+IS_MAIN_PROCESS = __name__ == "__main__"
+
 # Configuração do Pyloid
-app = Pyloid(app_name="IVFTax", single_instance=True)
+if IS_MAIN_PROCESS:
+    multiprocessing.freeze_support()
+    app = Pyloid(app_name="IVFTax", single_instance=True)
+
+    if is_production():
+        app.set_icon(os.path.join(get_production_path(), "icons/icon.png"))
+        app.set_tray_icon(os.path.join(get_production_path(), "icons/icon.png"))
+        splash_image_path = os.path.join(get_production_path(), "icons/icon.png")
+        production_path = get_production_path()
 
-if is_production():
-    app.set_icon(os.path.join(get_production_path(), "icons/icon.png"))
-    app.set_tray_icon(os.path.join(get_production_path(), "icons/icon.png"))
-    splash_image_path = os.path.join(get_production_path(), "icons/icon.png")
-    production_path = get_production_path()
+    else:
+        app.set_icon("src-pyloid/icons/icon.png")
+        app.set_tray_icon("src-pyloid/icons/icon.png")
+        splash_image_path = "src-pyloid/icons/splash.png"
 
-else:
-    app.set_icon("src-pyloid/icons/icon.png")
-    app.set_tray_icon("src-pyloid/icons/icon.png")
-    splash_image_path = "src-pyloid/icons/splash.png"
+    # Fila de jobs: cada job coordena a leitura/gravação em uma thread e envia o
+    # processamento pesado ao pool de processos (sped_tasks.run_tasks)
+    job_scheduler = JobScheduler(QUEUE_PATH)
 
-executor = ThreadPoolExecutor(max_workers=2)
 class WorkerSignals(QObject):
     finished = Signal(object)  # Signal for completion (can send data)
     error = Signal(str)       # Signal for errors
-    progress = Signal(int)     # Signal for progress updates
+    progress = Signal(object)  # Signal for progress updates (dict com bytes, linhas/s, ETA...)
     notification = Signal(str, str) #Signal for notifications
 
 # Classe API Customizada
@@ -44,15 +77,22 @@ class CustomAPI(PyloidAPI,QObject):
         self.worker_signals.finished.connect(self.handle_finished)
         self.worker_signals.error.connect(self.handle_error)
         self.worker_signals.notification.connect(self.handle_notification)
+        self.current_job_id = None
+        job_scheduler.register("sped_extraction", self.long_task)
+
+    def long_task(self, params, progress_callback, cancel_token):
+        """Executa um job de extração SPED da fila (chamado pelo job_scheduler)."""
+        def report_progress(snapshot):
+            # O estado vai para o job (consultado por get_progress) e para o sinal
+            progress_callback(snapshot)
+            self.worker_signals.progress.emit(snapshot)
 
-    def long_task(self, file_name, record_numbers, selected_columns, relate_c100_c170):
         try:
             print("Iniciando long_task...")
             result = self.process_files(
-                file_name=file_name,
-                record_numbers=record_numbers,
-                selected_columns=selected_columns,
-                relate_c100_c170=relate_c100_c170,
+                **params,
+                progress_callback=report_progress,
+                cancel_token=cancel_token,
             )
             print("Emitindo sinal finished...")
             self.worker_signals.finished.emit(result)
@@ -60,26 +100,74 @@ class CustomAPI(PyloidAPI,QObject):
             if result.get("success"):
                 print("Emitindo notificação de sucesso...")
                 self.worker_signals.notification.emit("Processamento Concluído", result.get("message"))
-                self.worker_signals.finished.emit(result)
-            else:
+            elif not result.get("cancelled"):
                 print("Emitindo notificação de erro...")
                 self.worker_signals.notification.emit("Erro no Processamento", result.get("message"))
+            return result
         except Exception as e:
             error_message = traceback.format_exc()
             print(f"Erro em long_task: {error_message}")
             self.worker_signals.error.emit(f"Erro durante o processamento: {error_message}")
             self.worker_signals.notification.emit("Erro no Processamento", f"Erro durante o processamento: {error_message}")
+            return {"success": False, "message": f"Erro durante o processamento: {e}"}
 
-
-
-    @Bridge(str, str, list, bool, result=dict)
-    def process_files_with_thread(self, file_name, record_numbers, selected_columns, relate_c100_c170):
-        """Inicia o processamento em uma thread e conecta os sinais."""
+    @Bridge(str, str, list, bool, str, list, result=dict)
+    def process_files_with_thread(self, file_name, record_numbers, selected_columns, relate_c100_c170, output_format, relations):
+        """Adiciona o processamento à fila de jobs; os arquivos e o diretório atuais vão junto."""
         if not self.selected_files or not self.save_directory:
             return {"success": False, "message": "Arquivos ou diretório não selecionados."}
 
-        executor.submit(self.long_task, file_name, record_numbers, selected_columns, relate_c100_c170)
-        return {"success": True, "message": "Processamento iniciado."}
+        job = job_scheduler.submit(
+            "sped_extraction",
+            {
+                "file_name": file_name,
+                "record_numbers": record_numbers,
+                "selected_columns": selected_columns,
+                "relate_c100_c170": relate_c100_c170,
+                "output_format": output_format,
+                "relations": relations,
+                "selected_files": list(self.selected_files),
+                "save_directory": self.save_directory,
+            },
+            title=f"{file_name} ({record_numbers})",
+        )
+        self.current_job_id = job["id"]
+        message = "Processamento iniciado." if job["status"] == "running" else "Processamento adicionado à fila."
+        return {"success": True, "message": message, "jobId": job["id"]}
+
+    @Bridge(result=dict)
+    def get_progress(self):
+        """Retorna o estado do último job enviado por esta tela (consultado pela interface)."""
+        job = job_scheduler.get_job(self.current_job_id) if self.current_job_id else None
+        if job is None:
+            return {"status": "idle"}
+        return {**job["progress"], "status": job["status"], "message": job["message"], "jobId": job["id"]}
+
+    @Bridge(result=dict)
+    def cancel_processing(self):
+        """Solicita o cancelamento do último job enviado por esta tela."""
+        if self.current_job_id is None or not job_scheduler.cancel(self.current_job_id):
+            return {"success": False, "message": "Nenhum processamento em andamento."}
+        return {"success": True, "message": "Cancelamento solicitado."}
+
+    @Bridge(result=list)
+    def list_jobs(self):
+        """Lista os jobs em execução, na fila e o histórico recente."""
+        return job_scheduler.list_jobs()
+
+    @Bridge(str, result=dict)
+    def cancel_job(self, job_id: str):
+        """Cancela um job da fila ou em execução."""
+        if not job_scheduler.cancel(job_id):
+            return {"success": False, "message": "O job não está na fila nem em execução."}
+        return {"success": True, "message": "Cancelamento solicitado."}
+
+    @Bridge(str, int, result=dict)
+    def set_job_priority(self, job_id: str, priority: int):
+        """Altera a prioridade de um job que ainda está na fila (maior roda antes)."""
+        if not job_scheduler.set_priority(job_id, priority):
+            return {"success": False, "message": "Só é possível priorizar jobs que ainda estão na fila."}
+        return {"success": True, "message": "Prioridade atualizada."}
 
     @Slot(dict)
     def handle_finished(self, result):
@@ -238,42 +326,12 @@ class CustomAPI(PyloidAPI,QObject):
             )
             return {"success": False, "message": f"Erro ao salvar arquivo: {e}"}
 
-    @Bridge(str, result=str)
-    def convert_excel_to_sped(self, excel_file: str):
-        """Converte arquivo Excel para SPED."""
-        try:
-            if not self.save_directory:
-                raise ValueError("Nenhum diretório selecionado para salvar o arquivo.")
-
-            # Carrega o arquivo Excel
-            df = pd.read_excel(excel_file, header=None)
-
-            # Gera as linhas no formato SPED
-            sped_lines = ["|" + "|".join(map(str, row)) + "|" for row in df.values]
-
-            # Salva o resultado no formato SPED
-            save_path = os.path.join(
-                self.save_directory,
-                os.path.splitext(os.path.basename(excel_file))[0] + ".txt"
-            )
-            with open(save_path, "w") as file:
-                file.write("\n".join(sped_lines))
-
-            app.show_notification(
-                title="Conversão Concluída",
-                message=f"Arquivo SPED gerado em: {save_path}",
-            )
-            return {"success": True, "message": f"Arquivo SPED salvo em: {save_path}"}
-        except Exception as e:
-            app.show_notification(
-                title="Erro na Conversão",
-                message=f"Erro: {str(e)}",
-            )
-            return {"success": False, "message": f"Erro na conversão: {e}"}
-
-    @Bridge(str, result=str)
+    @Bridge(str, result=dict)
     def convert_excel_to_sped(self, excel_file: str):
-        """Converte arquivo Excel com múltiplas abas para SPED."""
+        """
+        Converte um arquivo Excel com múltiplas abas (no diretório de salvamento)
+        para SPED, lendo as abas linha a linha e gravando direto no arquivo TXT.
+        """
         try:
             if not self.save_directory:
                 raise ValueError("Nenhum diretório selecionado para salvar o arquivo.")
@@ -285,25 +343,7 @@ class CustomAPI(PyloidAPI,QObject):
             if not os.path.isfile(excel_file_path):
                 raise FileNotFoundError(f"Arquivo não encontrado: {excel_file_path}")
 
-            # Carregar todas as abas do Excel
-            sheets = pd.read_excel(excel_file_path, sheet_name=None, header=None)
-
-            sped_lines = []
-
-            # Iterar por cada aba e processar os dados
-            for sheet_name, df in sheets.items():
-                for _, row in df.iterrows():
-                    sped_lines.append("|" + "|".join(map(str, row)) + "|")
-
-            # Define o caminho para salvar o arquivo SPED
-            save_path = os.path.join(
-                self.save_directory,
-                os.path.splitext(os.path.basename(excel_file_path))[0] + ".txt"
-            )
-
-            # Salvar o resultado no formato SPED
-            with open(save_path, "w") as file:
-                file.write("\n".join(sped_lines))
+            save_path = convert_excel_file(excel_file_path, self.save_directory)
 
             app.show_notification(
                 title="Conversão Concluída",
@@ -323,100 +363,56 @@ class CustomAPI(PyloidAPI,QObject):
             )
             return {"success": False, "message": f"Erro na conversão: {e}"}
 
-    @Bridge(str, str, list, bool, result=str)
-    def process_files(self, file_name: str, record_numbers: str, selected_columns: list, relate_c100_c170: bool):
+    @Bridge(str, str, list, bool, str, list, result=str)
+    def process_files(self, file_name: str, record_numbers: str, selected_columns: list, relate_c100_c170: bool, output_format: str = "xlsx", relations: list = None, progress_callback=None, cancel_token=None, selected_files=None, save_directory=None):
         """
         Processa múltiplos arquivos SPED com base nos números de registro fornecidos,
         nas colunas selecionadas e com a opção de relacionar C100 e C170.
+        A saída pode ser Excel (padrão) ou um conjunto de dados Parquet/Feather por registro.
+        `relations` aceita outros pares pai/filho do layout ("D100:D190", "C100:C190", ...),
+        gravados em uma aba/conjunto "PAI_FILHO". O progresso é enviado para
+        `progress_callback` e o `cancel_token` é verificado entre os blocos lidos.
+        Os jobs da fila informam `selected_files` e `save_directory` do momento do envio.
         """
         try:
-            if not self.selected_files:
+            selected_files = selected_files or self.selected_files
+            save_directory = save_directory or self.save_directory
+            if not selected_files:
                 raise ValueError("Nenhum arquivo selecionado para processar.")
-            if not self.save_directory:
+            if not save_directory:
                 raise ValueError("Nenhum diretório selecionado para salvar o arquivo.")
             if not file_name:
                 raise ValueError("O nome do arquivo de saída é obrigatório.")
+            if output_format not in OUTPUT_FORMATS:
+                raise ValueError(f"Formato de saída inválido: {output_format}")
 
             # Garante que o diretório existe
-            if not os.path.exists(self.save_directory):
-                raise FileNotFoundError(f"Diretório não encontrado: {self.save_directory}")
+            if not os.path.exists(save_directory):
+                raise FileNotFoundError(f"Diretório não encontrado: {save_directory}")
 
             # Lista de registros a serem filtrados
             records = [record.strip() for record in record_numbers.split(",") if record.strip()]
             if not records:
                 raise ValueError("Por favor, insira ao menos um número de registro válido.")
 
-            # Prepara um dicionário para armazenar os dados por tipo de registro
-            dataframes = {}
-            c100_to_c170 = {}  # Relacionamento C100 e C170
+            # Colunas selecionadas, se fornecidas: índices para todos os registros ou
+            # "REGISTRO:índice" para um registro específico
+            column_selection = parse_column_selection(selected_columns)
 
-            for file_path in self.selected_files:
-                with open(file_path, "r", encoding="latin1") as f:
-                    content = f.readlines()
-                    current_c100 = None
-
-                    for line in content:
-                        line = line.strip()
-                        if not line:
-                            continue
-                        fields = line.split("|")
-                        if fields[0] == "":
-                            fields = fields[1:]
-                        if fields and fields[-1] == "":
-                            fields = fields[:-1]
-                        if len(fields) > 0:
-                            record_type = fields[0]
-
-                            # Lógica para relacionar C100 e C170, se ativada
-                            if relate_c100_c170:
-                                if record_type == "C100":
-                                    current_c100 = tuple(fields)
-                                    if current_c100 not in c100_to_c170:
-                                        c100_to_c170[current_c100] = []
-                                elif record_type == "C170" and current_c100:
-                                    c100_to_c170[current_c100].append(tuple(fields))
-
-                            if record_type in records:
-                                if record_type not in dataframes:
-                                    dataframes[record_type] = []
-                                dataframes[record_type].append(fields)
-
-            if not dataframes:
-                raise ValueError("Nenhum registro correspondente encontrado.")
-
-            # Filtra as colunas selecionadas, se fornecidas
-            for record_type in dataframes:
-                if selected_columns:
-                    selected_columns_indices = [int(column_index) for column_index in selected_columns]
-                    dataframes[record_type] = [
-                        [field for idx, field in enumerate(row) if idx in selected_columns_indices]
-                        for row in dataframes[record_type]
-                    ]
-
-            # Define o caminho de salvamento, garantindo que tenha extensão .xlsx
-            save_path = os.path.join(
-                self.save_directory,
-                file_name if file_name.endswith(".xlsx") else f"{file_name}.xlsx"
-            )
+            # Relacionamentos pai/filho (o C100/C170 é mantido pela opção original)
+            relation_pairs = parse_relations(relations)
+            if relate_c100_c170 and ("C100", "C170") not in relation_pairs:
+                relation_pairs.insert(0, ("C100", "C170"))
 
-            # Salva os registros no arquivo Excel
-            with pd.ExcelWriter(save_path, engine="openpyxl") as writer:
-                for record_type, data in dataframes.items():
-                    if data:  # Certifique-se de que há conteúdo para salvar
-                        df = pd.DataFrame(data)
-                        df.to_excel(writer, sheet_name=record_type, index=False, header=False)
-
-                # Adiciona aba para o relacionamento C100 e C170, se ativado
-                if relate_c100_c170 and c100_to_c170:
-                    c100_c170_data = []
-                    for c100, c170_list in c100_to_c170.items():
-                        for c170 in c170_list:
-                            c100_c170_data.append(list(c100) + list(c170))
-
-                    if c100_c170_data:
-                        df = pd.DataFrame(c100_c170_data)
-                        df.to_excel(writer, sheet_name="C100_C170", index=False, header=False)
+            # Define o caminho de salvamento (.xlsx ou diretório do conjunto de dados)
+            save_path = output_path(save_directory, file_name, output_format)
 
+            # Filtra os registros e grava a saída (ver pipelines.process_sped_files)
+            process_sped_files(
+                selected_files, records, column_selection, relation_pairs, output_format, save_path,
+                progress_callback=progress_callback, cancel_token=cancel_token,
+                history={"job": "sped_extraction", "files": list(selected_files), "records": records, "format": output_format},
+            )
             app.show_notification(
                 title="Processamento Concluído",
                 message=f"Arquivo salvo em: {save_path}",
@@ -425,6 +421,9 @@ class CustomAPI(PyloidAPI,QObject):
 
             return {"success": True, "message": f"Processo concluído! Arquivo salvo em: {save_path}"}
             
+        except JobCancelled as e:
+            app.show_notification(title="Processamento Cancelado", message=str(e))
+            return {"success": False, "cancelled": True, "message": str(e)}
         except FileNotFoundError as e:
             error_message = f"Erro no Diretório: {str(e)}"
             app.show_notification(title="Erro no Diretório", message=error_message)
@@ -461,31 +460,25 @@ class CustomAPI(PyloidAPI,QObject):
             if not self.selected_files:
                 raise ValueError("Nenhum arquivo selecionado para analisar.")
 
-            record_numbers = set()
+            # Os registros e suas quantidades vêm do Bloco 9 de cada arquivo; sem ele
+            # (ou se estiver inconsistente) usa o índice, lendo o arquivo inteiro
+            record_counts = {}
             for file_path in self.selected_files:
-                with open(file_path, "r", encoding="latin1") as f:
-                    content = f.readlines()
-                    for line in content:
-                        line = line.strip()
-                        if not line:
-                            continue
-                        fields = line.split("|")
-                        if fields[0] == "":
-                            fields = fields[1:]
-                        if len(fields) > 0:
-                            record_numbers.add(fields[0])
-
-            if not record_numbers:
+                for record_type, count in get_record_counts(file_path).items():
+                    record_counts[record_type] = record_counts.get(record_type, 0) + count
+
+            if not record_counts:
                 raise ValueError("Nenhum número de registro encontrado nos arquivos.")
 
-            return {"success": True, "recordNumbers": sorted(record_numbers)}
+            return {"success": True, "recordNumbers": sorted(record_counts), "recordCounts": record_counts}
         except Exception as e:
             return {"success": False, "message": f"Erro ao identificar números de registro: {e}"}
     
-    @Bridge(result=dict)
-    def convert_txt_to_excel_bulk(self):
+    @Bridge(str, result=dict)
+    def convert_txt_to_excel_bulk(self, output_format: str = "xlsx"):
         """
-        Converte múltiplos arquivos TXT para Excel, criando uma aba para cada registro.
+        Converte múltiplos arquivos TXT para Excel, criando uma aba para cada registro,
+        ou para Parquet/Feather, com um conjunto de dados por registro.
         """
         try:
             if not self.selected_files:
@@ -493,56 +486,26 @@ class CustomAPI(PyloidAPI,QObject):
             if not self.save_directory:
                 raise ValueError("Nenhum diretório de salvamento selecionado.")
 
-            # Função para limpar os nomes das abas
-            def sanitize_sheet_name(name):
-                invalid_chars = ['*', '/', '\\', '?', '[', ']', ':']
-                for char in invalid_chars:
-                    name = name.replace(char, "_")  # Substitui caracteres inválidos por "_"
-                return name[:31]  # Limita o nome da aba a 31 caracteres
-
-            for txt_file_path in self.selected_files:
-                try:
-                    # Tenta abrir o arquivo com codificação UTF-8
-                    with open(txt_file_path, "r", encoding="utf-8") as txt_file:
-                        lines = txt_file.readlines()
-                except UnicodeDecodeError:
-                    # Se falhar, tenta abrir com ISO-8859-1
-                    with open(txt_file_path, "r", encoding="latin1") as txt_file:
-                        lines = txt_file.readlines()
-
-                # Dicionário para armazenar os dados organizados por registro
-                records = {}
-
-                # Processa as linhas e organiza por tipo de registro
-                for line in lines:
-                    line = "".join(char if char.isprintable() else " " for char in line)
-                    line = line.strip()
-                    if not line:
-                        continue
-
-                    fields = line.split("|")
-                    if len(fields) > 1:  # Verifica se há pelo menos um registro válido
-                        record_type = fields[1]  # O tipo de registro está no segundo campo (após o delimitador "|")
-                        if record_type not in records:
-                            records[record_type] = []
-                        records[record_type].append(fields)
-
-                # Define o caminho de saída
-                output_file = os.path.join(
-                    self.save_directory,
-                    os.path.splitext(os.path.basename(txt_file_path))[0] + ".xlsx"
-                )
-
-                # Salva os dados em um arquivo Excel com abas separadas
-                with pd.ExcelWriter(output_file, engine="openpyxl") as writer:
-                    for record_type, data in records.items():
-                        if data:
-                            # Sanitiza o nome da aba e limita a 31 caracteres
-                            sheet_name = sanitize_sheet_name(record_type)
-                            df = pd.DataFrame(data)
-                            df.to_excel(writer, sheet_name=sheet_name, index=False, header=False)
+            if output_format not in OUTPUT_FORMATS:
+                raise ValueError(f"Formato de saída inválido: {output_format}")
 
-            return {"success": True, "message": "Todos os arquivos TXT foram convertidos para Excel com abas por registro."}
+            # Cada arquivo é convertido em um processo de trabalho
+            tasks = [(txt_file_path, self.save_directory, output_format) for txt_file_path in self.selected_files]
+            tracker = ProgressTracker(
+                sum(os.path.getsize(txt_file_path) for txt_file_path, *_ in tasks),
+                history={"job": "txt_conversion", "files": list(self.selected_files), "format": output_format},
+            )
+            status = "error"
+            try:
+                for (txt_file_path, *_), _ in zip(tasks, run_tasks(convert_txt_file, tasks)):
+                    tracker.update(os.path.getsize(txt_file_path))
+                status = "finished"
+            finally:
+                tracker.finish(status)
+
+            if output_format == "xlsx":
+                return {"success": True, "message": "Todos os arquivos TXT foram convertidos para Excel com abas por registro."}
+            return {"success": True, "message": f"Todos os arquivos TXT foram convertidos para {output_format} com um conjunto de dados por registro."}
         except Exception as e:
             return {"success": False, "message": f"Erro ao converter TXT para Excel: {e}"}
 
@@ -554,7 +517,8 @@ class CustomAPI(PyloidAPI,QObject):
     def convert_excel_to_txt_bulk(self):
         """
         Converte múltiplos arquivos Excel para um único arquivo TXT por Excel,
-        preservando zeros à esquerda.
+        preservando zeros à esquerda. Cada arquivo é convertido em um processo de
+        trabalho, e o resultado de cada um é informado em `results`.
         """
         try:
             if not self.selected_files:
@@ -562,40 +526,31 @@ class CustomAPI(PyloidAPI,QObject):
             if not self.save_directory:
                 raise ValueError("Nenhum diretório de salvamento selecionado.")
 
-            for excel_file_path in self.selected_files:
-                # Carregar todas as abas do Excel
-                sheets = pd.read_excel(excel_file_path, sheet_name=None, header=None, dtype=str)
-
-                # Concatenar todas as abas em um único DataFrame
-                combined_df = pd.concat(sheets.values(), ignore_index=True)
-
-                # Substituir valores NaN por strings vazias
-                combined_df.fillna("", inplace=True)
-
-                # Gera linhas no formato TXT
-                lines = []
-                for row in combined_df.values:
-                    # Converte os valores para strings e preserva todos os dados
-                    cleaned_row = list(map(str, row))
-
-                    # Remove campos vazios do final da linha
-                    while cleaned_row and cleaned_row[-1] == "":
-                        cleaned_row.pop()
-
-                    # Adiciona a linha formatada ao resultado
-                    lines.append("|".join(cleaned_row) + "|")
-
-                # Define o caminho de saída
-                output_file = os.path.join(
-                    self.save_directory,
-                    f"{os.path.splitext(os.path.basename(excel_file_path))[0]}.txt"
+            # As abas são lidas linha a linha e gravadas direto no TXT
+            results = []
+            tasks = [(excel_file_path, self.save_directory) for excel_file_path in self.selected_files]
+            tracker = ProgressTracker(
+                sum(os.path.getsize(excel_file_path) for excel_file_path, _ in tasks),
+                history={"job": "excel_conversion", "files": list(self.selected_files)},
+            )
+            for excel_file_path, output_file, error in run_tasks(convert_excel_file_task, tasks):
+                tracker.update(os.path.getsize(excel_file_path))
+                if error:
+                    print(f"Erro ao converter {excel_file_path}: {error}")
+                    results.append({"file": excel_file_path, "success": False, "message": error})
+                else:
+                    results.append({"file": excel_file_path, "success": True, "message": output_file})
+
+            failed = sum(1 for result in results if not result["success"])
+            tracker.finish("finished" if not failed else "error")
+            if not failed:
+                message = "Todos os arquivos Excel foram convertidos para TXT."
+            else:
+                message = (
+                    f"Erro ao converter {failed} de {len(results)} arquivo(s) Excel para TXT; "
+                    f"{len(results) - failed} convertido(s)."
                 )
-
-                # Salva no formato TXT
-                with open(output_file, "w", encoding="utf-8") as txt_file:
-                    txt_file.write("\n".join(lines))
-
-            return {"success": True, "message": "Todos os arquivos Excel foram convertidos para TXT."}
+            return {"success": not failed, "message": message, "results": results}
         except Exception as e:
             return {"success": False, "message": f"Erro ao converter Excel para TXT: {e}"}
 
@@ -605,6 +560,7 @@ class CustomAPI(PyloidAPI,QObject):
         return {
             "finished": self.worker_signals.finished,
             "error": self.worker_signals.error,
+            "progress": self.worker_signals.progress,
             "notification": self.worker_signals.notification,
         }
 
@@ -636,10 +592,11 @@ class CustomAPI(PyloidAPI,QObject):
 
 
 #Na inicialização da sua aplicação
-api_instance = CustomAPI() #Instancia a classe
-api_instance.worker_signals.finished.connect(api_instance.handle_finished)
-api_instance.worker_signals.error.connect(api_instance.handle_error)
-api_instance.worker_signals.notification.connect(api_instance.handle_notification)
+if IS_MAIN_PROCESS:
+    api_instance = CustomAPI() #Instancia a classe
+    api_instance.worker_signals.finished.connect(api_instance.handle_finished)
+    api_instance.worker_signals.error.connect(api_instance.handle_error)
+    api_instance.worker_signals.notification.connect(api_instance.handle_notification)
 
 
 # Classe para Processamento de XML
@@ -647,12 +604,41 @@ class XMLProcessingAPI(PyloidAPI):
     input_directory = ""
     output_directory = ""
     excluded_columns = []  # Armazena as colunas excluídas
+    extractor = NFeExtractor()  # Campos extraídos de cada nota (ver nfe_schema)
+    # Opções de varredura do diretório de entrada (ver file_scanner)
+    scan_patterns = ["*.xml"]
+    scan_recursive = True
+    scan_include_zip = True
+    PREVIEW_SAMPLE_SIZE = 200  # arquivos lidos na pré-visualização
+    preview_cache = {}  # caminho -> ((tamanho, alteração), sha1, (cabeçalho, tabelas))
+
+    def scan_inputs(self):
+        """Gera os arquivos XML do diretório de entrada conforme as opções de varredura."""
+        return scan_files(
+            self.input_directory,
+            patterns=self.scan_patterns,
+            recursive=self.scan_recursive,
+            include_zip=self.scan_include_zip,
+        )
+
+    @Bridge(bool, bool, str, result=str)
+    def save_scan_options(self, recursive: bool, include_zip: bool, patterns: str):
+        """
+        Salva as opções de varredura: incluir subpastas, ler arquivos .zip e os
+        filtros separados por vírgula (ex.: "*.xml, 2024/*/*.xml").
+        """
+        pattern_list = [pattern.strip() for pattern in patterns.split(",") if pattern.strip()]
+        self.scan_patterns = pattern_list or ["*.xml"]
+        self.scan_recursive = recursive
+        self.scan_include_zip = include_zip
+        return "Opções de varredura salvas com sucesso."
 
     @Bridge(result=str)
     def select_input_directory(self):
         """Seleciona o diretório dos arquivos XML."""
         try:
             self.input_directory = app.select_directory_dialog(dir=os.getcwd())
+            self.preview_cache = {}
             if self.input_directory:
                 print(f"Diretório de entrada selecionado: {self.input_directory}")
                 return f"Diretório de entrada selecionado: {self.input_directory}"
@@ -676,29 +662,61 @@ class XMLProcessingAPI(PyloidAPI):
 
     @Bridge(result=dict)
     def preview_file(self):
-        """Carrega a pré-visualização dos dados do primeiro arquivo XML."""
+        """
+        Carrega a pré-visualização a partir de uma amostra de até PREVIEW_SAMPLE_SIZE
+        arquivos XML, lidos em paralelo. Retorna a união das colunas encontradas com o
+        percentual de preenchimento de cada uma. Os arquivos lidos ficam em
+        `preview_cache` e não são lidos de novo no processamento.
+        """
         try:
             if not self.input_directory:
                 return {"error": "Nenhum diretório de entrada selecionado."}
 
-            for file_name in os.listdir(self.input_directory):
-                if file_name.lower().endswith(".xml"):  # Suporte para .XML e .xml
-                    file_path = os.path.join(self.input_directory, file_name)
-                    print(f"Pré-visualizando arquivo: {file_path}")
-                    extracted_data = self.extract_fields_from_xml(file_path)
-                    if extracted_data:
-                        print(f"Dados extraídos: {extracted_data}")
-                        return {
-                            "data": [extracted_data],  # Retorna os dados como uma lista de dicionários
-                            "columns": list(extracted_data.keys()),  # Retorna as chaves como colunas
-                            "file_name": file_name  # Nome do arquivo para referência
-                        }
-
-            print("Nenhum arquivo XML encontrado no diretório.")
-            return {"error": "Nenhum arquivo XML encontrado no diretório."}
+            sample = list(itertools.islice(self.scan_inputs(), self.PREVIEW_SAMPLE_SIZE))
+            if not sample:
+                print("Nenhum arquivo XML encontrado no diretório.")
+                return {"error": "Nenhum arquivo XML encontrado no diretório."}
+            print(f"Pré-visualizando {len(sample)} arquivo(s) de {self.input_directory}")
+
+            self.preview_cache = {}
+            extracted = []
+            tasks = [(batch,) for batch in batch_paths(sample, batch_size=max(1, len(sample) // MAX_WORKERS))]
+            for results in run_tasks(extract_xml_batch, tasks):
+                for file_path, digest, extracted_data, error in results:
+                    if error:
+                        print(f"Erro ao processar o arquivo {input_label(file_path)}: {error}")
+                        continue
+                    self.preview_cache[file_path] = (input_stat(file_path), digest, extracted_data)
+                    extracted.append(extracted_data)
+            if not extracted:
+                return {"error": "Nenhum dado encontrado nos arquivos XML da amostra."}
+
+            # União das colunas preenchidas em ao menos uma nota/linha da amostra
+            sheets = {"Notas": self.extractor.header_columns, **self.extractor.table_columns}
+            fill_rates = column_fill_rates(extracted, sheets)
+            columns = []
+            rates = {}
+            for name, table_rates in fill_rates.items():
+                for column, rate in table_rates.items():
+                    if rate > 0 and column not in rates:
+                        columns.append(column)
+                        rates[column] = rate
+
+            # Uma linha por item, com os campos da nota repetidos
+            rows = []
+            for header, tables in extracted[:5]:
+                rows.extend([{**header, **item} for item in tables["Itens"]] or [header])
+            return {
+                "data": rows,  # Retorna os dados como uma lista de dicionários
+                "columns": columns,
+                "fillRates": rates,  # Percentual de preenchimento de cada coluna na amostra
+                "file_name": f"{len(extracted)} arquivo(s) da amostra",
+            }
         except Exception as e:
             print(f"Erro ao carregar a pré-visualização: {e}")
             return {"error": f"Erro ao carregar a pré-visualização: {e}"}
+        finally:
+            close_archive()
 
     @Bridge(list, result=str)
     def save_excluded_columns(self, columns):
@@ -710,38 +728,52 @@ class XMLProcessingAPI(PyloidAPI):
         self.excluded_columns = columns
         return "Colunas excluídas salvas com sucesso."
 
-    @Bridge(result=str)
-    def process_files(self):
-        """Processa os arquivos XML e salva o resultado."""
+    @Bridge(str, str, bool, result=str)
+    def process_files(self, output_file_name: str = "", output_format: str = "xlsx", incremental: bool = False):
+        """
+        Processa os arquivos XML e salva o resultado: uma aba (ou conjunto de dados
+        Parquet/Feather/CSV) para as notas e uma para cada tabela do esquema. As linhas
+        são gravadas à medida que os lotes ficam prontos, sem acumular tudo em memória.
+        No modo incremental só os arquivos novos ou alterados desde a última execução
+        são lidos; os demais vêm do manifesto (ver xml_manifest).
+        """
         if not self.input_directory:
             return "Nenhum diretório de entrada selecionado."
         if not self.output_directory:
             return "Nenhum diretório de saída selecionado."
+        if output_format not in OUTPUT_FORMATS:
+            return f"Formato de saída inválido: {output_format}"
 
         print(f"Processando arquivos XML no diretório: {self.input_directory}")
         print(f"Colunas excluídas: {self.excluded_columns}")
 
-        all_data = []
-        for file_name in os.listdir(self.input_directory):
-            if file_name.lower().endswith(".xml"):
-                file_path = os.path.join(self.input_directory, file_name)
-                extracted_data = self.extract_fields_from_xml(file_path)
-                if extracted_data:
-                    all_data.append(
-                        {
-                            key: value
-                            for key, value in extracted_data.items()
-                            if key not in self.excluded_columns
-                        }
-                    )
-
-        if not all_data:
-            return "Nenhum dado encontrado nos arquivos XML selecionados."
+        # As colunas vêm do esquema, então cada linha pode ir direto para o arquivo
+        sheets = {"Notas": self.extractor.header_columns, **self.extractor.table_columns}
+        sheets = {
+            name: [column for column in columns if column not in self.excluded_columns]
+            for name, columns in sheets.items()
+        }
 
-        output_file = os.path.join(self.output_directory, "notas_fiscais_extracao.xlsx")
+        output_file = output_path(self.output_directory, output_file_name or "notas_fiscais_extracao", output_format)
+        manifest = None
         try:
-            df = pd.DataFrame(all_data)
-            df.to_excel(output_file, index=False)
+            # A varredura é um gerador: os primeiros lotes já são processados
+            # enquanto o restante da árvore ainda está sendo listado
+            files_to_parse = self.scan_inputs()
+            if incremental:
+                manifest = XmlManifest(self.input_directory)
+
+            # Arquivos já lidos na pré-visualização (e inalterados) não são lidos de novo
+            parsed_count, previewed_count, reused_count = process_xml_files(
+                files_to_parse, sheets, output_format, output_file, manifest=manifest, previewed=self._previewed,
+                history={
+                    "job": "xml_extraction", "directory": self.input_directory, "format": output_format,
+                    "incremental": incremental,
+                },
+            )
+
+            if manifest is not None:
+                manifest.save()
             print(f"Processo concluído! Arquivo salvo em: {output_file}")
 
             # Notificação de sucesso
@@ -749,33 +781,42 @@ class XMLProcessingAPI(PyloidAPI):
                 title="Processamento Concluído",
                 message=f"Arquivo salvo em: {output_file}",
             )
-            return f"Processo concluído! Arquivo salvo em: {output_file}"
+            message = f"Processo concluído! Arquivo salvo em: {output_file}"
+            if incremental:
+                message += (
+                    f" ({parsed_count} arquivo(s) lido(s), "
+                    f"{previewed_count} da pré-visualização, "
+                    f"{reused_count} reaproveitado(s) do manifesto)"
+                )
+            return message
+        except ValueError as e:
+            return str(e)
         except Exception as e:
-            print(f"Erro ao salvar o arquivo Excel: {e}")
+            print(f"Erro ao salvar o arquivo: {e}")
 
             # Notificação de erro
             app.show_notification(
                 title="Erro no Processamento",
                 message=f"Erro ao salvar o arquivo: {e}",
             )
-            return f"Erro ao salvar o arquivo Excel: {e}"
+            return f"Erro ao salvar o arquivo: {e}"
+        finally:
+            if manifest is not None:
+                manifest.close()
+
+    def _previewed(self, file_path):
+        """(sha1, dados extraídos) do arquivo lido na pré-visualização, se ele não mudou."""
+        cached = self.preview_cache.get(file_path)
+        if cached is not None and cached[0] == input_stat(file_path):
+            return cached[1], cached[2]
+        return None
 
     def extract_fields_from_xml(self, file_path):
-        """Extrai os campos de um arquivo XML."""
+        """Extrai os campos de um arquivo XML: (cabeçalho, {tabela: linhas})."""
         try:
-            tree = ET.parse(file_path)
-            root = tree.getroot()
-            namespace = {"nfe": "http://www.portalfiscal.inf.br/nfe"}
-            data = {}
-
-            for elem in root.findall(".//nfe:*", namespace):
-                tag = elem.tag.split("}")[1]
-                text = elem.text.strip() if elem.text else ""
-                data[tag] = text
-
-            return data
+            return self.extractor.extract(io.BytesIO(read_input(file_path)))
         except Exception as e:
-            print(f"Erro ao processar o arquivo {file_path}: {e}")
+            print(f"Erro ao processar o arquivo {input_label(file_path)}: {e}")
             return None
 
 
@@ -786,6 +827,7 @@ class SpreadsheetProcessingAPI(PyloidAPI):
     selected_files = [None, None]  # Lista para armazenar os dois arquivos (Arquivo 1 e Arquivo 2)
     sheet_names = {}
     column_names = {}
+    workbooks = WorkbookCache()  # planilhas abertas entre as chamadas (ver workbook_cache)
 
     @Bridge(int, result=str)
     def select_file(self, file_index: int):
@@ -815,7 +857,7 @@ class SpreadsheetProcessingAPI(PyloidAPI):
             print("Nenhum arquivo foi selecionado.")
             return {"error": "Nenhum arquivo foi selecionado."}
         try:
-            sheets = pd.ExcelFile(file_path).sheet_names
+            sheets = self.workbooks.sheet_names(file_path)
             print(f"Nomes das abas carregadas: {sheets}")
             return {"file": file_path, "sheets": sheets}
         except Exception as e:
@@ -826,56 +868,73 @@ class SpreadsheetProcessingAPI(PyloidAPI):
 
     @Bridge(int, str,result=list)
     def load_columns(self, file_index: int, sheet_name: str):
-        """Carrega as colunas de uma aba específica."""
+        """Carrega as colunas de uma aba específica (lê apenas a linha de cabeçalho)."""
         file_path = self.selected_files[file_index]
         if not file_path:
             return ["Nenhum arquivo selecionado."]
         try:
-            df = pd.read_excel(file_path, sheet_name=sheet_name)
-            df.columns = [
-                col if pd.notnull(col) and not str(col).startswith("Unnamed") else f"Coluna_{i+1}"
-                for i, col in enumerate(df.columns)
-            ]
-            return df.columns.tolist()
+            return self.workbooks.columns(file_path, sheet_name)
         except Exception as e:
             return [f"Erro ao carregar colunas: {e}"]
 
-    @Bridge(list, list, str, result=str)
-    def process_cross_reference(self, sheet_names: list, columns: list, save_path: str):
-        """Realiza o cruzamento entre duas planilhas e salva o resultado."""
+    @Bridge(list, list, str, str, bool, str, bool, result=str)
+    def process_cross_reference(
+        self,
+        sheet_names: list,
+        columns: list,
+        save_path: str,
+        join_type: str = "inner",
+        reconcile: bool = False,
+        key_mode: str = "exact",
+        persist_index: bool = False,
+    ):
+        """
+        Realiza o cruzamento entre duas planilhas e salva o resultado. O Arquivo 2 é
+        indexado pela chave e o Arquivo 1 é lido em blocos (ver cross_reference).
+        `columns` traz a coluna-chave (ou a lista de colunas-chave) de cada arquivo.
+        """
         try:
             file1, file2 = self.selected_files
             sheet1, sheet2 = sheet_names
             column1, column2 = columns
-
-            # Carrega os DataFrames das planilhas especificadas
-            df1 = pd.read_excel(file1, sheet_name=sheet1)
-            df2 = pd.read_excel(file2, sheet_name=sheet2)
-
-            print("DataFrame 1:")
-            print(df1.head())
-            print("DataFrame 2:")
-            print(df2.head())
-
-            # Verifica se as colunas selecionadas existem nos DataFrames
-            if column1 not in df1.columns or column2 not in df2.columns:
-                return f"Erro: Coluna '{column1}' ou '{column2}' não encontrada."
-
-            # Realiza o cruzamento entre os DataFrames usando as colunas selecionadas
-            result_df = pd.merge(df1, df2, left_on=column1, right_on=column2, how="inner")
-
-            print("DataFrame resultante:")
-            print(result_df.head())
-
-            # Salva o resultado no arquivo especificado
-            result_df.to_excel(save_path, index=False)
+            print(f"Cruzamento ({join_type}): {file1} [{sheet1}] x {file2} [{sheet2}]")
+
+            # Tempo de cada etapa e pico de memória vão para o histórico de execuções
+            tracker = ProgressTracker(0, history={
+                "job": "cross_reference", "files": [file1, file2], "joinType": join_type, "keyMode": key_mode,
+            })
+            status = "error"
+            try:
+                with create_record_writer("xlsx", save_path) as writer:
+                    counts = cross_reference(
+                        (file1, sheet1, column1),
+                        (file2, sheet2, column2),
+                        writer,
+                        join_type or "inner",
+                        reconcile,
+                        workbooks=self.workbooks,
+                        key_mode=key_mode or "exact",
+                        persist_index=persist_index,
+                        tracker=tracker,
+                    )
+                    if not writer.total_rows:
+                        raise ValueError("Nenhuma linha encontrada para o cruzamento selecionado.")
+                    closing = time.perf_counter()
+                tracker.stages["write"] = tracker.stages.get("write", 0.0) + time.perf_counter() - closing
+                status = "finished"
+            finally:
+                tracker.finish(status)
+            print(f"Linhas gravadas: {counts}")
 
             # Notificação de sucesso
             app.show_notification(
                 title="Cruzamento Concluído",
                 message=f"Arquivo salvo em: {save_path}",
             )
-            return f"Cruzamento concluído! Arquivo salvo em: {save_path}"
+            summary = ", ".join(f"{sheet}: {count}" for sheet, count in counts.items())
+            return f"Cruzamento concluído! Arquivo salvo em: {save_path} ({summary})"
+        except ValueError as e:
+            return str(e)
         except Exception as e:
             # Notificação de erro
             app.show_notification(
@@ -1024,76 +1083,78 @@ class LicenseStorageAPI(PyloidAPI):
 from PySide6.QtCore import QThread
 import time
 
-# Configuração Principal do Pyloid
-try:
-    if is_production():
-        # Configura a janela principal
-        window = app.create_window(
-            title="IVFTax",
-            js_apis=[CustomAPI(), XMLProcessingAPI(), SpreadsheetProcessingAPI(), DecodeHash(), LicenseStorageAPI()],
-        )
-        # Configura a splash screen
-        window.set_static_image_splash_screen(
-            image_path=splash_image_path,
-            close_on_load=False,  # A splash não fecha automaticamente
-            stay_on_top=True,
-            clickable=False,
-            position="center",
-        )
+if IS_MAIN_PROCESS:
+    # Configuração Principal do Pyloid
+    try:
+        if is_production():
+            # Configura a janela principal
+            window = app.create_window(
+                title="IVFTax",
+                js_apis=[CustomAPI(), XMLProcessingAPI(), SpreadsheetProcessingAPI(), DecodeHash(), LicenseStorageAPI()],
+            )
+            # Configura a splash screen
+            window.set_static_image_splash_screen(
+                image_path=splash_image_path,
+                close_on_load=False,  # A splash não fecha automaticamente
+                stay_on_top=True,
+                clickable=False,
+                position="center",
+            )
 
-        # Worker para carregar o conteúdo principal
-        class SplashWorkerThread(QThread):
-            def run(self):
-                # Simula operações de inicialização (ex.: conexão com BD, carregamento de recursos)
-                time.sleep(2)  # Simula um carregamento de 2 segundos
-
-        # Callback após a conclusão do carregamento
-        def finish_callback():
-            window.load_file(os.path.join(get_production_path(), "build/index.html"))
-            window.set_position_by_anchor("center")
-            window.show_and_focus()
-            window.close_splash_screen()
-
-        # Cria e inicia o worker thread
-        splash_worker = SplashWorkerThread()
-        splash_worker.finished.connect(finish_callback)
-        splash_worker.start()
-    else:
-        # Configura a janela principal para ambiente de desenvolvimento
-        window = app.create_window(
-            title="IVFTax",
-            js_apis=[CustomAPI(), XMLProcessingAPI(), SpreadsheetProcessingAPI(), DecodeHash(), LicenseStorageAPI()],
-            dev_tools=True,
-        )
-        # Configura a splash screen
-        window.set_static_image_splash_screen(
-            image_path="src-pyloid/icons/icon.png",
-            close_on_load=False,  # A splash não fecha automaticamente
-            stay_on_top=True,
-            clickable=False,
-            position="center",
-        )
+            # Worker para carregar o conteúdo principal
+            class SplashWorkerThread(QThread):
+                def run(self):
+                    # Simula operações de inicialização (ex.: conexão com BD, carregamento de recursos)
+                    time.sleep(2)  # Simula um carregamento de 2 segundos
+
+            # Callback após a conclusão do carregamento
+            def finish_callback():
+                window.load_file(os.path.join(get_production_path(), "build/index.html"))
+                window.set_position_by_anchor("center")
+                window.show_and_focus()
+                window.close_splash_screen()
+
+            # Cria e inicia o worker thread
+            splash_worker = SplashWorkerThread()
+            splash_worker.finished.connect(finish_callback)
+            splash_worker.start()
+        else:
+            # Configura a janela principal para ambiente de desenvolvimento
+            window = app.create_window(
+                title="IVFTax",
+                js_apis=[CustomAPI(), XMLProcessingAPI(), SpreadsheetProcessingAPI(), DecodeHash(), LicenseStorageAPI()],
+                dev_tools=True,
+            )
+            # Configura a splash screen
+            window.set_static_image_splash_screen(
+                image_path="src-pyloid/icons/icon.png",
+                close_on_load=False,  # A splash não fecha automaticamente
+                stay_on_top=True,
+                clickable=False,
+                position="center",
+            )
 
-        # Worker para carregar o conteúdo principal
-        class SplashWorkerThread(QThread):
-            def run(self):
-                # Simula operações de inicialização (ex.: conexão com BD, carregamento de recursos)
-                time.sleep(2)  # Simula um carregamento de 2 segundos
-
-        # Callback após a conclusão do carregamento
-        def finish_callback():
-            window.load_url("http://localhost:5173")
-            window.set_position_by_anchor("center")
-            window.show_and_focus()
-            window.close_splash_screen()
-
-        # Cria e inicia o worker thread
-        splash_worker = SplashWorkerThread()
-        splash_worker.finished.connect(finish_callback)
-        splash_worker.start()
-except Exception as e:
-    print(f"Erro ao inicializar a janela principal: {e}")
-
-# Executa o aplicativo Pyloid
-app.run()
+            # Worker para carregar o conteúdo principal
+            class SplashWorkerThread(QThread):
+                def run(self):
+                    # Simula operações de inicialização (ex.: conexão com BD, carregamento de recursos)
+                    time.sleep(2)  # Simula um carregamento de 2 segundos
+
+            # Callback após a conclusão do carregamento
+            def finish_callback():
+                window.load_url("http://localhost:5173")
+                window.set_position_by_anchor("center")
+                window.show_and_focus()
+                window.close_splash_screen()
+
+            # Cria e inicia o worker thread
+            splash_worker = SplashWorkerThread()
+            splash_worker.finished.connect(finish_callback)
+            splash_worker.start()
+    except Exception as e:
+        print(f"Erro ao inicializar a janela principal: {e}")
+
+    # Retoma os jobs que ficaram na fila e executa o aplicativo Pyloid
+    job_scheduler.start()
+    app.run()
 
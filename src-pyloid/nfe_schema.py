@@ -0,0 +1,283 @@
+"""Esquema de campos da NF-e e extrator compilado a partir dele.
+
+O esquema é declarativo: cada campo é um par (coluna, caminho). Os caminhos usam
+os nomes locais das tags separados por "/", com "*" para qualquer tag de um nível
+e "@atributo" no final para ler um atributo. Os campos do cabeçalho são comparados
+com o final do caminho do elemento ("emit/CNPJ" vale para nfeProc/NFe/infNFe/emit/CNPJ).
+Os campos das tabelas (itens, duplicatas, pagamentos) são relativos ao elemento
+que forma cada linha.
+
+Cada arquivo é lido uma única vez com iterparse, e só os campos configurados são
+guardados. Todas as linhas levam a chave de acesso da nota na coluna "Chave".
+"""
+try:
+    from lxml import etree as XMLParser
+except ImportError:
+    import xml.etree.ElementTree as XMLParser
+
+KEY_COLUMN = "Chave"
+KEY_PATH = "infNFe/@Id"
+
+NFE_SCHEMA = {
+    "header": [
+        ("cUF", "ide/cUF"),
+        ("cNF", "ide/cNF"),
+        ("natOp", "ide/natOp"),
+        ("mod", "ide/mod"),
+        ("serie", "ide/serie"),
+        ("nNF", "ide/nNF"),
+        ("dhEmi", "ide/dhEmi"),
+        ("dhSaiEnt", "ide/dhSaiEnt"),
+        ("tpNF", "ide/tpNF"),
+        ("idDest", "ide/idDest"),
+        ("cMunFG", "ide/cMunFG"),
+        ("tpEmis", "ide/tpEmis"),
+        ("tpAmb", "ide/tpAmb"),
+        ("finNFe", "ide/finNFe"),
+        ("indFinal", "ide/indFinal"),
+        ("indPres", "ide/indPres"),
+        ("emit_CNPJ", "emit/CNPJ"),
+        ("emit_CPF", "emit/CPF"),
+        ("emit_xNome", "emit/xNome"),
+        ("emit_xFant", "emit/xFant"),
+        ("emit_IE", "emit/IE"),
+        ("emit_CRT", "emit/CRT"),
+        ("emit_xMun", "enderEmit/xMun"),
+        ("emit_UF", "enderEmit/UF"),
+        ("dest_CNPJ", "dest/CNPJ"),
+        ("dest_CPF", "dest/CPF"),
+        ("dest_idEstrangeiro", "dest/idEstrangeiro"),
+        ("dest_xNome", "dest/xNome"),
+        ("dest_indIEDest", "dest/indIEDest"),
+        ("dest_IE", "dest/IE"),
+        ("dest_email", "dest/email"),
+        ("dest_xMun", "enderDest/xMun"),
+        ("dest_UF", "enderDest/UF"),
+        ("tot_vBC", "ICMSTot/vBC"),
+        ("tot_vICMS", "ICMSTot/vICMS"),
+        ("tot_vICMSDeson", "ICMSTot/vICMSDeson"),
+        ("tot_vFCP", "ICMSTot/vFCP"),
+        ("tot_vBCST", "ICMSTot/vBCST"),
+        ("tot_vST", "ICMSTot/vST"),
+        ("tot_vFCPST", "ICMSTot/vFCPST"),
+        ("tot_vProd", "ICMSTot/vProd"),
+        ("tot_vFrete", "ICMSTot/vFrete"),
+        ("tot_vSeg", "ICMSTot/vSeg"),
+        ("tot_vDesc", "ICMSTot/vDesc"),
+        ("tot_vII", "ICMSTot/vII"),
+        ("tot_vIPI", "ICMSTot/vIPI"),
+        ("tot_vIPIDevol", "ICMSTot/vIPIDevol"),
+        ("tot_vPIS", "ICMSTot/vPIS"),
+        ("tot_vCOFINS", "ICMSTot/vCOFINS"),
+        ("tot_vOutro", "ICMSTot/vOutro"),
+        ("tot_vNF", "ICMSTot/vNF"),
+        ("tot_vTotTrib", "ICMSTot/vTotTrib"),
+        ("modFrete", "transp/modFrete"),
+        ("transp_CNPJ", "transporta/CNPJ"),
+        ("transp_xNome", "transporta/xNome"),
+        ("fat_nFat", "fat/nFat"),
+        ("fat_vOrig", "fat/vOrig"),
+        ("fat_vDesc", "fat/vDesc"),
+        ("fat_vLiq", "fat/vLiq"),
+        ("infAdFisco", "infAdic/infAdFisco"),
+        ("infCpl", "infAdic/infCpl"),
+        ("prot_dhRecbto", "infProt/dhRecbto"),
+        ("prot_nProt", "infProt/nProt"),
+        ("prot_cStat", "infProt/cStat"),
+        ("prot_xMotivo", "infProt/xMotivo"),
+    ],
+    "tables": {
+        "Itens": {
+            "row": "det",
+            "fields": [
+                ("nItem", "@nItem"),
+                ("cProd", "prod/cProd"),
+                ("cEAN", "prod/cEAN"),
+                ("xProd", "prod/xProd"),
+                ("NCM", "prod/NCM"),
+                ("CEST", "prod/CEST"),
+                ("CFOP", "prod/CFOP"),
+                ("uCom", "prod/uCom"),
+                ("qCom", "prod/qCom"),
+                ("vUnCom", "prod/vUnCom"),
+                ("vProd", "prod/vProd"),
+                ("vFrete", "prod/vFrete"),
+                ("vSeg", "prod/vSeg"),
+                ("vDesc", "prod/vDesc"),
+                ("vOutro", "prod/vOutro"),
+                ("xPed", "prod/xPed"),
+                ("nItemPed", "prod/nItemPed"),
+                ("ICMS_orig", "imposto/ICMS/*/orig"),
+                ("ICMS_CST", "imposto/ICMS/*/CST"),
+                ("ICMS_CSOSN", "imposto/ICMS/*/CSOSN"),
+                ("ICMS_modBC", "imposto/ICMS/*/modBC"),
+                ("ICMS_vBC", "imposto/ICMS/*/vBC"),
+                ("ICMS_pICMS", "imposto/ICMS/*/pICMS"),
+                ("ICMS_vICMS", "imposto/ICMS/*/vICMS"),
+                ("ICMS_vBCST", "imposto/ICMS/*/vBCST"),
+                ("ICMS_pICMSST", "imposto/ICMS/*/pICMSST"),
+                ("ICMS_vICMSST", "imposto/ICMS/*/vICMSST"),
+                ("IPI_CST", "imposto/IPI/*/CST"),
+                ("IPI_vBC", "imposto/IPI/IPITrib/vBC"),
+                ("IPI_pIPI", "imposto/IPI/IPITrib/pIPI"),
+                ("IPI_vIPI", "imposto/IPI/IPITrib/vIPI"),
+                ("PIS_CST", "imposto/PIS/*/CST"),
+                ("PIS_vBC", "imposto/PIS/*/vBC"),
+                ("PIS_pPIS", "imposto/PIS/*/pPIS"),
+                ("PIS_vPIS", "imposto/PIS/*/vPIS"),
+                ("COFINS_CST", "imposto/COFINS/*/CST"),
+                ("COFINS_vBC", "imposto/COFINS/*/vBC"),
+                ("COFINS_pCOFINS", "imposto/COFINS/*/pCOFINS"),
+                ("COFINS_vCOFINS", "imposto/COFINS/*/vCOFINS"),
+                ("infAdProd", "infAdProd"),
+            ],
+        },
+        "Duplicatas": {
+            "row": "cobr/dup",
+            "fields": [
+                ("nDup", "nDup"),
+                ("dVenc", "dVenc"),
+                ("vDup", "vDup"),
+            ],
+        },
+        "Pagamentos": {
+            "row": "pag/detPag",
+            "fields": [
+                ("indPag", "indPag"),
+                ("tPag", "tPag"),
+                ("vPag", "vPag"),
+            ],
+        },
+    },
+}
+
+
+def _split_path(path):
+    """Divide "a/b/@c" em (["a", "b"], "c"); sem atributo, o segundo item é None."""
+    parts = path.split("/")
+    attribute = None
+    if parts[-1].startswith("@"):
+        attribute = parts.pop()[1:]
+    return parts, attribute
+
+
+def _matches(pattern, names):
+    return len(pattern) == len(names) and all(p == "*" or p == n for p, n in zip(pattern, names))
+
+
+def _suffix_matches(pattern, stack):
+    return len(pattern) <= len(stack) and _matches(pattern, stack[len(stack) - len(pattern):])
+
+
+class NFeExtractor:
+    """
+    Extrator compilado a partir de um esquema no formato de NFE_SCHEMA.
+
+    Os campos ficam indexados pelo nome da última tag do caminho, de modo que cada
+    elemento lido só é comparado com os poucos campos que terminam nele.
+    """
+
+    def __init__(self, schema=NFE_SCHEMA):
+        self.header_columns = [KEY_COLUMN] + [column for column, _ in schema["header"]]
+        self.table_columns = {
+            name: [KEY_COLUMN] + [column for column, _ in table["fields"]]
+            for name, table in schema["tables"].items()
+        }
+
+        # Cabeçalho: {tag: [(caminho, coluna)]} para textos e atributos
+        self._header_text = {}
+        self._header_attrs = {}
+        for column, path in [(KEY_COLUMN, KEY_PATH)] + list(schema["header"]):
+            parts, attribute = _split_path(path)
+            if attribute:
+                self._header_attrs.setdefault(parts[-1], []).append((parts, attribute, column))
+            else:
+                self._header_text.setdefault(parts[-1], []).append((parts, column))
+
+        # Tabelas: {tag da linha: [(nome, caminho da linha, atributos da linha)]} e,
+        # por tabela, {tag: [(caminho relativo, coluna)]}
+        self._local_names = {}  # tag com namespace -> nome local
+        self._rows = {}
+        self._row_text = {}
+        self._row_attrs = {}
+        for name, table in schema["tables"].items():
+            row_path = table["row"].split("/")
+            row_attributes = []
+            text_fields = self._row_text[name] = {}
+            attr_fields = self._row_attrs[name] = {}
+            for column, path in table["fields"]:
+                parts, attribute = _split_path(path)
+                if attribute and not parts:
+                    row_attributes.append((attribute, column))
+                elif attribute:
+                    attr_fields.setdefault(parts[-1], []).append((parts, attribute, column))
+                else:
+                    text_fields.setdefault(parts[-1], []).append((parts, column))
+            self._rows.setdefault(row_path[-1], []).append((name, row_path, row_attributes))
+
+    def extract(self, file_path):
+        """Lê o arquivo e retorna (cabeçalho, {tabela: [linhas]}), com linhas em dicionários."""
+        header = {}
+        tables = {name: [] for name in self.table_columns}
+        stack = []
+        local_names = self._local_names
+        rows = self._rows
+        header_text = self._header_text
+        header_attrs = self._header_attrs
+        row_name = row_depth = row = row_text = row_attrs = None
+
+        for event, elem in XMLParser.iterparse(file_path, events=("start", "end")):
+            tag = elem.tag
+            local_name = local_names.get(tag)
+            if local_name is None:
+                local_name = local_names[tag] = tag[tag.rfind("}") + 1:]
+
+            if event == "start":
+                stack.append(local_name)
+                if row is None:
+                    if local_name in rows:
+                        for name, row_path, row_attributes in rows[local_name]:
+                            if _suffix_matches(row_path, stack):
+                                row_name, row_depth = name, len(stack)
+                                row_text, row_attrs = self._row_text[name], self._row_attrs[name]
+                                row = {KEY_COLUMN: header.get(KEY_COLUMN, "")}
+                                for attribute, column in row_attributes:
+                                    value = elem.get(attribute)
+                                    if value is not None:
+                                        row[column] = value
+                                break
+                    if row is None and local_name in header_attrs:
+                        self._read_attributes(header_attrs[local_name], elem, stack, header, _suffix_matches)
+                        if header.get(KEY_COLUMN, "").startswith("NFe"):
+                            header[KEY_COLUMN] = header[KEY_COLUMN][3:]
+                elif local_name in row_attrs:
+                    self._read_attributes(row_attrs[local_name], elem, stack[row_depth:], row, _matches)
+                continue
+
+            if row is not None:
+                if len(stack) == row_depth:
+                    tables[row_name].append(row)
+                    row = None
+                elif local_name in row_text:
+                    relative = stack[row_depth:]
+                    for parts, column in row_text[local_name]:
+                        if column not in row and _matches(parts, relative):
+                            text = elem.text
+                            row[column] = text.strip() if text else ""
+            elif local_name in header_text:
+                for parts, column in header_text[local_name]:
+                    if column not in header and _suffix_matches(parts, stack):
+                        text = elem.text
+                        header[column] = text.strip() if text else ""
+            stack.pop()
+            elem.clear()
+
+        return header, tables
+
+    @staticmethod
+    def _read_attributes(fields, elem, path, target, matches):
+        for parts, attribute, column in fields:
+            if column not in target and matches(parts, path):
+                value = elem.get(attribute)
+                if value is not None:
+                    target[column] = value
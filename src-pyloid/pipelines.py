@@ -0,0 +1,194 @@
+"""Processamentos completos de SPED e NF-e, sem dependência da interface.
+
+As APIs de main.py validam as escolhas do usuário, chamam estas funções e
+mostram as notificações; os benchmarks (benchmarks/run_benchmarks.py) chamam as
+mesmas funções sem abrir a janela do Pyloid.
+"""
+import time
+from collections import deque
+
+from file_scanner import close_archive, input_label
+from job_control import JobCancelled, ProgressTracker
+from sped_hierarchy import JoinMerger
+from sped_index import get_record_counts, indexed_tasks
+from sped_tasks import parse_file_range, run_tasks
+from sped_writers import create_record_writer
+from xml_tasks import batch_paths, extract_xml_batch
+
+
+def process_sped_files(
+    file_paths, records, column_selection, relation_pairs, output_format, save_path, progress_callback=None,
+    cancel_token=None, history=None,
+):
+    """
+    Filtra os registros `records` dos arquivos SPED e grava uma aba (ou conjunto de
+    dados) por registro, mais uma por relacionamento pai/filho. Retorna a
+    quantidade de linhas gravadas; levanta ValueError se nenhuma for encontrada.
+    O progresso e as métricas de cada etapa vão para `progress_callback` e, com
+    `history`, para o histórico de execuções (ver job_control.ProgressTracker).
+    """
+    # Tipos de registro lidos do arquivo (inclui pais e filhos dos relacionamentos)
+    wanted_records = set(records)
+    for parent_type, child_type in relation_pairs:
+        wanted_records.update((parent_type, child_type))
+
+    tracker = ProgressTracker(0, progress_callback, history=history)
+    status = "error"
+    try:
+        # O índice de cada arquivo indica os blocos de bytes que contêm os registros
+        # pedidos; os blocos são divididos em tarefas processadas em paralelo. A
+        # quantidade esperada de linhas de cada registro vem do Bloco 9 ou do índice
+        with tracker.stage("index"):
+            tasks = [
+                (file_path, spans, records, column_selection, relation_pairs)
+                for file_path, spans in indexed_tasks(file_paths, wanted_records)
+            ]
+            expected_rows = dict.fromkeys(records, 0)
+            for file_path in file_paths:
+                counts = get_record_counts(file_path)
+                for record_type in records:
+                    expected_rows[record_type] += counts.get(record_type, 0)
+        tracker.total_bytes = sum(end - start for _, spans, *_ in tasks for start, end in spans)
+        tracker.expected_rows = expected_rows
+
+        # Grava os resultados na ordem das tarefas, à medida que ficam prontos; os
+        # filhos do início de cada faixa são ligados ao último pai da faixa anterior
+        # e as sequências de pai (depois dos campos do pai) continuam as da faixa anterior
+        join_merger = JoinMerger()
+        with create_record_writer(output_format, save_path) as writer:
+            for task, result in zip(tasks, run_tasks(parse_file_range, tasks, cancel_token=cancel_token)):
+                rows_by_record, joins, orphans, last_parents, stats = result
+                with tracker.stage("write"):
+                    for record_type, rows in rows_by_record.items():
+                        writer.write_rows(record_type, rows)
+                with tracker.stage("join"):
+                    merged = join_merger.merge(task[0], joins, orphans, last_parents)
+                with tracker.stage("write"):
+                    for name, rows in merged.items():
+                        writer.write_rows(name, rows)
+
+                tracker.update(
+                    stats["bytes"], stats["lines"],
+                    {record_type: len(rows) for record_type, rows in rows_by_record.items()},
+                    stats["stages"], stats["peak_memory_mb"],
+                )
+
+            total_rows = writer.total_rows
+            if not total_rows:
+                raise ValueError("Nenhum registro correspondente encontrado.")
+            closing = time.perf_counter()
+        # O fechamento do escritor (que salva o .xlsx) também é gravação
+        tracker.stages["write"] = tracker.stages.get("write", 0.0) + time.perf_counter() - closing
+        status = "finished"
+    except JobCancelled:
+        status = "cancelled"
+        raise
+    finally:
+        tracker.finish(status)
+    return total_rows
+
+
+def write_extracted(writer, sheets, extracted_data):
+    """Grava a nota e as linhas das tabelas, nas colunas de `sheets`."""
+    header, tables = extracted_data
+    writer.write_row("Notas", [header.get(column) for column in sheets["Notas"]])
+    for name, rows in tables.items():
+        columns = sheets[name]
+        writer.write_rows(name, ([row.get(column) for column in columns] for row in rows))
+
+
+def process_xml_files(file_paths, sheets, output_format, output_file, manifest=None, previewed=None, history=None):
+    """
+    Extrai os arquivos XML de `file_paths` (pode ser um gerador) e grava as notas e
+    as tabelas de `sheets` ({aba: colunas}). `previewed(caminho)` retorna (sha1,
+    dados extraídos) dos arquivos já lidos na pré-visualização, ou None: esses não
+    são lidos de novo. Com `manifest` (ver xml_manifest) os arquivos inalterados vêm
+    do manifesto e os demais são registrados nele. Em todos os casos as linhas são
+    gravadas na ordem da varredura, como numa execução completa.
+    Com `history` a execução vai para o histórico, com o tempo de extração ("parse",
+    a espera pelos processos de trabalho), de leitura do manifesto ("read") e de
+    gravação ("write"). Retorna (arquivos lidos, arquivos da pré-visualização,
+    arquivos reaproveitados do manifesto).
+    """
+    tracker = ProgressTracker(0, history=history)
+    status = "error"
+    parsed_count = previewed_count = reused_count = 0
+    read_seconds = 0.0
+
+    # Cada lote da varredura vai para o pool só com os arquivos ainda não lidos; o
+    # lote completo fica na fila para intercalar os resultados na ordem original
+    layouts = deque()
+
+    def tasks():
+        nonlocal read_seconds
+        for batch in batch_paths(file_paths):
+            known = {}  # caminho -> (origem, sha1, dados extraídos)
+            for file_path in batch:
+                if manifest is not None:
+                    started = time.perf_counter()
+                    result = manifest.lookup(file_path)
+                    read_seconds += time.perf_counter() - started
+                    if result is not None:
+                        known[file_path] = ("manifest", *result)
+                        continue
+                if previewed is not None:
+                    result = previewed(file_path)
+                    if result is not None:
+                        known[file_path] = ("preview", *result)
+            layouts.append((batch, known))
+            yield ([file_path for file_path in batch if file_path not in known],)
+
+    try:
+        with create_record_writer(output_format, output_file) as writer:
+            for name, columns in sheets.items():
+                writer.set_columns(name, columns)
+
+            # Os arquivos são distribuídos em lotes pelo pool de processos e os
+            # resultados chegam na ordem dos lotes
+            batches = run_tasks(extract_xml_batch, tasks())
+            while True:
+                with tracker.stage("parse"):
+                    results = next(batches, None)
+                if results is None:
+                    break
+                with tracker.stage("write"):
+                    batch, known = layouts.popleft()
+                    parsed = iter(results)
+                    for file_path in batch:
+                        source = known.get(file_path)
+                        if source is None:
+                            parsed_count += 1
+                            file_path, digest, extracted_data, error = next(parsed)
+                        elif source[0] == "manifest":
+                            reused_count += 1
+                            write_extracted(writer, sheets, source[2])
+                            continue
+                        else:
+                            previewed_count += 1
+                            _, digest, extracted_data = source
+                            error = None
+                        if error:
+                            print(f"Erro ao processar o arquivo {input_label(file_path)}: {error}")
+                            if manifest is not None:
+                                manifest.forget(file_path)
+                            continue
+                        if manifest is not None:
+                            manifest.add(file_path, digest, extracted_data)
+                        write_extracted(writer, sheets, extracted_data)
+
+            # A leitura do manifesto acontece enquanto as tarefas são montadas,
+            # dentro da espera medida como "parse"
+            tracker.stages["read"] = read_seconds
+            tracker.stages["parse"] = tracker.stages.get("parse", 0.0) - read_seconds
+
+            if not writer.total_rows:
+                raise ValueError("Nenhum dado encontrado nos arquivos XML selecionados.")
+            tracker.update(rows_by_record=writer.row_counts)
+            closing = time.perf_counter()
+        tracker.stages["write"] = tracker.stages.get("write", 0.0) + time.perf_counter() - closing
+        status = "finished"
+    finally:
+        # O manifesto e a pré-visualização consultam os .zip neste processo
+        close_archive()
+        tracker.finish(status)
+    return parsed_count, previewed_count, reused_count
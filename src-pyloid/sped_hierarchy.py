@@ -0,0 +1,200 @@
+"""Hierarquia dos registros SPED e junção pai/filho em streaming.
+
+A hierarquia segue os níveis do Guia Prático da EFD ICMS/IPI: o pai de um
+registro é o registro anterior do layout com nível imediatamente inferior
+(0000 → C001 → C100 → C170/C190, D100 → D190, ...). Como o arquivo SPED é uma
+travessia em pré-ordem dessa árvore, o ancestral de tipo P de uma linha é sempre
+a última linha de tipo P lida antes dela; basta guardar uma linha por tipo de
+pai, e a memória não depende do tamanho do arquivo.
+"""
+
+# (registro, nível) na ordem do layout da EFD ICMS/IPI
+SPED_LAYOUT = (
+    ("0000", 0), ("0001", 1), ("0002", 2), ("0005", 2), ("0015", 2), ("0100", 2),
+    ("0150", 2), ("0175", 3), ("0190", 2), ("0200", 2), ("0205", 3), ("0206", 3),
+    ("0210", 3), ("0220", 3), ("0221", 3), ("0300", 2), ("0305", 3), ("0400", 2),
+    ("0450", 2), ("0460", 2), ("0500", 2), ("0600", 2), ("0990", 1),
+    ("B001", 1), ("B020", 2), ("B025", 3), ("B030", 2), ("B035", 3), ("B350", 2),
+    ("B420", 2), ("B440", 2), ("B460", 2), ("B470", 2), ("B500", 2), ("B510", 3),
+    ("B990", 1),
+    ("C001", 1), ("C100", 2), ("C101", 3), ("C105", 3), ("C110", 3), ("C111", 4),
+    ("C112", 4), ("C113", 4), ("C114", 4), ("C115", 4), ("C116", 4), ("C120", 3),
+    ("C130", 3), ("C140", 3), ("C141", 4), ("C160", 3), ("C165", 3), ("C170", 3),
+    ("C171", 4), ("C172", 4), ("C173", 4), ("C174", 4), ("C175", 4), ("C176", 4),
+    ("C177", 4), ("C178", 4), ("C179", 4), ("C180", 4), ("C181", 4), ("C185", 3),
+    ("C186", 3), ("C190", 3), ("C191", 4), ("C195", 3), ("C197", 4), ("C300", 2),
+    ("C310", 3), ("C320", 3), ("C321", 4), ("C330", 3), ("C350", 2), ("C370", 3),
+    ("C380", 3), ("C390", 3), ("C400", 2), ("C405", 3), ("C410", 4), ("C420", 4),
+    ("C425", 5), ("C430", 5), ("C460", 4), ("C465", 5), ("C470", 5), ("C480", 5),
+    ("C490", 4), ("C495", 2), ("C500", 2), ("C510", 3), ("C590", 3), ("C591", 4),
+    ("C595", 3), ("C597", 4), ("C600", 2), ("C601", 3), ("C610", 3), ("C690", 3),
+    ("C700", 2), ("C790", 3), ("C791", 4), ("C800", 2), ("C810", 3), ("C815", 3),
+    ("C850", 3), ("C855", 3), ("C857", 4), ("C860", 2), ("C870", 3), ("C880", 3),
+    ("C890", 3), ("C895", 3), ("C897", 4), ("C990", 1),
+    ("D001", 1), ("D100", 2), ("D101", 3), ("D110", 3), ("D120", 4), ("D130", 3),
+    ("D140", 3), ("D150", 3), ("D160", 3), ("D161", 4), ("D162", 4), ("D170", 3),
+    ("D180", 3), ("D190", 3), ("D195", 3), ("D197", 4), ("D300", 2), ("D301", 3),
+    ("D310", 3), ("D350", 2), ("D355", 3), ("D360", 4), ("D365", 4), ("D370", 5),
+    ("D390", 4), ("D400", 2), ("D410", 3), ("D411", 4), ("D420", 3), ("D500", 2),
+    ("D510", 3), ("D530", 3), ("D590", 3), ("D600", 2), ("D610", 3), ("D690", 3),
+    ("D695", 2), ("D696", 3), ("D697", 4), ("D700", 2), ("D730", 3), ("D731", 4),
+    ("D735", 3), ("D737", 4), ("D750", 2), ("D760", 3), ("D761", 4), ("D990", 1),
+    ("E001", 1), ("E100", 2), ("E110", 3), ("E111", 4), ("E112", 5), ("E113", 5),
+    ("E115", 4), ("E116", 4), ("E200", 2), ("E210", 3), ("E220", 4), ("E230", 5),
+    ("E240", 5), ("E250", 4), ("E300", 2), ("E310", 3), ("E311", 4), ("E312", 5),
+    ("E313", 5), ("E316", 4), ("E500", 2), ("E510", 3), ("E520", 3), ("E530", 4),
+    ("E531", 5), ("E990", 1),
+    ("G001", 1), ("G110", 2), ("G125", 3), ("G126", 4), ("G130", 4), ("G140", 5),
+    ("G990", 1),
+    ("H001", 1), ("H005", 2), ("H010", 3), ("H020", 4), ("H030", 4), ("H990", 1),
+    ("K001", 1), ("K010", 2), ("K100", 2), ("K200", 3), ("K210", 3), ("K215", 4),
+    ("K220", 3), ("K230", 3), ("K235", 4), ("K250", 3), ("K255", 4), ("K260", 3),
+    ("K265", 4), ("K270", 3), ("K275", 4), ("K280", 3), ("K290", 3), ("K291", 4),
+    ("K292", 4), ("K300", 3), ("K301", 4), ("K302", 4), ("K990", 1),
+    ("1001", 1), ("1010", 2), ("1100", 2), ("1105", 3), ("1110", 4), ("1200", 2),
+    ("1210", 3), ("1250", 2), ("1255", 3), ("1300", 2), ("1310", 3), ("1320", 4),
+    ("1350", 2), ("1360", 3), ("1370", 3), ("1390", 2), ("1391", 3), ("1400", 2),
+    ("1500", 2), ("1510", 3), ("1600", 2), ("1601", 2), ("1700", 2), ("1710", 3),
+    ("1800", 2), ("1900", 2), ("1910", 3), ("1920", 4), ("1921", 5), ("1922", 6),
+    ("1923", 6), ("1925", 5), ("1926", 5), ("1960", 2), ("1970", 2), ("1975", 3),
+    ("1980", 2), ("1990", 1),
+    ("9001", 1), ("9900", 2), ("9990", 1), ("9999", 0),
+)
+
+
+def _build_parents(layout):
+    parents = {}
+    stack = []
+    for record_type, level in layout:
+        del stack[level:]
+        if level > 0:
+            parents[record_type] = stack[level - 1] if len(stack) >= level else "0000"
+        stack.append(record_type)
+    return parents
+
+
+RECORD_LEVELS = dict(SPED_LAYOUT)
+RECORD_PARENTS = _build_parents(SPED_LAYOUT)
+
+
+def ancestors(record_type):
+    """Lista os ancestrais do registro, do pai até o 0000."""
+    chain = []
+    parent = RECORD_PARENTS.get(record_type)
+    while parent is not None:
+        chain.append(parent)
+        parent = RECORD_PARENTS.get(parent)
+    return chain
+
+
+def parse_relations(relations):
+    """
+    Converte relacionamentos ("C100:C170" ou pares) em uma lista de (pai, filho),
+    validando que o pai é ancestral do filho no layout.
+    """
+    pairs = []
+    for relation in relations or []:
+        if isinstance(relation, str):
+            parts = [part.strip() for part in relation.replace("-", ":").split(":")]
+        else:
+            parts = [str(part).strip() for part in relation]
+        if len(parts) != 2 or not all(parts):
+            raise ValueError(f"Relacionamento inválido: {relation}")
+        parent_type, child_type = parts
+        if parent_type not in ancestors(child_type):
+            raise ValueError(f"Relacionamento inválido: {parent_type} não é ancestral de {child_type} no layout SPED.")
+        if (parent_type, child_type) not in pairs:
+            pairs.append((parent_type, child_type))
+    return pairs
+
+
+def relation_name(parent_type, child_type):
+    return f"{parent_type}_{child_type}"
+
+
+class HierarchyJoiner:
+    """
+    Gera as junções desnormalizadas (campos do pai + campos do filho) para os pares
+    pedidos, à medida que as linhas são lidas.
+
+    Cada linha de um tipo de pai recebe uma sequência (1, 2, 3, ... por tipo), que
+    vai nas junções logo depois dos campos do pai: filhos do mesmo pai têm a mesma
+    sequência, mesmo quando há linhas de pai repetidas no arquivo. A sequência é
+    local à faixa do arquivo; `JoinMerger` a torna contínua. As abas dos próprios
+    registros não mudam.
+
+    Filhos lidos antes de qualquer pai do seu tipo (início de uma faixa do arquivo
+    processada em paralelo) ficam em `orphans` e são resolvidos depois, com
+    `JoinMerger`, a partir do último pai da faixa anterior.
+    """
+
+    def __init__(self, relations):
+        self.parents_by_child = {}
+        for parent_type, child_type in relations:
+            self.parents_by_child.setdefault(child_type, []).append(parent_type)
+        self.parent_types = {parent_type for parent_type, _ in relations}
+        self.last_parents = {}  # tipo do pai -> (sequência, campos do pai + [sequência])
+        self.joins = {}  # (tipo do pai, relacionamento) -> (linhas, posição da sequência em cada linha)
+        self.orphans = {}
+
+    @property
+    def record_types(self):
+        return self.parent_types | set(self.parents_by_child)
+
+    def feed(self, record_type, fields):
+        parent_types = self.parents_by_child.get(record_type)
+        if parent_types:
+            for parent_type in parent_types:
+                name = relation_name(parent_type, record_type)
+                parent = self.last_parents.get(parent_type)
+                if parent is not None:
+                    prefix = parent[1]
+                    join = self.joins.get((parent_type, name))
+                    if join is None:
+                        join = self.joins[(parent_type, name)] = ([], [])
+                    join[0].append(prefix + fields)
+                    join[1].append(len(prefix) - 1)
+                else:
+                    self.orphans.setdefault((parent_type, name), []).append(fields)
+        if record_type in self.parent_types:
+            parent = self.last_parents.get(record_type)
+            seq = parent[0] + 1 if parent else 1
+            self.last_parents[record_type] = (seq, fields + [seq])
+
+
+class JoinMerger:
+    """
+    Junta, na ordem das faixas, os resultados de HierarchyJoiner de cada faixa.
+
+    As sequências de pai de cada faixa começam em 1; aqui elas recebem o total de
+    pais do mesmo tipo das faixas anteriores e viram texto, de modo que a numeração
+    é única em toda a execução (inclusive entre arquivos).
+    """
+
+    def __init__(self):
+        self.file_path = None
+        self.carried_parents = {}  # tipo do pai -> campos do pai + [sequência], da faixa anterior
+        self.offsets = {}  # tipo do pai -> pais já numerados
+
+    def merge(self, file_path, joins, orphans, last_parents):
+        """Retorna {relacionamento: linhas} da faixa, com os órfãos já resolvidos."""
+        if file_path != self.file_path:
+            self.file_path = file_path
+            self.carried_parents = {}
+
+        merged = {}
+        for (parent_type, name), children in orphans.items():
+            prefix = self.carried_parents.get(parent_type)
+            if prefix is not None:
+                merged[name] = [prefix + child for child in children]
+        for (parent_type, name), (rows, positions) in joins.items():
+            offset = self.offsets.get(parent_type, 0)
+            for row, position in zip(rows, positions):
+                row[position] = str(row[position] + offset)
+            merged.setdefault(name, []).extend(rows)
+
+        for parent_type, (count, prefix) in last_parents.items():
+            offset = self.offsets.get(parent_type, 0)
+            self.carried_parents[parent_type] = prefix[:-1] + [str(count + offset)]
+            self.offsets[parent_type] = count + offset
+        return merged
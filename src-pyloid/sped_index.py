@@ -0,0 +1,299 @@
+"""Índice persistente dos tipos de registro de cada arquivo SPED.
+
+Para cada arquivo o índice guarda, por tipo de registro, a quantidade de linhas e
+os blocos de bytes (início, fim) em que essas linhas aparecem. Ele é salvo em
+disco e reaproveitado enquanto o caminho, o tamanho e a data de modificação do
+arquivo não mudarem.
+
+A lista de registros com as quantidades também pode vir do Bloco 9 (registros
+9900), lido do fim do arquivo sem percorrê-lo; ver read_trailer_catalog.
+"""
+import hashlib
+import json
+import os
+import platform
+
+from sped_reader import SPED_ENCODING, DEFAULT_CHUNK_SIZE, record_type_of, split_sped_line
+from sped_tasks import RANGE_SIZE, run_tasks, split_file_ranges
+
+INDEX_VERSION = 1
+MAX_BLOCKS_PER_RECORD = 1024  # blocos próximos são agrupados acima deste limite
+TRAILER_READ_SIZE = 64 * 1024  # leitura inicial do fim do arquivo em busca do Bloco 9
+TRAILER_MAX_SIZE = 16 * 1024 * 1024  # o Bloco 9 não é procurado além disto
+BLOCK_9_RECORDS = {"9001", "9900", "9990", "9999"}
+
+if platform.system() == "Windows":
+    INDEX_DIR = os.path.join(os.getenv("LOCALAPPDATA", os.path.expanduser("~")), "IVFTax", "sped_index")
+else:
+    INDEX_DIR = os.path.expanduser("~/.IVFTax/sped_index")
+
+
+def _index_path(file_path):
+    key = hashlib.sha1(os.path.abspath(file_path).encode("utf-8")).hexdigest()
+    return os.path.join(INDEX_DIR, f"{key}.json")
+
+
+def _coalesce_blocks(blocks, max_blocks=MAX_BLOCKS_PER_RECORD):
+    """Une blocos vizinhos até que a lista tenha no máximo `max_blocks` itens."""
+    gap = 4096
+    while len(blocks) > max_blocks:
+        merged = [list(blocks[0])]
+        for start, end in blocks[1:]:
+            if start - merged[-1][1] <= gap:
+                merged[-1][1] = end
+            else:
+                merged.append([start, end])
+        blocks = merged
+        gap *= 4
+    return blocks
+
+
+def index_file_range(file_path, start, end):
+    """Indexa uma faixa do arquivo: {registro: [quantidade, [[início, fim], ...]]}."""
+    entries = {}
+    with open(file_path, "rb") as f:
+        f.seek(start)
+        position = start
+        remainder = b""
+        while position < end:
+            data = f.read(min(DEFAULT_CHUNK_SIZE, end - position))
+            if not data:
+                break
+            position += len(data)
+            data = remainder + data
+            lines = data.split(b"\n")
+            remainder = lines.pop()
+            offset = position - len(data)
+            if position >= end and remainder:
+                lines.append(remainder)
+                remainder = b""
+            for line in lines:
+                line_end = offset + len(line) + 1
+                stripped = line.strip()
+                if stripped:
+                    fields = stripped.split(b"|", 2)
+                    record_type = fields[1] if fields[0] == b"" and len(fields) > 1 else fields[0]
+                    if record_type:
+                        record_type = record_type.decode(SPED_ENCODING)
+                        entry = entries.get(record_type)
+                        if entry is None:
+                            entry = entries[record_type] = [0, []]
+                        entry[0] += 1
+                        blocks = entry[1]
+                        if blocks and blocks[-1][1] == offset:
+                            blocks[-1][1] = line_end
+                        else:
+                            blocks.append([offset, line_end])
+                            if len(blocks) > MAX_BLOCKS_PER_RECORD * 2:
+                                entry[1] = _coalesce_blocks(blocks)
+                offset = line_end
+    return entries
+
+
+def build_index(file_path):
+    """Percorre o arquivo (em paralelo, por faixas) e monta o índice."""
+    stat = os.stat(file_path)
+    records = {}
+    tasks = [(file_path, start, end) for start, end in split_file_ranges(file_path)]
+    for entries in run_tasks(index_file_range, tasks):
+        for record_type, (count, blocks) in entries.items():
+            entry = records.setdefault(record_type, {"count": 0, "blocks": []})
+            entry["count"] += count
+            if blocks and entry["blocks"] and entry["blocks"][-1][1] == blocks[0][0]:
+                entry["blocks"][-1][1] = blocks[0][1]
+                blocks = blocks[1:]
+            entry["blocks"].extend(blocks)
+
+    for entry in records.values():
+        entry["blocks"] = _coalesce_blocks(entry["blocks"])
+
+    return {
+        "version": INDEX_VERSION,
+        "path": os.path.abspath(file_path),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "line_count": sum(entry["count"] for entry in records.values()),
+        "records": records,
+    }
+
+
+def load_index(file_path):
+    """Carrega o índice salvo, se existir e ainda corresponder ao arquivo."""
+    try:
+        with open(_index_path(file_path), "r", encoding="utf-8") as f:
+            index = json.load(f)
+        stat = os.stat(file_path)
+        if (
+            index.get("version") == INDEX_VERSION
+            and index.get("path") == os.path.abspath(file_path)
+            and index.get("size") == stat.st_size
+            and index.get("mtime_ns") == stat.st_mtime_ns
+        ):
+            return index
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def save_index(file_path, index):
+    try:
+        os.makedirs(INDEX_DIR, exist_ok=True)
+        with open(_index_path(file_path), "w", encoding="utf-8") as f:
+            json.dump(index, f)
+    except OSError as e:
+        print(f"Erro ao salvar o índice de {file_path}: {e}")
+
+
+def get_index(file_path):
+    """Retorna o índice do arquivo, montando e salvando um novo quando necessário."""
+    index = load_index(file_path)
+    if index is None:
+        index = build_index(file_path)
+        save_index(file_path, index)
+    return index
+
+
+def _trailer_lines(file_path):
+    """
+    Linhas do Bloco 9 (de 9001 a 9999), lidas do fim do arquivo; a leitura cresce
+    até encontrar o 9001 ou chegar a TRAILER_MAX_SIZE. O que vier depois do 9999
+    (como a assinatura digital) é ignorado. Retorna None sem o Bloco 9.
+    """
+    size = os.path.getsize(file_path)
+    read_size = TRAILER_READ_SIZE
+    with open(file_path, "rb") as f:
+        while True:
+            read_size = min(read_size, size)
+            f.seek(size - read_size)
+            lines = f.read(read_size).split(b"\n")
+            if read_size < size:
+                lines = lines[1:]  # a primeira linha pode estar cortada
+
+            block = None
+            for line in reversed(lines):
+                line = line.strip()
+                if not line:
+                    continue
+                record_type = record_type_of(line.decode(SPED_ENCODING))
+                if block is None:
+                    if record_type == "9999":
+                        block = [line]
+                    continue
+                block.append(line)
+                if record_type == "9001":
+                    return [line.decode(SPED_ENCODING) for line in reversed(block)]
+
+            if read_size >= size or read_size >= TRAILER_MAX_SIZE:
+                return None
+            read_size *= 4
+
+
+def read_trailer_catalog(file_path):
+    """
+    Retorna {registro: quantidade de linhas} conforme os registros 9900 do Bloco 9,
+    lendo só o fim do arquivo. Retorna None se o Bloco 9 não existir ou não fechar:
+    registros estranhos no bloco, 9990 diferente da quantidade de linhas do bloco
+    ou soma dos 9900 diferente do total informado no 9999.
+    """
+    try:
+        lines = _trailer_lines(file_path)
+        if lines is None:
+            return None
+        counts = {}
+        block_lines = total_lines = None
+        for line in lines:
+            fields = split_sped_line(line)
+            record_type = fields[0]
+            if record_type not in BLOCK_9_RECORDS:
+                return None
+            if record_type == "9900":
+                counts[fields[1]] = counts.get(fields[1], 0) + int(fields[2])
+            elif record_type == "9990":
+                block_lines = int(fields[1])
+            elif record_type == "9999":
+                total_lines = int(fields[1])
+    except (OSError, ValueError, IndexError):
+        return None
+
+    if block_lines != len(lines) or total_lines != sum(counts.values()):
+        return None
+    if counts.get("9900", 0) != sum(1 for line in lines if record_type_of(line) == "9900"):
+        return None
+    return counts
+
+
+def get_record_counts(file_path):
+    """
+    Retorna {registro: quantidade de linhas} do arquivo: pelo Bloco 9 quando ele é
+    consistente e, caso contrário, pelo índice (que lê o arquivo inteiro só se
+    ainda não estiver salvo).
+    """
+    counts = read_trailer_catalog(file_path)
+    if counts is not None:
+        return counts
+    print(f"Bloco 9 ausente ou inconsistente, usando o índice: {file_path}")
+    return {record_type: entry["count"] for record_type, entry in get_index(file_path)["records"].items()}
+
+
+def record_spans(index, record_types):
+    """Retorna os blocos ordenados e sem sobreposição que contêm os registros pedidos."""
+    blocks = sorted(
+        tuple(block)
+        for record_type in record_types
+        if record_type in index["records"]
+        for block in index["records"][record_type]["blocks"]
+    )
+    spans = []
+    for start, end in blocks:
+        if spans and start <= spans[-1][1]:
+            spans[-1][1] = max(spans[-1][1], end)
+        else:
+            spans.append([start, end])
+    return spans
+
+
+def indexed_tasks(file_paths, record_types, split=True, task_size=RANGE_SIZE):
+    """
+    Monta as tarefas (arquivo, blocos) que cobrem apenas os registros pedidos.
+
+    Com `split` os blocos de cada arquivo são agrupados em tarefas de cerca de
+    `task_size` bytes; sem ele cada arquivo vira uma única tarefa.
+    """
+    tasks = []
+    for file_path in file_paths:
+        spans = record_spans(get_index(file_path), record_types)
+        if not spans:
+            continue
+        if not split:
+            tasks.append((file_path, spans))
+            continue
+        group, group_size = [], 0
+        for start, end in spans:
+            # Blocos muito grandes são divididos em partes alinhadas a quebras de linha
+            for part_start, part_end in _split_span(file_path, start, end, task_size):
+                group.append((part_start, part_end))
+                group_size += part_end - part_start
+                if group_size >= task_size:
+                    tasks.append((file_path, group))
+                    group, group_size = [], 0
+        if group:
+            tasks.append((file_path, group))
+    return tasks
+
+
+def _split_span(file_path, start, end, task_size):
+    if end - start <= task_size:
+        return [(start, end)]
+    parts = []
+    with open(file_path, "rb") as f:
+        while start < end:
+            cut = start + task_size
+            if cut >= end:
+                cut = end
+            else:
+                f.seek(cut)
+                f.readline()
+                cut = min(f.tell(), end)
+            parts.append((start, cut))
+            start = cut
+    return parts
@@ -0,0 +1,291 @@
+"""Leitura em streaming de arquivos SPED.
+
+Os arquivos são lidos em blocos de tamanho fixo e divididos em linhas
+completas, de modo que o consumo de memória depende do tamanho do bloco e não
+do tamanho do arquivo.
+"""
+import codecs
+import itertools
+import mmap
+import os
+import re
+import time
+from operator import itemgetter
+
+DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024  # 8 MB por bloco
+SPED_ENCODING = "latin1"
+ENCODING_SAMPLE_SIZE = 1024 * 1024  # bytes lidos para detectar a codificação
+
+
+def split_sped_line(line, max_fields=None):
+    """
+    Divide uma linha SPED em campos, removendo os delimitadores das pontas.
+
+    Com `max_fields` apenas os primeiros campos são separados; o resto da linha é
+    descartado sem ser dividido.
+    """
+    line = line.strip()
+    if not line:
+        return None
+    if max_fields is None:
+        fields = line.split("|")
+        truncated = False
+    else:
+        limit = max_fields + 1 if line[0] == "|" else max_fields
+        fields = line.split("|", limit)
+        truncated = len(fields) > limit
+        if truncated:
+            fields.pop()
+    if fields[0] == "":
+        fields = fields[1:]
+    if not truncated and fields and fields[-1] == "":
+        fields = fields[:-1]
+    return fields or None
+
+
+def record_type_of(line):
+    """Retorna o tipo de registro de uma linha já sem espaços nas pontas."""
+    if line[0] == "|":
+        cut = line.find("|", 1)
+        return line[1:cut] if cut != -1 else line[1:]
+    cut = line.find("|")
+    return line[:cut] if cut != -1 else line
+
+
+def parse_column_selection(selected_columns):
+    """
+    Converte a seleção de colunas recebida da interface em {registro: [índices]}.
+
+    Aceita índices ("3" ou 3), aplicados a todos os registros (chave None), e
+    itens "REGISTRO:índice" (ex.: "C170:2"), aplicados apenas àquele registro.
+    """
+    if not selected_columns:
+        return None
+    selection = {}
+    for item in selected_columns:
+        if isinstance(item, str) and ":" in item:
+            record_type, index = item.split(":", 1)
+            selection.setdefault(record_type.strip(), []).append(int(index))
+        else:
+            selection.setdefault(None, []).append(int(item))
+    return selection
+
+
+def compile_projection(indices):
+    """
+    Retorna uma função que extrai os campos `indices` de uma linha já dividida.
+
+    Os índices são ordenados e sem repetição, como na seleção original; índices além
+    do fim da linha são ignorados.
+    """
+    indices = sorted(set(indices))
+    max_index = indices[-1]
+    getter = itemgetter(*indices)
+
+    if len(indices) == 1:
+        def project(fields):
+            return [fields[max_index]] if len(fields) > max_index else []
+    else:
+        def project(fields):
+            if len(fields) > max_index:
+                return list(getter(fields))
+            return [fields[i] for i in indices if i < len(fields)]
+
+    return project
+
+
+def iter_byte_chunks(file_path, chunk_size=DEFAULT_CHUNK_SIZE, start=0, end=None):
+    """
+    Lê o arquivo em blocos de `chunk_size` bytes, cada um terminado numa quebra de linha.
+
+    A linha cortada no fim de cada bloco é guardada e completada no bloco seguinte.
+    `start` e `end` limitam a leitura a uma faixa de bytes alinhada a quebras de linha.
+    """
+    with open(file_path, "rb") as f:
+        f.seek(start)
+        position = start
+        remainder = b""
+        while True:
+            size = chunk_size if end is None else min(chunk_size, end - position)
+            data = f.read(size) if size > 0 else b""
+            if not data:
+                break
+            position += len(data)
+            data = remainder + data
+            cut = data.rfind(b"\n") + 1
+            if cut == 0:
+                remainder = data
+                continue
+            remainder = data[cut:]
+            yield data[:cut]
+        if remainder:
+            yield remainder
+
+
+def iter_chunks(file_path, chunk_size=DEFAULT_CHUNK_SIZE, encoding=SPED_ENCODING, start=0, end=None):
+    """Lê o arquivo em blocos (ver iter_byte_chunks) e gera listas de linhas completas."""
+    for data in iter_byte_chunks(file_path, chunk_size, start, end):
+        yield data.decode(encoding).split("\n")
+
+
+def detect_encoding(file_path, sample_size=ENCODING_SAMPLE_SIZE):
+    """
+    Detecta a codificação pelo início do arquivo: "utf-8-sig" com BOM, "utf-8" se a
+    amostra for UTF-8 válido e, caso contrário, latin1 (padrão do SPED).
+    """
+    with open(file_path, "rb") as f:
+        sample = f.read(sample_size)
+    if sample.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+    try:
+        # Decodificador incremental: um caractere cortado no fim da amostra não é erro
+        codecs.getincrementaldecoder("utf-8")().decode(sample, final=False)
+    except UnicodeDecodeError:
+        return SPED_ENCODING
+    return "utf-8"
+
+
+_ASCII_CONTROL = re.compile(rb"[\x00-\x09\x0b-\x1f\x7f]")
+_LATIN1_NON_PRINTABLE = re.compile(rb"[\x00-\x09\x0b-\x1f\x7f-\xa0\xad]")
+_non_printable_table = None
+
+
+def _unicode_non_printable_table():
+    """Tabela de str.translate que troca por espaço os caracteres não imprimíveis do BMP."""
+    global _non_printable_table
+    if _non_printable_table is None:
+        _non_printable_table = {
+            code: " " for code in range(0x80, 0x10000) if not chr(code).isprintable()
+        }
+    return _non_printable_table
+
+
+def decode_clean(data, encoding):
+    """
+    Decodifica o bloco trocando por espaço os caracteres não imprimíveis (exceto a
+    quebra de linha), o mesmo que `char if char.isprintable() else " "` em cada
+    caractere, mas sem percorrer o texto em Python: em latin1 cada byte é um
+    caractere e a troca é feita direto nos bytes; em UTF-8 os controles ASCII são
+    trocados nos bytes e, se houver texto não ASCII, o restante sai por
+    str.translate.
+    """
+    if encoding == SPED_ENCODING:
+        return _LATIN1_NON_PRINTABLE.sub(b" ", data).decode(encoding)
+    text = _ASCII_CONTROL.sub(b" ", data).decode(encoding)
+    if text.isascii():
+        return text
+    return text.translate(_unicode_non_printable_table())
+
+
+def iter_clean_lines(file_path, encoding=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Gera listas de linhas do arquivo já limpas (ver decode_clean). Sem `encoding`,
+    a codificação é detectada pela amostra inicial; se um bloco adiante não for
+    UTF-8 válido, esse bloco é lido como latin1.
+    """
+    encoding = encoding or detect_encoding(file_path)
+    first = True
+    for data in iter_byte_chunks(file_path, chunk_size):
+        try:
+            text = decode_clean(data, encoding if first else encoding.replace("-sig", ""))
+        except UnicodeDecodeError:
+            text = decode_clean(data, SPED_ENCODING)
+        first = False
+        yield text.split("\n")
+
+
+def parse_sped_lines(lines, records=None, split_limits=None):
+    """
+    Gera (tipo_de_registro, campos) para as linhas informadas.
+
+    Se `records` for informado, apenas os tipos de registro contidos nele são gerados;
+    as demais linhas são descartadas sem serem divididas. `split_limits` indica, por
+    registro, quantos campos iniciais precisam ser separados.
+    """
+    split_limits = split_limits or {}
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        record_type = record_type_of(line)
+        if records is not None and record_type not in records:
+            continue
+        fields = split_sped_line(line, split_limits.get(record_type))
+        if fields is None:
+            continue
+        yield record_type, fields
+
+
+def iter_sped_records(file_path, records=None, chunk_size=DEFAULT_CHUNK_SIZE, start=0, end=None, split_limits=None):
+    """Gera (tipo_de_registro, campos) para cada linha do arquivo SPED (ver parse_sped_lines)."""
+    for lines in iter_chunks(file_path, chunk_size, start=start, end=end):
+        yield from parse_sped_lines(lines, records, split_limits)
+
+
+def record_line_patterns(records):
+    """
+    Regexes (em bytes) que casam as linhas dos tipos de registro `records`, com ou
+    sem o "|" inicial; o grupo 1 é a linha. A primeira casa a linha iniciada logo
+    após um "\n" (começar por um literal deixa a busca bem mais rápida que "^"); a
+    segunda, a linha no início do arquivo.
+    """
+    alternatives = b"|".join(
+        re.escape(record_type.encode(SPED_ENCODING)) for record_type in sorted(records, key=len, reverse=True)
+    )
+    line = rb"[ \t]*(\|?(?:" + alternatives + rb")(?:[|\r \t][^\n]*)?)$"
+    return re.compile(rb"\n" + line, re.MULTILINE), re.compile(line, re.MULTILINE)
+
+
+def scan_sped_blocks(file_path, spans, records, split_limits=None, stats=None):
+    """
+    Gera, para cada bloco (início, fim) do arquivo, as listas paralelas (tipos de
+    registro, campos) das linhas dos registros `records`, como parse_sped_lines.
+
+    O arquivo é mapeado em memória e as linhas são localizadas por uma regex sobre
+    os bytes: só as linhas dos registros pedidos são decodificadas e divididas, e
+    as demais nem chegam ao Python. `stats["lines"]` recebe a quantidade de linhas
+    dos registros pedidos (contar todas as linhas exigiria outra passada pelos
+    bytes) e, se existir, `stats["stages"]` soma o tempo de leitura (localização
+    das linhas) em "read" e o de decodificação e divisão em "parse". As listas
+    paralelas evitam manter uma tupla por linha, o que aciona o coletor de lixo
+    com muito mais frequência.
+    """
+    split_limits = split_limits or {}
+    stages = stats.get("stages") if stats is not None else None
+    pattern, first_line_pattern = record_line_patterns(records)
+    with open(file_path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            for start, end in spans:
+                if start == 0:
+                    first_line = first_line_pattern.match(mapped, 0, end)
+                    matches = itertools.chain([first_line] if first_line else [], pattern.finditer(mapped, 0, end))
+                else:
+                    # Os blocos começam logo após uma quebra de linha
+                    matches = pattern.finditer(mapped, start - 1, end)
+
+                started = time.perf_counter()
+                raw_lines = [match.group(1) for match in matches]
+                located = time.perf_counter()
+                if stats is not None:
+                    stats["lines"] += len(raw_lines)
+                record_types = []
+                fields_list = []
+                for raw_line in raw_lines:
+                    line = raw_line.decode(SPED_ENCODING).strip()
+                    record_type = record_type_of(line)
+                    fields = split_sped_line(line, split_limits.get(record_type))
+                    if fields is not None:
+                        record_types.append(record_type)
+                        fields_list.append(fields)
+                if stages is not None:
+                    stages["read"] = stages.get("read", 0.0) + located - started
+                    stages["parse"] = stages.get("parse", 0.0) + time.perf_counter() - located
+                yield record_types, fields_list
+
+
+def scan_sped_records(file_path, spans, records, split_limits=None, stats=None):
+    """Gera (tipo_de_registro, campos) das linhas lidas por scan_sped_blocks."""
+    for record_types, fields_list in scan_sped_blocks(file_path, spans, records, split_limits, stats):
+        yield from zip(record_types, fields_list)
@@ -0,0 +1,260 @@
+"""Tarefas de processamento SPED executadas em processos de trabalho.
+
+As funções ficam fora de main.py porque cada processo filho precisa importá-las
+sem depender da interface. Os resultados são sempre consumidos na ordem em que
+as tarefas foram enviadas, então a saída é idêntica à do processamento serial.
+"""
+import itertools
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from openpyxl import load_workbook
+
+from job_control import peak_memory_mb
+from sped_hierarchy import HierarchyJoiner
+from sped_reader import compile_projection, iter_clean_lines, scan_sped_blocks
+from sped_writers import create_record_writer, output_path
+
+RANGE_SIZE = 4 * 1024 * 1024  # faixa de bytes processada por tarefa
+MAX_WORKERS = max(1, (os.cpu_count() or 1) - 1)
+WRITE_BUFFER_SIZE = 1024 * 1024  # buffer do arquivo TXT gerado a partir do Excel
+
+_pool = None
+_pool_lock = threading.Lock()  # vários jobs do job_scheduler usam o pool ao mesmo tempo
+
+
+def get_process_pool():
+    """Retorna o pool de processos compartilhado, criando-o no primeiro uso."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=MAX_WORKERS)
+        return _pool
+
+
+def discard_process_pool(pool):
+    """
+    Descarta o pool quebrado (BrokenProcessPool) para que o próximo uso crie outro.
+    Só descarta se `pool` ainda for o pool compartilhado: outro job pode já tê-lo trocado.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def run_tasks(func, tasks, parallel=True, cancel_token=None):
+    """
+    Executa `func(*tarefa)` para cada tarefa e gera os resultados na ordem de envio.
+
+    `tasks` pode ser um gerador: as tarefas são consumidas à medida que há espaço
+    no pool. No máximo 2 * MAX_WORKERS tarefas ficam pendentes ao mesmo tempo, o
+    que limita a memória ocupada por resultados ainda não consumidos. Com uma única
+    tarefa (ou `parallel=False`) tudo roda no próprio processo. O `cancel_token` é
+    verificado entre as tarefas; ao cancelar, as tarefas ainda não iniciadas são
+    descartadas.
+    """
+    tasks = iter(tasks)
+    first_tasks = list(itertools.islice(tasks, 2))
+    tasks = itertools.chain(first_tasks, tasks)
+    if not parallel or len(first_tasks) < 2 or MAX_WORKERS < 2:
+        for task in tasks:
+            if cancel_token is not None:
+                cancel_token.raise_if_cancelled()
+            yield func(*task)
+        return
+
+    pool = get_process_pool()
+    pending = deque()
+    try:
+        for task in tasks:
+            if cancel_token is not None:
+                cancel_token.raise_if_cancelled()
+            pending.append(pool.submit(func, *task))
+            if len(pending) >= MAX_WORKERS * 2:
+                yield pending.popleft().result()
+        while pending:
+            if cancel_token is not None:
+                cancel_token.raise_if_cancelled()
+            yield pending.popleft().result()
+    except BrokenProcessPool:
+        discard_process_pool(pool)
+        raise
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def split_file_ranges(file_path, range_size=RANGE_SIZE):
+    """Divide o arquivo em faixas de bytes que começam e terminam em quebras de linha."""
+    size = os.path.getsize(file_path)
+    ranges = []
+    start = 0
+    with open(file_path, "rb") as f:
+        while start < size:
+            end = start + range_size
+            if end >= size:
+                end = size
+            else:
+                f.seek(end)
+                f.readline()
+                end = f.tell()
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def parse_file_range(file_path, spans, records, column_selection, relations):
+    """
+    Lê os blocos (início, fim) do arquivo e agrupa as linhas dos registros pedidos por tipo.
+
+    `column_selection` ({registro: [índices]}, com a chave None valendo para todos)
+    é aplicada durante a leitura: para registros que não participam de
+    relacionamentos, a linha só é dividida até o maior índice pedido.
+
+    Retorna (linhas_por_registro, junções, órfãos, últimos_pais, estatísticas), com
+    as junções pai/filho dos relacionamentos pedidos (ver sped_hierarchy.HierarchyJoiner).
+    As estatísticas trazem os bytes lidos, as linhas dos registros pedidos, o tempo
+    de cada etapa (read, parse, join, filter) e o pico de memória do processo.
+    """
+    records = set(records)
+    joiner = HierarchyJoiner(relations)
+    wanted_records = records | joiner.record_types
+
+    projections = {}
+    split_limits = {}
+    if column_selection:
+        for record_type in records:
+            indices = column_selection.get(record_type, column_selection.get(None))
+            if indices:
+                projections[record_type] = compile_projection(indices)
+                if record_type not in joiner.record_types:
+                    split_limits[record_type] = max(indices) + 1
+
+    rows_by_record = {}
+    stages = {}
+    stats = {"bytes": sum(end - start for start, end in spans), "lines": 0, "stages": stages}
+    stages["join"] = stages["filter"] = 0.0
+    for record_types, fields_list in scan_sped_blocks(file_path, spans, wanted_records, split_limits, stats):
+        started = time.perf_counter()
+        if relations:
+            for record_type, fields in zip(record_types, fields_list):
+                joiner.feed(record_type, fields)
+        joined = time.perf_counter()
+
+        for record_type, fields in zip(record_types, fields_list):
+            if record_type in records:
+                project = projections.get(record_type)
+                if project is not None:
+                    fields = project(fields)
+                rows_by_record.setdefault(record_type, []).append(fields)
+
+        stages["join"] += joined - started
+        stages["filter"] += time.perf_counter() - joined
+
+    stats["peak_memory_mb"] = peak_memory_mb()
+    return rows_by_record, joiner.joins, joiner.orphans, joiner.last_parents, stats
+
+
+def sanitize_sheet_name(name):
+    """Limpa o nome da aba, substituindo caracteres inválidos e limitando a 31 caracteres."""
+    invalid_chars = ['*', '/', '\\', '?', '[', ']', ':']
+    for char in invalid_chars:
+        name = name.replace(char, "_")
+    return name[:31]
+
+
+def convert_txt_file(txt_file_path, save_directory, output_format="xlsx"):
+    """
+    Converte um arquivo TXT para Excel (uma aba por registro) ou para um conjunto
+    de dados Parquet/Feather por registro. Retorna o caminho de saída.
+    """
+    # Define o caminho de saída
+    output_file = output_path(
+        save_directory, os.path.splitext(os.path.basename(txt_file_path))[0], output_format
+    )
+
+    # Grava cada linha na aba (ou conjunto de dados) do seu tipo de registro. O
+    # arquivo é lido em blocos, com a codificação detectada pelo início do arquivo
+    # e os caracteres não imprimíveis já trocados por espaço (ver iter_clean_lines)
+    with create_record_writer(output_format, output_file) as writer:
+        for lines in iter_clean_lines(txt_file_path):
+            for line in lines:
+                line = line.strip()
+                if not line:
+                    continue
+
+                fields = line.split("|")
+                if len(fields) > 1:  # Verifica se há pelo menos um registro válido
+                    record_type = fields[1]  # O tipo de registro está no segundo campo (após o delimitador "|")
+                    writer.write_row(sanitize_sheet_name(record_type), fields)
+
+    return output_file
+
+
+def _sped_field(value):
+    """Texto do campo SPED para o valor de uma célula do Excel."""
+    if value is None:
+        return ""
+    if isinstance(value, str):
+        return value
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    # Datas saem como str(datetime) ("2024-01-15 00:00:00"), como na leitura com pandas
+    return str(value)
+
+
+def iter_excel_sped_lines(excel_file_path):
+    """
+    Gera as linhas SPED de todas as abas do Excel, na ordem das abas, lendo as
+    linhas uma a uma no modo somente leitura do openpyxl. Os campos vazios do fim
+    da linha são removidos e as linhas em branco, ignoradas.
+    """
+    workbook = load_workbook(excel_file_path, read_only=True, data_only=True)
+    try:
+        for worksheet in workbook.worksheets:
+            for row in worksheet.iter_rows(values_only=True):
+                fields = [_sped_field(value) for value in row]
+                while fields and fields[-1] == "":
+                    fields.pop()
+                if fields:
+                    yield "|".join(fields) + "|"
+    finally:
+        workbook.close()
+
+
+def convert_excel_file(excel_file_path, save_directory, encoding="utf-8"):
+    """
+    Converte um Excel (gerado pela conversão TXT → Excel) de volta para um arquivo
+    SPED .txt, gravando as linhas à medida que são lidas. Retorna o caminho de saída.
+    """
+    output_file = os.path.join(
+        save_directory, f"{os.path.splitext(os.path.basename(excel_file_path))[0]}.txt"
+    )
+    tmp_path = f"{output_file}.tmp"
+    try:
+        with open(tmp_path, "w", encoding=encoding, buffering=WRITE_BUFFER_SIZE) as txt_file:
+            for line in iter_excel_sped_lines(excel_file_path):
+                txt_file.write(line)
+                txt_file.write("\n")
+        os.replace(tmp_path, output_file)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return output_file
+
+
+def convert_excel_file_task(excel_file_path, save_directory):
+    """
+    convert_excel_file para o pool de processos: retorna (arquivo, saída, erro) em
+    vez de propagar a exceção, para que a falha de um arquivo não interrompa os demais.
+    """
+    try:
+        return excel_file_path, convert_excel_file(excel_file_path, save_directory), None
+    except Exception as e:
+        return excel_file_path, None, str(e)
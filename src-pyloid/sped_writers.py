@@ -0,0 +1,350 @@
+"""Escritores incrementais para a saída dos registros SPED.
+
+Todos os escritores expõem a mesma interface (`set_columns`, `write_row`,
+`write_rows`, `total_rows` e `close`) e podem ser usados como gerenciadores de
+contexto. Com `set_columns` cada aba/conjunto de dados ganha nomes de coluna;
+sem ele, as colunas ficam sem cabeçalho (Excel/CSV) ou "Campo 1", "Campo 2", ...
+"""
+import csv
+import os
+import shutil
+
+from openpyxl import Workbook
+
+OUTPUT_FORMATS = ("xlsx", "parquet", "feather", "csv")
+EXCEL_MAX_ROWS = 1048576  # limite de linhas de uma aba do Excel
+EXCEL_MAX_SHEET_NAME = 31
+
+
+def split_sheet_name(name, part):
+    """Nome da aba para a parte `part` (C170, C170_2, C170_3, ...), com até 31 caracteres."""
+    if part == 1:
+        return name[:EXCEL_MAX_SHEET_NAME]
+    suffix = f"_{part}"
+    return name[:EXCEL_MAX_SHEET_NAME - len(suffix)] + suffix
+
+
+class ExcelRecordWriter:
+    """
+    Grava as linhas em abas de um arquivo .xlsx à medida que são lidas.
+
+    Usa o modo write-only do openpyxl, que envia cada linha para disco em vez de
+    manter a planilha inteira em memória. O arquivo só é salvo se ao menos uma
+    linha tiver sido gravada e nenhum erro tiver ocorrido. Quando uma aba chega ao
+    limite de linhas do Excel, as linhas seguintes vão para C170_2, C170_3, ...
+    """
+
+    def __init__(self, save_path, max_rows=EXCEL_MAX_ROWS):
+        self.save_path = save_path
+        self.max_rows = max_rows
+        self.workbook = None
+        self.sheets = {}  # registro -> [aba atual, linhas na aba, parte]
+        self.row_counts = {}
+        self.columns = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        if exc_type is None:
+            self.close()
+        return False
+
+    @property
+    def total_rows(self):
+        return sum(self.row_counts.values())
+
+    def _create_sheet(self, title):
+        if self.workbook is None:
+            self.workbook = Workbook(write_only=True)
+        return self.workbook.create_sheet(title=title)
+
+    def _append(self, sheet, row_index, row):
+        sheet.append(row)
+
+    def set_columns(self, sheet_name, columns):
+        """Define o cabeçalho gravado na primeira linha de cada parte da aba."""
+        self.columns[sheet_name] = list(columns)
+
+    def _start_sheet(self, sheet_name, state):
+        state[0] = self._create_sheet(split_sheet_name(sheet_name, state[2]))
+        state[1] = 0
+        columns = self.columns.get(sheet_name)
+        if columns:
+            self._append(state[0], 0, columns)
+            state[1] = 1
+
+    def write_row(self, sheet_name, row):
+        state = self.sheets.get(sheet_name)
+        if state is None:
+            state = self.sheets[sheet_name] = [None, 0, 1]
+            self.row_counts[sheet_name] = 0
+            self._start_sheet(sheet_name, state)
+        elif state[1] >= self.max_rows:
+            state[2] += 1
+            self._start_sheet(sheet_name, state)
+        self._append(state[0], state[1], row)
+        state[1] += 1
+        self.row_counts[sheet_name] += 1
+
+    def write_rows(self, sheet_name, rows):
+        for row in rows:
+            self.write_row(sheet_name, row)
+
+    def close(self):
+        """Salva a pasta de trabalho, caso alguma linha tenha sido gravada."""
+        if self.workbook is not None:
+            self.workbook.save(self.save_path)
+
+
+class XlsxRecordWriter(ExcelRecordWriter):
+    """
+    Variante do ExcelRecordWriter sobre o xlsxwriter em modo `constant_memory`.
+
+    Cada aba mantém apenas a linha corrente em memória, o que torna a gravação de
+    centenas de milhares de linhas bem mais rápida que o openpyxl. Os textos são
+    gravados como texto: não viram fórmulas, números nem links; datas saem como dd/mm/aaaa.
+    """
+
+    def __init__(self, save_path, max_rows=EXCEL_MAX_ROWS):
+        import xlsxwriter
+
+        super().__init__(save_path, max_rows)
+        self.xlsxwriter = xlsxwriter
+
+    def __exit__(self, exc_type, exc_value, tb):
+        if exc_type is None:
+            self.close()
+        elif self.workbook is not None:
+            # Fecha o arquivo mesmo com erro e remove a saída incompleta
+            self.workbook.close()
+            if os.path.exists(self.save_path):
+                os.remove(self.save_path)
+        return False
+
+    def _create_sheet(self, title):
+        if self.workbook is None:
+            self.workbook = self.xlsxwriter.Workbook(
+                self.save_path,
+                {
+                    "constant_memory": True,
+                    "strings_to_formulas": False,
+                    "strings_to_urls": False,
+                    "strings_to_numbers": False,
+                    "default_date_format": "dd/mm/yyyy",
+                },
+            )
+        return self.workbook.add_worksheet(title)
+
+    def _append(self, sheet, row_index, row):
+        sheet.write_row(row_index, 0, row)
+
+    def close(self):
+        if self.workbook is not None:
+            self.workbook.close()
+
+
+def excel_writer_class(engine=None):
+    """
+    Retorna a classe do escritor Excel: xlsxwriter (padrão, se instalado) ou openpyxl.
+    """
+    if engine in (None, "xlsxwriter"):
+        try:
+            import xlsxwriter  # noqa: F401
+
+            return XlsxRecordWriter
+        except ImportError:
+            if engine == "xlsxwriter":
+                raise ImportError("O pacote xlsxwriter não está instalado.")
+    if engine in (None, "openpyxl"):
+        return ExcelRecordWriter
+    raise ValueError(f"Motor de Excel inválido: {engine}")
+
+
+class ArrowRecordWriter:
+    """
+    Grava cada tipo de registro em um conjunto de dados Parquet ou Arrow IPC (Feather).
+
+    As linhas de cada registro são acumuladas até `row_group_size` e gravadas como um
+    grupo de linhas, em `<diretório>/<registro>/part-00000.<ext>`. As colunas são
+    texto e se chamam "Campo 1", "Campo 2", ..., a menos que `set_columns` tenha
+    definido os nomes. Se surgir uma linha com mais campos do que o arquivo atual
+    comporta, um novo arquivo (parte) é iniciado.
+    """
+
+    ROW_GROUP_SIZE = 65536
+
+    def __init__(self, output_dir, output_format="parquet", row_group_size=ROW_GROUP_SIZE):
+        try:
+            import pyarrow
+            import pyarrow.ipc
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError("Para gerar saída Parquet/Feather é necessário instalar o pacote pyarrow.")
+
+        self.pa = pyarrow
+        self.output_dir = output_dir
+        self.output_format = output_format
+        self.row_group_size = row_group_size
+        self.buffers = {}
+        self.writers = {}  # registro -> (escritor, esquema)
+        self.part_counts = {}
+        self.row_counts = {}
+        self.columns = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            # Fecha os arquivos e remove a saída incompleta
+            self._close_writers()
+            if self.part_counts and os.path.isdir(self.output_dir):
+                shutil.rmtree(self.output_dir, ignore_errors=True)
+        return False
+
+    @property
+    def total_rows(self):
+        return sum(self.row_counts.values())
+
+    def set_columns(self, name, columns):
+        self.columns[name] = list(columns)
+
+    def write_row(self, name, row):
+        buffer = self.buffers.get(name)
+        if buffer is None:
+            buffer = self.buffers[name] = []
+            self.row_counts[name] = 0
+        buffer.append(row)
+        self.row_counts[name] += 1
+        if len(buffer) >= self.row_group_size:
+            self._flush(name)
+
+    def write_rows(self, name, rows):
+        for row in rows:
+            self.write_row(name, row)
+
+    def _open_part(self, name, width):
+        pa = self.pa
+        part = self.part_counts.get(name, 0)
+        self.part_counts[name] = part + 1
+        directory = os.path.join(self.output_dir, name)
+        os.makedirs(directory, exist_ok=True)
+        names = self.columns.get(name, [])[:width]
+        names += [f"Campo {i}" for i in range(len(names) + 1, width + 1)]
+        schema = pa.schema([(column, pa.string()) for column in names])
+        if self.output_format == "parquet":
+            path = os.path.join(directory, f"part-{part:05d}.parquet")
+            writer = pa.parquet.ParquetWriter(path, schema)
+        else:
+            path = os.path.join(directory, f"part-{part:05d}.arrow")
+            writer = pa.ipc.new_file(path, schema)
+        self.writers[name] = (writer, schema)
+        return writer, schema
+
+    def _flush(self, name):
+        rows = self.buffers.get(name)
+        if not rows:
+            return
+        pa = self.pa
+        width = max(max(len(row) for row in rows), len(self.columns.get(name, ())))
+        current = self.writers.get(name)
+        if current is not None and width > len(current[1]):
+            current[0].close()
+            current = None
+        writer, schema = current or self._open_part(name, width)
+        columns = [
+            pa.array([row[i] if i < len(row) else None for row in rows], type=pa.string())
+            for i in range(len(schema))
+        ]
+        writer.write_batch(pa.RecordBatch.from_arrays(columns, schema=schema))
+        rows.clear()
+
+    def _close_writers(self):
+        for writer, _ in self.writers.values():
+            writer.close()
+        self.writers.clear()
+
+    def close(self):
+        """Grava as linhas pendentes e fecha os arquivos."""
+        for name in self.buffers:
+            self._flush(name)
+        self._close_writers()
+
+
+class CsvRecordWriter:
+    """
+    Grava cada tipo de registro em `<diretório>/<registro>.csv` (separador ";" e
+    UTF-8 com BOM, para abrir direto no Excel). As linhas vão para o disco à medida
+    que chegam; em caso de erro o diretório de saída é removido.
+    """
+
+    def __init__(self, output_dir, delimiter=";"):
+        self.output_dir = output_dir
+        self.delimiter = delimiter
+        self.files = {}  # registro -> (arquivo, csv.writer)
+        self.row_counts = {}
+        self.columns = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+        if exc_type is not None and self.files and os.path.isdir(self.output_dir):
+            shutil.rmtree(self.output_dir, ignore_errors=True)
+        return False
+
+    @property
+    def total_rows(self):
+        return sum(self.row_counts.values())
+
+    def set_columns(self, name, columns):
+        self.columns[name] = list(columns)
+
+    def _open(self, name):
+        os.makedirs(self.output_dir, exist_ok=True)
+        f = open(os.path.join(self.output_dir, f"{name}.csv"), "w", encoding="utf-8-sig", newline="")
+        writer = csv.writer(f, delimiter=self.delimiter)
+        if name in self.columns:
+            writer.writerow(self.columns[name])
+        self.files[name] = (f, writer)
+        self.row_counts[name] = 0
+        return f, writer
+
+    def write_row(self, name, row):
+        entry = self.files.get(name) or self._open(name)
+        entry[1].writerow(row)
+        self.row_counts[name] += 1
+
+    def write_rows(self, name, rows):
+        for row in rows:
+            self.write_row(name, row)
+
+    def close(self):
+        for f, _ in self.files.values():
+            f.close()
+
+
+def output_path(save_directory, file_name, output_format="xlsx"):
+    """
+    Caminho de saída para o formato: um arquivo .xlsx ou um diretório com um
+    conjunto de dados por registro para Parquet/Feather/CSV.
+    """
+    base_name = file_name[:-5] if file_name.endswith(".xlsx") else file_name
+    if output_format == "xlsx":
+        return os.path.join(save_directory, f"{base_name}.xlsx")
+    return os.path.join(save_directory, f"{base_name}_{output_format}")
+
+
+def create_record_writer(output_format, path, excel_engine=None):
+    """Cria o escritor correspondente ao formato de saída."""
+    if output_format == "xlsx":
+        return excel_writer_class(excel_engine)(path)
+    if output_format in ("parquet", "feather"):
+        return ArrowRecordWriter(path, output_format)
+    if output_format == "csv":
+        return CsvRecordWriter(path)
+    raise ValueError(f"Formato de saída inválido: {output_format}")
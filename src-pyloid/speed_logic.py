@@ -3,6 +3,8 @@ import os
 import pandas as pd
 from tkinter import filedialog
 
+from sped_writers import OUTPUT_FORMATS, create_record_writer, output_path
+
 class SpedLogic(PyloidAPI):
     selected_files = []
     save_directory = ""
@@ -28,7 +30,7 @@ class SpedLogic(PyloidAPI):
         return {"success": False, "message": "Nenhum diretório selecionado."}
 
     @Bridge()
-    def process_files(self, file_name: str, record_numbers: str):
+    def process_files(self, file_name: str, record_numbers: str, output_format: str = "xlsx"):
         # Validações iniciais
         if not self.selected_files:
             return {"success": False, "message": "Nenhum arquivo selecionado para processar."}
@@ -36,6 +38,8 @@ class SpedLogic(PyloidAPI):
             return {"success": False, "message": "Nenhum diretório selecionado para salvar o arquivo."}
         if not file_name:
             return {"success": False, "message": "O nome do arquivo de saída é obrigatório."}
+        if output_format not in OUTPUT_FORMATS:
+            return {"success": False, "message": f"Formato de saída inválido: {output_format}"}
 
         # Processa os registros
         records = [record.strip() for record in record_numbers.split(",") if record.strip()]
@@ -69,6 +73,17 @@ class SpedLogic(PyloidAPI):
         if not dataframes:
             return {"success": False, "message": "Nenhum registro correspondente encontrado."}
 
+        if output_format != "xlsx":
+            # Parquet/Feather: um conjunto de dados por registro, gravado em grupos de linhas
+            save_path = output_path(self.save_directory, file_name, output_format)
+            try:
+                with create_record_writer(output_format, save_path) as writer:
+                    for record_type, data in dataframes.items():
+                        writer.write_rows(record_type, data)
+                return {"success": True, "message": f"Processo concluído! Arquivos salvos em: {save_path}"}
+            except Exception as e:
+                return {"success": False, "message": f"Erro ao salvar o arquivo: {str(e)}"}
+
         save_path = os.path.join(
             self.save_directory, file_name if file_name.endswith(".xlsx") else f"{file_name}.xlsx"
         )
@@ -0,0 +1,253 @@
+"""Cache das planilhas abertas pelo cruzamento de planilhas.
+
+Cada arquivo .xlsx é aberto uma vez em modo somente leitura do openpyxl, e o
+handle fica aberto entre as chamadas da interface: a lista de abas e o
+cabeçalho (só a primeira linha) saem sem ler a planilha inteira. A primeira
+leitura completa de uma aba grava uma cópia das linhas em pickle (em blocos),
+e as leituras seguintes usam a cópia, bem mais rápida que o XML da planilha.
+Tudo é invalidado quando o tamanho ou a data de modificação do arquivo mudam.
+
+As cópias ficam em COPY_DIR com um limite de tamanho total e de idade (ver
+prune_cache_dir): cópias desatualizadas ou de arquivos removidos são apagadas,
+e acima do limite saem as usadas há mais tempo.
+"""
+import hashlib
+import itertools
+import os
+import pickle
+import platform
+import time
+
+from openpyxl import load_workbook
+
+COPY_VERSION = 2
+COPY_CHUNK_SIZE = 10000  # linhas por bloco da cópia
+COPY_MAX_BYTES = 1024 * 1024 * 1024  # tamanho máximo do diretório de cópias
+CACHE_MAX_AGE = 30 * 24 * 3600  # cópias sem uso há mais de 30 dias são apagadas
+MAX_OPEN_WORKBOOKS = 4
+
+if platform.system() == "Windows":
+    COPY_DIR = os.path.join(os.getenv("LOCALAPPDATA", os.path.expanduser("~")), "IVFTax", "workbook_cache")
+else:
+    COPY_DIR = os.path.expanduser("~/.IVFTax/workbook_cache")
+
+
+def sheet_columns(header):
+    """
+    Nomes das colunas da primeira linha, como o pandas: colunas sem título viram
+    Coluna_1, Coluna_2, ... e nomes repetidos ganham .1, .2, ...
+    """
+    columns = []
+    seen = {}
+    for i, value in enumerate(header):
+        name = str(value) if value is not None and str(value).strip() else f"Coluna_{i + 1}"
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        columns.append(name)
+    return columns
+
+
+def file_stat(file_path):
+    stat = os.stat(file_path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _source_current(cache_path):
+    """
+    Verifica se o arquivo de origem de uma cópia em cache ainda existe e não mudou.
+    O primeiro pickle do arquivo é o cabeçalho [versão, tamanho, modificação, origem].
+    """
+    try:
+        with open(cache_path, "rb") as f:
+            _, size, mtime_ns, source = pickle.load(f)
+        return file_stat(source) == (size, mtime_ns)
+    except Exception:
+        return False
+
+
+def prune_cache_dir(directory, max_bytes, max_age=CACHE_MAX_AGE):
+    """
+    Limpa um diretório de cópias em cache (.pkl): apaga as desatualizadas, as de
+    arquivos que não existem mais e as sem uso há mais de `max_age` segundos; se o
+    total ainda passar de `max_bytes`, apaga as usadas há mais tempo. A data de
+    modificação da cópia marca o último uso (ver touch_cache_file).
+    """
+    try:
+        entries = list(os.scandir(directory))
+    except OSError:
+        return
+    now = time.time()
+    kept = []
+    for entry in entries:
+        if not entry.name.endswith(".pkl"):
+            continue
+        try:
+            stat = entry.stat()
+        except OSError:
+            continue
+        if now - stat.st_mtime > max_age or not _source_current(entry.path):
+            _remove(entry.path)
+        else:
+            kept.append((stat.st_mtime, stat.st_size, entry.path))
+
+    total = 0
+    for _, size, path in sorted(kept, reverse=True):
+        total += size
+        if total > max_bytes:
+            _remove(path)
+
+
+def touch_cache_file(cache_path):
+    """Marca a cópia como usada agora (a ordem de uso de prune_cache_dir)."""
+    try:
+        os.utime(cache_path)
+    except OSError:
+        pass
+
+
+class WorkbookCache:
+    def __init__(self, copy_dir=COPY_DIR, max_open=MAX_OPEN_WORKBOOKS, copy_max_bytes=COPY_MAX_BYTES):
+        self.copy_dir = copy_dir  # None desativa as cópias em disco
+        self.max_open = max_open
+        self.copy_max_bytes = copy_max_bytes
+        self.entries = {}  # caminho -> {"stat", "workbook", "columns"}
+
+    def _entry(self, file_path):
+        file_path = os.path.abspath(file_path)
+        stat = file_stat(file_path)
+        entry = self.entries.pop(file_path, None)
+        if entry is not None and entry["stat"] != stat:
+            entry["workbook"].close()
+            entry = None
+        if entry is None:
+            entry = {
+                "stat": stat,
+                "workbook": load_workbook(file_path, read_only=True, data_only=True),
+                "columns": {},
+            }
+        # O último usado fica no fim; os mais antigos são fechados
+        self.entries[file_path] = entry
+        while len(self.entries) > self.max_open:
+            oldest = next(iter(self.entries))
+            self.entries.pop(oldest)["workbook"].close()
+        return entry
+
+    def sheet_names(self, file_path):
+        return self._entry(file_path)["workbook"].sheetnames
+
+    def columns(self, file_path, sheet_name):
+        """Nomes das colunas da aba, lendo apenas a primeira linha."""
+        entry = self._entry(file_path)
+        columns = entry["columns"].get(sheet_name)
+        if columns is None:
+            rows = entry["workbook"][sheet_name].iter_rows(max_row=1, values_only=True)
+            columns = entry["columns"][sheet_name] = sheet_columns(next(rows, ()))
+        return columns
+
+    def iter_rows(self, file_path, sheet_name):
+        """Gera os nomes das colunas e depois cada linha não vazia da aba, como tuplas."""
+        entry = self._entry(file_path)
+        copy_path = self._copy_path(file_path, sheet_name)
+        if copy_path is not None:
+            f = self._open_copy(copy_path, entry["stat"])
+            if f is not None:
+                # O arquivo é fechado mesmo se quem lê parar antes do fim
+                try:
+                    while True:
+                        try:
+                            chunk = pickle.load(f)
+                        except EOFError:
+                            return
+                        yield from chunk
+                finally:
+                    f.close()
+
+        rows = self._read_sheet(entry["workbook"][sheet_name])
+        if copy_path is None:
+            yield from rows
+        else:
+            yield from self._write_copy(copy_path, (*entry["stat"], os.path.abspath(file_path)), rows)
+            prune_cache_dir(self.copy_dir, self.copy_max_bytes)
+
+    @staticmethod
+    def _read_sheet(worksheet):
+        rows = worksheet.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = sheet_columns(header)
+        width = len(columns)
+        yield columns
+        for row in rows:
+            if not any(value is not None for value in row):
+                continue  # linhas em branco
+            if len(row) != width:
+                row = (tuple(row) + (None,) * width)[:width]
+            yield row
+
+    def _copy_path(self, file_path, sheet_name):
+        if self.copy_dir is None:
+            return None
+        key = f"{os.path.abspath(file_path)}\0{sheet_name}".encode("utf-8")
+        return os.path.join(self.copy_dir, f"{hashlib.sha1(key).hexdigest()}.pkl")
+
+    @staticmethod
+    def _open_copy(copy_path, stat):
+        """
+        Abre a cópia, já posicionada nas linhas, ou retorna None se ela não existir.
+        Uma cópia desatualizada (o arquivo mudou) é apagada.
+        """
+        try:
+            f = open(copy_path, "rb")
+        except OSError:
+            return None
+        try:
+            current = pickle.load(f)[:3] == [COPY_VERSION, *stat]
+        except Exception:
+            current = False
+        if not current:
+            f.close()
+            _remove(copy_path)
+            return None
+        touch_cache_file(copy_path)
+        return f
+
+    @staticmethod
+    def _write_copy(copy_path, source, rows):
+        """
+        Repassa as linhas e grava a cópia; ela só é publicada se a leitura chegar ao
+        fim. `source` é (tamanho, modificação, caminho) do arquivo de origem.
+        """
+        os.makedirs(os.path.dirname(copy_path), exist_ok=True)
+        tmp_path = f"{copy_path}.tmp"
+        complete = False
+        try:
+            with open(tmp_path, "wb") as f:
+                pickle.dump([COPY_VERSION, *source], f)
+                while True:
+                    chunk = list(itertools.islice(rows, COPY_CHUNK_SIZE))
+                    if not chunk:
+                        break
+                    pickle.dump(chunk, f, protocol=pickle.HIGHEST_PROTOCOL)
+                    yield from chunk
+            complete = True
+        finally:
+            if complete:
+                os.replace(tmp_path, copy_path)
+            elif os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def close(self):
+        for entry in self.entries.values():
+            entry["workbook"].close()
+        self.entries = {}
@@ -0,0 +1,178 @@
+"""Manifesto dos arquivos XML já extraídos, para o processamento incremental.
+
+Para cada diretório de entrada o manifesto guarda, por arquivo, o tamanho, a data
+de modificação (o CRC, para membros de .zip), o hash SHA-1 do conteúdo e onde estão
+os dados extraídos: as notas ficam em arquivos JSON Lines ("partes") ao lado do
+manifesto, e cada arquivo aponta para a posição (em bytes) da sua linha. Numa nova
+execução cada arquivo da varredura é consultado com `lookup`, na ordem da
+varredura: os inalterados vêm das partes e só os novos ou alterados são lidos.
+Quando só a data de modificação muda (arquivo copiado, restaurado ou baixado de
+novo), o SHA-1 do conteúdo confirma se ele precisa ser lido. Quando mais da metade
+das linhas das partes fica obsoleta, as linhas válidas são copiadas para uma parte nova.
+"""
+import hashlib
+import json
+import os
+import platform
+
+from file_scanner import input_stat, read_input
+from nfe_schema import NFE_SCHEMA
+
+MANIFEST_VERSION = 2  # 2: posição em bytes da linha de cada arquivo
+
+if platform.system() == "Windows":
+    MANIFEST_DIR = os.path.join(os.getenv("LOCALAPPDATA", os.path.expanduser("~")), "IVFTax", "xml_manifest")
+else:
+    MANIFEST_DIR = os.path.expanduser("~/.IVFTax/xml_manifest")
+
+
+def file_digest(content):
+    return hashlib.sha1(content).hexdigest()
+
+
+class XmlManifest:
+    def __init__(self, input_directory, schema=NFE_SCHEMA):
+        key = hashlib.sha1(os.path.abspath(input_directory).encode("utf-8")).hexdigest()
+        self.directory = os.path.join(MANIFEST_DIR, key)
+        self.input_directory = os.path.abspath(input_directory)
+        self.schema_key = hashlib.sha1(json.dumps(schema, sort_keys=True).encode("utf-8")).hexdigest()
+        self.files = {}  # caminho -> [tamanho, mtime_ns, sha1, parte, posição da linha]
+        self.shards = {}  # parte -> quantidade de linhas
+        self.next_shard = 0
+        self._stats = {}
+        self._present = set()
+        self._readers = {}  # parte -> arquivo aberto para leitura
+        self._removed_shards = []
+        self._shard = None
+        self._load()
+
+    @property
+    def _manifest_path(self):
+        return os.path.join(self.directory, "manifest.json")
+
+    def _shard_path(self, shard):
+        return os.path.join(self.directory, shard)
+
+    def _load(self):
+        try:
+            with open(self._manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return
+        # Um esquema diferente extrai outros campos: tudo é lido de novo
+        if manifest.get("version") != MANIFEST_VERSION or manifest.get("schema") != self.schema_key:
+            self._removed_shards = [name for name in os.listdir(self.directory) if name.endswith(".jsonl")]
+            self.next_shard = manifest.get("next_shard", 0)  # não reaproveita nomes a apagar
+            return
+        self.files = manifest["files"]
+        self.shards = manifest["shards"]
+        self.next_shard = manifest["next_shard"]
+
+    def _read_line(self, shard, offset):
+        f = self._readers.get(shard)
+        if f is None:
+            f = self._readers[shard] = open(self._shard_path(shard), "rb")
+        f.seek(offset)
+        return f.readline()
+
+    def lookup(self, file_path):
+        """
+        Retorna (sha1, (cabeçalho, tabelas)) do arquivo, se ele não mudou desde a
+        última execução, ou None se ele precisa ser lido (e então gravado com `add`).
+        Com o mesmo tamanho e outra data de modificação, o SHA-1 do conteúdo decide.
+        Os arquivos não consultados nesta execução saem do manifesto em `save`.
+        """
+        size, mtime_ns = self._stats[file_path] = input_stat(file_path)
+        self._present.add(file_path)
+        entry = self.files.get(file_path)
+        if entry is None or entry[0] != size:
+            return None
+        if entry[1] != mtime_ns:
+            if file_digest(read_input(file_path)) != entry[2]:
+                return None
+            entry[1] = mtime_ns
+        try:
+            _, header, tables = json.loads(self._read_line(entry[3], entry[4]))
+        except (OSError, ValueError):
+            return None
+        return entry[2], (header, tables)
+
+    def add(self, file_path, digest, extracted_data):
+        """Grava os dados extraídos do arquivo na parte atual e atualiza o manifesto."""
+        if self._shard is None:
+            name = f"part-{self.next_shard:05d}.jsonl"
+            self.next_shard += 1
+            os.makedirs(self.directory, exist_ok=True)
+            self._shard = [name, open(self._shard_path(name), "wb")]
+            self.shards[name] = 0
+        name, f = self._shard
+        offset = f.tell()
+        f.write(json.dumps([file_path, *extracted_data], ensure_ascii=False).encode("utf-8"))
+        f.write(b"\n")
+        size, mtime_ns = self._stats.get(file_path) or input_stat(file_path)
+        self.files[file_path] = [size, mtime_ns, digest, name, offset]
+        self._present.add(file_path)
+        self.shards[name] += 1
+
+    def forget(self, file_path):
+        """Remove o arquivo do manifesto (por exemplo, quando a leitura falhou)."""
+        self.files.pop(file_path, None)
+
+    def close(self):
+        if self._shard is not None:
+            self._shard[1].close()
+            self._shard = None
+        for f in self._readers.values():
+            f.close()
+        self._readers = {}
+
+    def _compact(self):
+        """Copia as linhas ainda usadas para uma parte nova e descarta as antigas."""
+        entries = sorted(self.files.values(), key=lambda entry: (entry[3], entry[4]))
+        old_shards = list(self.shards)
+        name = f"part-{self.next_shard:05d}.jsonl"
+        self.next_shard += 1
+        with open(self._shard_path(name), "wb") as f:
+            for entry in entries:
+                line = self._read_line(entry[3], entry[4])
+                entry[3], entry[4] = name, f.tell()
+                f.write(line)
+        self.close()
+        self._removed_shards.extend(old_shards)
+        self.shards = {name: len(entries)}
+
+    def save(self):
+        """
+        Grava o manifesto, depois de uma varredura completa: os arquivos que não
+        apareceram nela são esquecidos. Só então apaga as partes que deixaram de ser usadas.
+        """
+        self.close()
+        os.makedirs(self.directory, exist_ok=True)
+        self.files = {path: entry for path, entry in self.files.items() if path in self._present}
+        live = {}
+        for entry in self.files.values():
+            live[entry[3]] = live.get(entry[3], 0) + 1
+        for shard in [shard for shard in self.shards if not live.get(shard)]:
+            self._removed_shards.append(shard)
+            del self.shards[shard]
+        if sum(self.shards.values()) > 2 * len(self.files):
+            self._compact()
+
+        manifest = {
+            "version": MANIFEST_VERSION,
+            "schema": self.schema_key,
+            "input_directory": self.input_directory,
+            "next_shard": self.next_shard,
+            "shards": self.shards,
+            "files": self.files,
+        }
+        tmp_path = f"{self._manifest_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        os.replace(tmp_path, self._manifest_path)
+        for shard in self._removed_shards:
+            try:
+                os.remove(self._shard_path(shard))
+            except OSError:
+                pass
+        self._removed_shards = []
@@ -0,0 +1,69 @@
+"""Extração de campos de NF-e (XML) executada em processos de trabalho.
+
+Assim como sped_tasks, as funções ficam fora de main.py para que os processos
+filhos possam importá-las sem a interface. Os campos extraídos são os do esquema
+de nfe_schema.
+"""
+import io
+
+from file_scanner import close_archive, read_input
+from nfe_schema import NFE_SCHEMA, NFeExtractor
+from xml_manifest import file_digest
+
+XML_BATCH_SIZE = 256  # arquivos por tarefa enviada ao pool de processos
+
+
+def extract_xml_batch(file_paths, schema=NFE_SCHEMA):
+    """
+    Extrai um lote de arquivos: [(caminho, sha1, (cabeçalho, tabelas) ou None, erro ou None)].
+
+    Cada arquivo (ou membro de .zip) é lido uma vez só, para calcular o hash e
+    extrair os campos; o .zip aberto é fechado ao fim do lote.
+    """
+    extractor = NFeExtractor(schema)
+    results = []
+    try:
+        for file_path in file_paths:
+            try:
+                content = read_input(file_path)
+                results.append((file_path, file_digest(content), extractor.extract(io.BytesIO(content)), None))
+            except Exception as e:
+                results.append((file_path, None, None, str(e)))
+    finally:
+        close_archive()
+    return results
+
+
+def batch_paths(file_paths, batch_size=XML_BATCH_SIZE):
+    """Agrupa os caminhos em lotes de `batch_size` arquivos."""
+    batch = []
+    for file_path in file_paths:
+        batch.append(file_path)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def column_fill_rates(extracted_data, columns_by_table):
+    """
+    Percentual de linhas com cada coluna preenchida, por tabela, para uma lista de
+    (cabeçalho, tabelas). A tabela "Notas" corresponde aos cabeçalhos.
+    """
+    rows_by_table = {name: [] for name in columns_by_table}
+    for header, tables in extracted_data:
+        rows_by_table["Notas"].append(header)
+        for name, rows in tables.items():
+            rows_by_table[name].extend(rows)
+
+    fill_rates = {}
+    for name, columns in columns_by_table.items():
+        rows = rows_by_table[name]
+        if not rows:
+            continue
+        fill_rates[name] = {
+            column: round(100 * sum(1 for row in rows if row.get(column)) / len(rows), 1)
+            for column in columns
+        }
+    return fill_rates
@@ -17,6 +17,10 @@ const Convert: React.FC = () => {
   const [loading, setLoading] = useState(false);
   const [currentConversion, setCurrentConversion] = useState<"txtToExcel" | "excelToTxt" | null>(null);
   const [fileType, setFileType] = useState<"txt" | "excel" | null>(null);
+  const [outputFormat, setOutputFormat] = useState<"xlsx" | "parquet" | "feather" | "csv">("xlsx");
+  const [fileResults, setFileResults] = useState<
+    { file: string; success: boolean; message: string }[]
+  >([]);
 
   const handleFileSelect = async (type: "txt" | "excel") => {
     try {
@@ -62,16 +66,18 @@ const Convert: React.FC = () => {
 
     setLoading(true);
     setCurrentConversion(conversionType);
+    setFileResults([]);
 
     // Usando `setTimeout` para permitir a atualização da interface
     setTimeout(async () => {
       try {
         const response =
           conversionType === "txtToExcel"
-            ? await window.pyloid.CustomAPI.convert_txt_to_excel_bulk()
+            ? await window.pyloid.CustomAPI.convert_txt_to_excel_bulk(outputFormat)
             : await window.pyloid.CustomAPI.convert_excel_to_txt_bulk();
 
         setProcessingMessage(response.message);
+        setFileResults(response.results || []);
       } catch (error) {
         console.error("Erro ao converter arquivos:", error);
         setProcessingMessage("Erro durante a conversão.");
@@ -101,6 +107,19 @@ const Convert: React.FC = () => {
                   {processingMessage}
                 </Alert>
               )}
+              {fileResults.length > 0 && (
+                <ul className="small">
+                  {fileResults.map((result) => (
+                    <li
+                      key={result.file}
+                      className={result.success ? "text-success" : "text-danger"}
+                    >
+                      {result.success ? "✓" : "✗"} {result.file}
+                      {!result.success && `: ${result.message}`}
+                    </li>
+                  ))}
+                </ul>
+              )}
               <Form>
                 <Form.Group className="mb-3">
                   <Button
@@ -141,6 +160,21 @@ const Convert: React.FC = () => {
                   )}
                 </Form.Group>
 
+                <Form.Group className="mb-3">
+                  <Form.Label>Formato de Saída (TXT)</Form.Label>
+                  <Form.Select
+                    value={outputFormat}
+                    onChange={(e) =>
+                      setOutputFormat(e.target.value as "xlsx" | "parquet" | "feather" | "csv")
+                    }
+                  >
+                    <option value="xlsx">Excel (.xlsx)</option>
+                    <option value="parquet">Parquet (um por registro)</option>
+                    <option value="feather">Arrow/Feather (um por registro)</option>
+                    <option value="csv">CSV (um por registro)</option>
+                  </Form.Select>
+                </Form.Group>
+
                 <div className="d-grid gap-2 mb-3">
                   <Button
                     variant="success"
@@ -9,14 +9,107 @@ import {
   Alert,
   Spinner,
   ProgressBar,
+  Table,
+  Badge,
 } from "react-bootstrap";
 import "./index.css";
 
+type JobStatus =
+  | "queued"
+  | "running"
+  | "finished"
+  | "error"
+  | "cancelled"
+  | "interrupted";
+
+interface JobInfo {
+  id: string;
+  title: string;
+  status: JobStatus;
+  priority: number;
+  message: string;
+  progress: { percent?: number };
+  createdAt: number;
+}
+
+const JOB_STATUS_LABELS: Record<JobStatus, [string, string]> = {
+  queued: ["Na fila", "secondary"],
+  running: ["Em execução", "primary"],
+  finished: ["Concluído", "success"],
+  error: ["Erro", "danger"],
+  cancelled: ["Cancelado", "warning"],
+  interrupted: ["Interrompido", "dark"],
+};
+
+interface ProgressState {
+  status: JobStatus | "idle";
+  percent?: number;
+  bytesRead?: number;
+  totalBytes?: number;
+  lines?: number;
+  linesPerSecond?: number;
+  rows?: Record<string, number>;
+  expectedRows?: Record<string, number>;
+  etaSeconds?: number;
+  elapsedSeconds?: number;
+  stages?: Record<string, number>;
+  peakMemoryMB?: number | null;
+  peakWorkerMemoryMB?: number | null;
+  message?: string;
+}
+
+// Etapas medidas pelo backend (job_control.ProgressTracker), na ordem do processamento
+const STAGE_LABELS: Record<string, string> = {
+  index: "Índice",
+  read: "Leitura",
+  parse: "Parse",
+  join: "Junção",
+  filter: "Filtro",
+  write: "Gravação",
+};
+
+const StageMetrics = ({ state }: { state: ProgressState }) => {
+  const stages = Object.entries(state.stages ?? {}).sort(
+    ([a], [b]) =>
+      Object.keys(STAGE_LABELS).indexOf(a) -
+      Object.keys(STAGE_LABELS).indexOf(b)
+  );
+  const total = stages.reduce((sum, [, seconds]) => sum + seconds, 0);
+  return (
+    <span className="d-block mt-1">
+      {stages.map(([stage, seconds]) => (
+        <span key={stage} className="d-block">
+          {STAGE_LABELS[stage] ?? stage}: {seconds.toFixed(2)}s
+          {total > 0 && ` (${Math.round((seconds / total) * 100)}%)`}
+        </span>
+      ))}
+      {state.peakMemoryMB != null && (
+        <span className="d-block">
+          Pico de memória: {state.peakMemoryMB.toLocaleString()} MB
+          {state.peakWorkerMemoryMB != null &&
+            ` · processos de trabalho: ${state.peakWorkerMemoryMB.toLocaleString()} MB`}
+        </span>
+      )}
+    </span>
+  );
+};
+
+const formatDuration = (seconds: number) => {
+  const minutes = Math.floor(seconds / 60);
+  const rest = Math.round(seconds % 60);
+  return minutes > 0 ? `${minutes}min ${rest}s` : `${rest}s`;
+};
+
 const Speed = () => {
   const [selectedFilesMessage, setSelectedFilesMessage] = useState("");
   const [selectedDirectoryMessage, setSelectedDirectoryMessage] = useState("");
   const [excelFileName, setExcelFileName] = useState("");
+  const [relations, setRelations] = useState("");
+  const [outputFormat, setOutputFormat] = useState<
+    "xlsx" | "parquet" | "feather" | "csv"
+  >("xlsx");
   const [availableRecords, setAvailableRecords] = useState<string[]>([]);
+  const [recordCounts, setRecordCounts] = useState<Record<string, number>>({});
   const [selectedRecords, setSelectedRecords] = useState<string[]>([]);
   const [loadingRecords, setLoadingRecords] = useState(false);
   const [processingMessage, setProcessingMessage] = useState("");
@@ -25,6 +118,70 @@ const Speed = () => {
   const [activeProcess, setActiveProcess] = useState<
     "processFiles" | "convertExcelToSped" | null
   >(null);
+  const [progressDetails, setProgressDetails] = useState<ProgressState | null>(
+    null
+  );
+  const [jobs, setJobs] = useState<JobInfo[]>([]);
+
+  const fetchJobs = async () => {
+    try {
+      setJobs(await window.pyloid.CustomAPI.list_jobs());
+    } catch (error) {
+      console.error("Erro ao listar a fila de processamento:", error);
+    }
+  };
+
+  // Atualiza a fila de processamento periodicamente
+  useEffect(() => {
+    fetchJobs();
+    const interval = setInterval(fetchJobs, 2000);
+    return () => clearInterval(interval);
+  }, []);
+
+  const changeJobPriority = async (job: JobInfo, delta: number) => {
+    const response = await window.pyloid.CustomAPI.set_job_priority(
+      job.id,
+      job.priority + delta
+    );
+    if (!response.success) {
+      setProcessingMessage(response.message);
+    }
+    fetchJobs();
+  };
+
+  const cancelJob = async (job: JobInfo) => {
+    const response = await window.pyloid.CustomAPI.cancel_job(job.id);
+    setProcessingMessage(response.message);
+    fetchJobs();
+  };
+
+  // Consulta o progresso do processamento em segundo plano
+  useEffect(() => {
+    if (!isProcessing || activeProcess !== "processFiles") {
+      return;
+    }
+    const interval = setInterval(async () => {
+      try {
+        const state: ProgressState =
+          await window.pyloid.CustomAPI.get_progress();
+        setProgressDetails(state);
+        setProgress(state.percent ?? 0);
+        if (
+          state.status === "finished" ||
+          state.status === "error" ||
+          state.status === "cancelled" ||
+          state.status === "interrupted"
+        ) {
+          setProcessingMessage(state.message || "Processo finalizado!");
+          setIsProcessing(false);
+          setActiveProcess(null);
+        }
+      } catch (error) {
+        console.error("Erro ao consultar o progresso:", error);
+      }
+    }, 500);
+    return () => clearInterval(interval);
+  }, [isProcessing, activeProcess]);
   useEffect(() => {
     console.log("window.pyloid:", window.pyloid);
     console.log("window.pyloid?.emitter:", window.pyloid?.emitter);
@@ -96,6 +253,7 @@ const Speed = () => {
       const response = await window.pyloid.CustomAPI.get_columns();
       if (response.success) {
         setAvailableRecords(response.recordNumbers);
+        setRecordCounts(response.recordCounts || {});
       } else {
         setProcessingMessage(response.message);
       }
@@ -134,12 +292,18 @@ const Speed = () => {
       setIsProcessing(true);
       setActiveProcess("processFiles");
       setProgress(0);
+      setProgressDetails(null);
       setProcessingMessage("");
       const response = await window.pyloid.CustomAPI.process_files_with_thread(
         excelFileName,
         selectedRecords.join(","),
         [],
-        false // Alterar se necessário
+        false, // Alterar se necessário
+        outputFormat,
+        relations
+          .split(",")
+          .map((relation) => relation.trim())
+          .filter((relation) => relation)
       );
 
       if (!response.success) {
@@ -147,6 +311,7 @@ const Speed = () => {
         setIsProcessing(false);
         setActiveProcess(null);
       }
+      fetchJobs();
     } catch (error) {
       console.error("Erro ao processar arquivos:", error);
       setIsProcessing(false);
@@ -154,6 +319,15 @@ const Speed = () => {
     }
   };
 
+  const cancelProcessing = async () => {
+    try {
+      const response = await window.pyloid.CustomAPI.cancel_processing();
+      setProcessingMessage(response.message);
+    } catch (error) {
+      console.error("Erro ao cancelar o processamento:", error);
+    }
+  };
+
   const convertExcelToSped = async () => {
     if (!excelFileName) {
       setProcessingMessage(
@@ -269,7 +443,11 @@ const Speed = () => {
                         <Form.Check
                           key={index}
                           type="checkbox"
-                          label={`Registro: ${record}`}
+                          label={
+                            recordCounts[record] !== undefined
+                              ? `Registro: ${record} (${recordCounts[record].toLocaleString()} linha(s))`
+                              : `Registro: ${record}`
+                          }
                           value={record}
                           checked={selectedRecords.includes(record)}
                           onChange={() => toggleRecordSelection(record)}
@@ -289,6 +467,35 @@ const Speed = () => {
                   />
                 </Form.Group>
 
+                <Form.Group className="mb-3">
+                  <Form.Label>Relacionamentos Pai/Filho (opcional)</Form.Label>
+                  <Form.Control
+                    type="text"
+                    placeholder="Ex.: C100:C170, D100:D190"
+                    value={relations}
+                    onChange={(e) => setRelations(e.target.value)}
+                  />
+                </Form.Group>
+
+                <Form.Group className="mb-3">
+                  <Form.Label>Formato de Saída</Form.Label>
+                  <Form.Select
+                    value={outputFormat}
+                    onChange={(e) =>
+                      setOutputFormat(
+                        e.target.value as "xlsx" | "parquet" | "feather" | "csv"
+                      )
+                    }
+                  >
+                    <option value="xlsx">Excel (.xlsx)</option>
+                    <option value="parquet">Parquet (um por registro)</option>
+                    <option value="feather">
+                      Arrow/Feather (um por registro)
+                    </option>
+                    <option value="csv">CSV (um por registro)</option>
+                  </Form.Select>
+                </Form.Group>
+
                 <div className="d-grid gap-2 mb-3">
                   <Button
                     variant="success"
@@ -334,11 +541,129 @@ const Speed = () => {
                 {isProcessing && (
                   <div className="mt-3">
                     <ProgressBar now={progress} label={`${progress}%`} />
+                    {progressDetails?.status === "queued" && (
+                      <Form.Text className="d-block">
+                        Aguardando na fila de processamento...
+                      </Form.Text>
+                    )}
+                    {progressDetails?.status === "running" && (
+                      <Form.Text className="d-block">
+                        {(progressDetails.lines ?? 0).toLocaleString()} linhas
+                        lidas ·{" "}
+                        {(progressDetails.linesPerSecond ?? 0).toLocaleString()}{" "}
+                        linhas/s · tempo restante estimado:{" "}
+                        {formatDuration(progressDetails.etaSeconds ?? 0)}
+                        {progressDetails.rows &&
+                          Object.entries(progressDetails.rows).map(
+                            ([record, count]) => (
+                              <span key={record} className="d-block">
+                                {record}: {count.toLocaleString()}
+                                {progressDetails.expectedRows?.[record] !==
+                                  undefined &&
+                                  ` / ${progressDetails.expectedRows[record].toLocaleString()}`}{" "}
+                                linha(s)
+                              </span>
+                            )
+                          )}
+                        <StageMetrics state={progressDetails} />
+                      </Form.Text>
+                    )}
+                    {activeProcess === "processFiles" && (
+                      <div className="d-grid mt-2">
+                        <Button variant="danger" onClick={cancelProcessing}>
+                          Cancelar Processamento
+                        </Button>
+                      </div>
+                    )}
                   </div>
                 )}
+
+                {!isProcessing &&
+                  progressDetails?.status === "finished" &&
+                  progressDetails.stages && (
+                    <Form.Text className="d-block mt-3">
+                      Última execução:{" "}
+                      {formatDuration(progressDetails.elapsedSeconds ?? 0)} ·{" "}
+                      {(progressDetails.lines ?? 0).toLocaleString()} linhas
+                      lidas
+                      <StageMetrics state={progressDetails} />
+                    </Form.Text>
+                  )}
               </Form>
             </Card.Body>
           </Card>
+
+          {jobs.length > 0 && (
+            <Card className="mt-4">
+              <Card.Body>
+                <Card.Title className="text-center">
+                  Fila de Processamento
+                </Card.Title>
+                <Table size="sm" responsive>
+                  <thead>
+                    <tr>
+                      <th>Job</th>
+                      <th>Status</th>
+                      <th>Prioridade</th>
+                      <th></th>
+                    </tr>
+                  </thead>
+                  <tbody>
+                    {jobs.map((job) => {
+                      const [label, variant] = JOB_STATUS_LABELS[job.status];
+                      return (
+                        <tr key={job.id} title={job.message}>
+                          <td>{job.title}</td>
+                          <td>
+                            <Badge bg={variant}>
+                              {label}
+                              {job.status === "running" &&
+                                ` ${job.progress?.percent ?? 0}%`}
+                            </Badge>
+                          </td>
+                          <td>
+                            {job.status === "queued" ? (
+                              <>
+                                <Button
+                                  size="sm"
+                                  variant="outline-secondary"
+                                  onClick={() => changeJobPriority(job, 1)}
+                                >
+                                  ↑
+                                </Button>{" "}
+                                {job.priority}{" "}
+                                <Button
+                                  size="sm"
+                                  variant="outline-secondary"
+                                  onClick={() => changeJobPriority(job, -1)}
+                                >
+                                  ↓
+                                </Button>
+                              </>
+                            ) : (
+                              job.priority
+                            )}
+                          </td>
+                          <td>
+                            {(job.status === "queued" ||
+                              job.status === "running") && (
+                              <Button
+                                size="sm"
+                                variant="outline-danger"
+                                onClick={() => cancelJob(job)}
+                              >
+                                Cancelar
+                              </Button>
+                            )}
+                          </td>
+                        </tr>
+                      );
+                    })}
+                  </tbody>
+                </Table>
+              </Card.Body>
+            </Card>
+          )}
         </Col>
       </Row>
     </Container>
@@ -22,8 +22,12 @@ const SpreadsheetProcessor: React.FC = () => {
   const [columns2, setColumns2] = useState<string[]>([]);
   const [selectedSheet1, setSelectedSheet1] = useState("");
   const [selectedSheet2, setSelectedSheet2] = useState("");
-  const [selectedColumn1, setSelectedColumn1] = useState("");
-  const [selectedColumn2, setSelectedColumn2] = useState("");
+  const [selectedColumns1, setSelectedColumns1] = useState<string[]>([]);
+  const [selectedColumns2, setSelectedColumns2] = useState<string[]>([]);
+  const [keyMode, setKeyMode] = useState("exact");
+  const [persistIndex, setPersistIndex] = useState(true);
+  const [joinType, setJoinType] = useState("inner");
+  const [reconcile, setReconcile] = useState(false);
   const [errorMessage, setErrorMessage] = useState("");
   const [successMessage, setSuccessMessage] = useState("");
 
@@ -68,14 +72,26 @@ const SpreadsheetProcessor: React.FC = () => {
         );
       if (fileIndex === 0) {
         setColumns1(response);
+        setSelectedColumns1([]);
       } else {
         setColumns2(response);
+        setSelectedColumns2([]);
       }
     } catch {
       setErrorMessage("Erro ao carregar colunas.");
     }
   };
 
+  // Colunas-chave na ordem em que foram marcadas (a ordem vale para a concatenação)
+  const toggleKeyColumn = (
+    col: string,
+    setSelected: React.Dispatch<React.SetStateAction<string[]>>
+  ) => {
+    setSelected((prev) =>
+      prev.includes(col) ? prev.filter((c) => c !== col) : [...prev, col]
+    );
+  };
+
   const processFiles = async () => {
     try {
       const savePath = await window.pyloid.SpreadsheetProcessingAPI.save_file();
@@ -87,8 +103,12 @@ const SpreadsheetProcessor: React.FC = () => {
       const response =
         await window.pyloid.SpreadsheetProcessingAPI.process_cross_reference(
           [selectedSheet1, selectedSheet2],
-          [selectedColumn1, selectedColumn2],
-          savePath
+          [selectedColumns1, selectedColumns2],
+          savePath,
+          joinType,
+          reconcile,
+          keyMode,
+          persistIndex
         );
 
       setSuccessMessage(response);
@@ -136,17 +156,23 @@ const SpreadsheetProcessor: React.FC = () => {
 
               {columns1.length > 0 && (
                 <Form.Group className="mt-3">
-                  <Form.Label>Colunas do Arquivo 1</Form.Label>
-                  <Form.Select
-                    onChange={(e) => setSelectedColumn1(e.target.value)}
-                  >
-                    <option value="">Selecione...</option>
-                    {columns1.map((col) => (
-                      <option key={col} value={col}>
-                        {col}
-                      </option>
-                    ))}
-                  </Form.Select>
+                  <Form.Label>Colunas-chave do Arquivo 1</Form.Label>
+                  <div style={{ maxHeight: 200, overflowY: "auto" }}>
+                    {columns1.map((col) => {
+                      const position = selectedColumns1.indexOf(col);
+                      return (
+                        <Form.Check
+                          key={col}
+                          type="checkbox"
+                          label={position >= 0 ? `${col} (${position + 1})` : col}
+                          checked={position >= 0}
+                          onChange={() =>
+                            toggleKeyColumn(col, setSelectedColumns1)
+                          }
+                        />
+                      );
+                    })}
+                  </div>
                 </Form.Group>
               )}
             </Card.Body>
@@ -182,25 +208,79 @@ const SpreadsheetProcessor: React.FC = () => {
 
               {columns2.length > 0 && (
                 <Form.Group className="mt-3">
-                  <Form.Label>Colunas do Arquivo 2</Form.Label>
-                  <Form.Select
-                    onChange={(e) => setSelectedColumn2(e.target.value)}
-                  >
-                    <option value="">Selecione...</option>
-                    {columns2.map((col) => (
-                      <option key={col} value={col}>
-                        {col}
-                      </option>
-                    ))}
-                  </Form.Select>
+                  <Form.Label>Colunas-chave do Arquivo 2</Form.Label>
+                  <div style={{ maxHeight: 200, overflowY: "auto" }}>
+                    {columns2.map((col) => {
+                      const position = selectedColumns2.indexOf(col);
+                      return (
+                        <Form.Check
+                          key={col}
+                          type="checkbox"
+                          label={position >= 0 ? `${col} (${position + 1})` : col}
+                          checked={position >= 0}
+                          onChange={() =>
+                            toggleKeyColumn(col, setSelectedColumns2)
+                          }
+                        />
+                      );
+                    })}
+                  </div>
                 </Form.Group>
               )}
             </Card.Body>
           </Card>
         </Col>
 
+        <Col md={12}>
+          <Card className="mb-3">
+            <Card.Body>
+              <Form.Group>
+                <Form.Label>Tipo de Cruzamento</Form.Label>
+                <Form.Select
+                  value={joinType}
+                  onChange={(e) => setJoinType(e.target.value)}
+                >
+                  <option value="inner">Somente linhas com correspondência</option>
+                  <option value="left">Todas as linhas do Arquivo 1</option>
+                  <option value="anti">Linhas do Arquivo 1 sem correspondência</option>
+                </Form.Select>
+              </Form.Group>
+              <Form.Group className="mt-3">
+                <Form.Label>Comparação das Chaves</Form.Label>
+                <Form.Select
+                  value={keyMode}
+                  onChange={(e) => setKeyMode(e.target.value)}
+                >
+                  <option value="exact">Valor exato</option>
+                  <option value="text">Texto (ignora espaços e maiúsculas)</option>
+                  <option value="digits">
+                    Somente dígitos (ignora pontuação e zeros à esquerda)
+                  </option>
+                </Form.Select>
+                <Form.Text>
+                  Com quantidades diferentes de colunas-chave, os valores de cada
+                  arquivo são concatenados na ordem marcada.
+                </Form.Text>
+              </Form.Group>
+              <Form.Check
+                className="mt-3"
+                type="checkbox"
+                label='Conciliação: incluir abas "Somente em A" e "Somente em B"'
+                checked={reconcile}
+                onChange={(e) => setReconcile(e.target.checked)}
+              />
+              <Form.Check
+                type="checkbox"
+                label="Salvar e reaproveitar o índice do Arquivo 2"
+                checked={persistIndex}
+                onChange={(e) => setPersistIndex(e.target.checked)}
+              />
+            </Card.Body>
+          </Card>
+        </Col>
+
         <Col md={12} className="text-center">
-          {selectedColumn1 && selectedColumn2 && (
+          {selectedColumns1.length > 0 && selectedColumns2.length > 0 && (
             <Button variant="success" size="lg" onClick={processFiles}>
               Processar Arquivos
             </Button>
@@ -16,12 +16,28 @@ const Xml = () => {
   const [inputDirectory, setInputDirectory] = useState("");
   const [outputDirectory, setOutputDirectory] = useState("");
   const [outputFileName, setOutputFileName] = useState("");
+  const [outputFormat, setOutputFormat] = useState<
+    "xlsx" | "parquet" | "feather" | "csv"
+  >("xlsx");
+  const [incremental, setIncremental] = useState(false);
+  const [recursive, setRecursive] = useState(true);
+  const [includeZip, setIncludeZip] = useState(true);
+  const [filePatterns, setFilePatterns] = useState("*.xml");
+
+  // Envia as opções de varredura antes de visualizar ou processar
+  const saveScanOptions = () =>
+    window.pyloid.XMLProcessingAPI.save_scan_options(
+      recursive,
+      includeZip,
+      filePatterns
+    );
   const [processingMessage, setProcessingMessage] = useState("");
   const [errorMessage, setErrorMessage] = useState("");
   const [previewData, setPreviewData] = useState<
     Record<string, string | number | boolean>[]
   >([]);
   const [columns, setColumns] = useState<string[]>([]);
+  const [fillRates, setFillRates] = useState<Record<string, number>>({});
   const [excludedColumns, setExcludedColumns] = useState<string[]>([]);
   const [previewFileName, setPreviewFileName] = useState("");
   const [isPreviewOpen, setIsPreviewOpen] = useState(false);
@@ -53,6 +69,7 @@ const Xml = () => {
   // Função para pré-visualizar arquivo
   const previewFile = async () => {
     try {
+      await saveScanOptions();
       const response = await window.pyloid.XMLProcessingAPI.preview_file();
       if (response.error) {
         setProcessingMessage(response.error);
@@ -61,6 +78,7 @@ const Xml = () => {
 
       setPreviewData(response.data);
       setColumns(response.columns);
+      setFillRates(response.fillRates || {});
       setPreviewFileName(response.file_name);
       setExcludedColumns([]);
       setIsPreviewOpen(true);
@@ -76,7 +94,12 @@ const Xml = () => {
         setErrorMessage("O nome do arquivo de saída é obrigatório.");
         return;
       }
-      const message = await window.pyloid.XMLProcessingAPI.process_files();
+      await saveScanOptions();
+      const message = await window.pyloid.XMLProcessingAPI.process_files(
+        outputFileName,
+        outputFormat,
+        incremental
+      );
       setProcessingMessage(message);
       setErrorMessage("");
     } catch (error) {
@@ -139,6 +162,56 @@ const Xml = () => {
                   />
                 </Form.Group>
 
+                <Form.Group className="mb-3">
+                  <Form.Label>Formato de Saída</Form.Label>
+                  <Form.Select
+                    value={outputFormat}
+                    onChange={(e) =>
+                      setOutputFormat(
+                        e.target.value as "xlsx" | "parquet" | "feather" | "csv"
+                      )
+                    }
+                  >
+                    <option value="xlsx">Excel (.xlsx)</option>
+                    <option value="parquet">Parquet (um por tabela)</option>
+                    <option value="feather">
+                      Arrow/Feather (um por tabela)
+                    </option>
+                    <option value="csv">CSV (um por tabela)</option>
+                  </Form.Select>
+                </Form.Group>
+
+                <Form.Group className="mb-3">
+                  <Form.Label>Filtros de Arquivo</Form.Label>
+                  <Form.Control
+                    type="text"
+                    placeholder="Ex.: *.xml, 2024/*/*.xml"
+                    value={filePatterns}
+                    onChange={(e) => setFilePatterns(e.target.value)}
+                  />
+                  <Form.Check
+                    type="checkbox"
+                    label="Incluir subpastas"
+                    checked={recursive}
+                    onChange={(e) => setRecursive(e.target.checked)}
+                  />
+                  <Form.Check
+                    type="checkbox"
+                    label="Ler arquivos XML dentro de arquivos .zip"
+                    checked={includeZip}
+                    onChange={(e) => setIncludeZip(e.target.checked)}
+                  />
+                </Form.Group>
+
+                <Form.Group className="mb-3">
+                  <Form.Check
+                    type="checkbox"
+                    label="Processamento incremental (lê apenas arquivos novos ou alterados)"
+                    checked={incremental}
+                    onChange={(e) => setIncremental(e.target.checked)}
+                  />
+                </Form.Group>
+
                 <Form.Group className="mb-3">
                   <Button
                     onClick={previewFile}
@@ -148,7 +221,7 @@ const Xml = () => {
                     Visualizar Dados
                   </Button>
                   {previewFileName && (
-                    <Form.Text>Arquivo: {previewFileName}</Form.Text>
+                    <Form.Text>Amostra: {previewFileName}</Form.Text>
                   )}
                 </Form.Group>
 
@@ -183,7 +256,11 @@ const Xml = () => {
                   <th key={col}>
                     <Form.Check
                       type="checkbox"
-                      label={col}
+                      label={
+                        fillRates[col] !== undefined
+                          ? `${col} (${fillRates[col]}%)`
+                          : col
+                      }
                       checked={!excludedColumns.includes(col)}
                       onChange={() => toggleColumn(col)}
                     />